@@ -1,20 +1,43 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-from pages import taux
+import numpy as np
+from tools.loan_engine import amortization_schedule, simulate_batch, variant_schedule
+from tools.bounded_cache import BoundedCache
+from tools.borrowing_capacity import capacity_batch, max_principal
+from tools.instrumentation import begin_run, dev_mode, sidebar_panel, stage, timed
+from tools.page_data import get_rate_history, prechauffer_dvf, prechauffer_taux
+from tools.session_tracker import track_user
+from tools.startup import WarmUp, lazy_import, warm_up_enabled
 
-#from tools.session_tracker import track_user
-#import time
+# Plotly n'est importé qu'à la construction de la première figure (voir tools/startup.py)
+go = lazy_import("plotly.graph_objects")
 
-#st.title("App avec tracking")
-# Lancement du tracking
-#start = track_user()
-# Calcul du temps passé sur la page (approximatif)
-#elapsed = int(time.time() - start)
-#st.write(f"Temps passé sur cette page : {elapsed} secondes")
+
+@st.cache_resource
+def get_loan_view_cache():
+    """
+    Cache des simulations, créé une seule fois par processus et partagé entre toutes les sessions.
+    """
+    return BoundedCache(max_entries=512, max_bytes=128 * 1024 * 1024)
 
 
-def calculate_loan(principal, annual_interest_rate, duration_years):
+def default_interest_rate(duration_years, fallback=1.5):
+    """
+    Dernier taux relevé pour la durée donnée (lecture de l'historique SQLite seule : ni
+    téléchargement, ni import du service de taux). Le relevé périodique est démarré par
+    le préchauffage (page_data.prechauffer_taux).
+    """
+    try:
+        rate = get_rate_history().latest_rate(duration_years)
+    except Exception:
+        rate = None
+    if rate is None:
+        return fallback
+    return float(min(10.0, max(0.1, round(rate, 2))))
+
+
+@timed("simulateur.calculate_loan")
+def calculate_loan(principal, annual_interest_rate, duration_years, **options):
     """
     Calcule les détails du prêt immobilier.
 
@@ -22,119 +45,22 @@ def calculate_loan(principal, annual_interest_rate, duration_years):
         principal (float): Capital emprunté.
         annual_interest_rate (float): Taux d'intérêt annuel en pourcentage.
         duration_years (int): Durée du remboursement en années.
+        **options: Options du prêt (taux variable, assurance, différé, remboursements
+            anticipés), voir tools/loan_engine.variant_arrays.
 
     Returns:
         tuple: (montant_mensualite, cout_total_credit, tableau_amortissement)
     """
-    # Convertir le taux d'intérêt annuel en taux mensuel
-    monthly_interest_rate = (annual_interest_rate / 100) / 12
-    # Convertir la durée en années en mois
-    duration_months = duration_years * 12
-
-    if monthly_interest_rate == 0:
-        # Cas où le taux d'intérêt est de 0
-        monthly_payment = principal / duration_months
-        total_cost_of_credit = 0
-    else:
-        # Calcul de la mensualité (formule d'amortissement)
-        monthly_payment = (principal * monthly_interest_rate) / (1 - (1 + monthly_interest_rate)**(-duration_months))
-        # Calcul du coût total du crédit
-        total_cost_of_credit = (monthly_payment * duration_months) - principal
-
-    # Initialisation des listes pour le tableau d'amortissement
-    months = []
-    remaining_principal = []
-    # Il faut initialiser ces listes pour les données mensuelles
-    monthly_principal_paid = []
-    monthly_interest_paid = []  
-    cumulative_paid_principal = []
-    cumulative_paid_interest = []
-
-    current_principal = principal
-    cumulative_principal = 0
-    cumulative_interest = 0
-
-    # Construction du tableau d'amortissement
-    for month in range(1, duration_months + 1):
-        interest_for_month = current_principal * monthly_interest_rate
-        principal_for_month = monthly_payment - interest_for_month
-
-        # Ajustement pour le dernier mois afin d'éviter un capital restant négatif ou trop faible
-        if month == duration_months:
-            principal_for_month = current_principal # Le dernier remboursement de capital est ce qui reste dû
-            # Assurer que les intérêts ne sont pas négatifs à cause d'erreurs d'arrondi
-            interest_for_month = max(0, monthly_payment - principal_for_month)
-
-        current_principal -= principal_for_month
-        cumulative_principal += principal_for_month
-        cumulative_interest += interest_for_month
-
-        months.append(month)
-        remaining_principal.append(max(0, current_principal)) # Assurer que le capital restant ne soit pas négatif
-        # ENREGISTRER LES VALEURS MENSUELLES ICI
-        monthly_principal_paid.append(principal_for_month) # <--- AJOUTEZ CETTE LIGNE
-        monthly_interest_paid.append(interest_for_month)  # <--- AJOUTEZ CETTE LIGNE
-        cumulative_paid_principal.append(cumulative_principal)
-        cumulative_paid_interest.append(cumulative_interest)
-
-    # Création unique du DataFrame pour le tableau d'amortissement
- 
-    amortization_df = pd.DataFrame({
-        'Mois': months,
-        'Capital restant dû': remaining_principal,
-        'Capital remboursé (cumulé)': cumulative_paid_principal,
-        'Intérêts payés (cumulés)': cumulative_paid_interest,
-        'Capital remboursé du mois': monthly_principal_paid, # <--- Ces colonnes sont maintenant définies
-        'Intérêts du mois': monthly_interest_paid          # <--- Ces colonnes sont maintenant définies
-    })
-
-    return monthly_payment, total_cost_of_credit, amortization_df
-
-# Configuration de la page Streamlit
-
-
-st.set_page_config(
-    page_title="Simulateur de Prêt Immobilier",
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
-
-st.title("🏡 Simulateur de Prêt Immobilier")
-st.info("Veuillez entrer les paramètres de votre prêt et cliquer sur 'Calculer le Prêt' pour visualisez l'évolution de votre remboursement.")
-
-# Section des entrées utilisateur
-st.header("Paramètres du Prêt")
-# Crée deux colonnes pour le capital et le taux
-col1, col2, col3 = st.columns(3)
-
-with col1:
-    principal_loan = st.number_input("Capital emprunté (€)", min_value=10000, max_value=10000000, value=250000, step=10000)
-
-with col2:
-    interest_rate = st.number_input("Taux d'intérêt annuel (%)", min_value=0.1, max_value=10.0, value=1.5, step=0.01)
-with col3:
-    loan_duration_years = st.slider("Durée du remboursement (années)", min_value=1, max_value=30, value=20)
-
-
-# Calcul des résultats
-if st.button("Calculer le Prêt 🚀"):
-    monthly_payment, total_credit_cost, amortization_table = calculate_loan(
-        principal_loan, interest_rate, loan_duration_years
-    )
+    # Calcul vectorisé (forme fermée) du tableau d'amortissement, voir tools/loan_engine.py
+    if options:
+        return variant_schedule(principal, annual_interest_rate, duration_years, **options)
+    return amortization_schedule(principal, annual_interest_rate, duration_years)
 
-    st.subheader("Résultats du Prêt")
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.metric("Montant de la mensualité", f"{monthly_payment:,.2f} €")
-    with col2:
-        st.metric("Coût total du crédit", f"{total_credit_cost:,.2f} €")
-    with col3:
-        st.metric("Capital total remboursé", f"{principal_loan + total_credit_cost:,.2f} €")
-
-    st.markdown("---")
-
-    st.subheader("Graphique d'Amortissement")
 
+def build_amortization_figure(amortization_table):
+    """
+    Construit le graphique d'amortissement (capital restant dû, capital remboursé et intérêts cumulés).
+    """
     # Création du graphique Plotly
     fig = go.Figure()
 
@@ -179,10 +105,13 @@ if st.button("Calculer le Prêt 🚀"):
         margin=dict(l=20, r=20, t=50, b=20)
     )
 
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
 
-    # ##### Composition Mensuelle de la Mensualité (Intérêts vs Capital) ---
-    st.markdown("##### Composition Mensuelle de la Mensualité (Intérêts vs Capital)")
+
+def build_monthly_figure(amortization_table):
+    """
+    Construit le graphique de composition mensuelle de la mensualité (intérêts vs capital).
+    """
     fig_monthly = go.Figure()
 
     # Part d'intérêts mensuels
@@ -215,7 +144,199 @@ if st.button("Calculer le Prêt 🚀"):
         height=400,
         margin=dict(l=20, r=20, t=30, b=20)
     )
-    st.plotly_chart(fig_monthly, use_container_width=True)
+    return fig_monthly
+
+
+def build_scenarios_figure(principal, annual_interest_rate):
+    """
+    Construit la carte de chaleur des mensualités autour du taux choisi, pour des durées de 5 à 30 ans.
+    """
+    scenario_rates = np.round(np.arange(max(0.1, annual_interest_rate - 1), annual_interest_rate + 1.01, 0.25), 2)
+    scenario_durations = np.arange(5, 31, 5)
+    scenarios = simulate_batch(principal, scenario_rates, scenario_durations)
+
+    fig_scenarios = go.Figure(go.Heatmap(
+        z=scenarios['monthly_payment'][0],
+        x=[f"{d} ans" for d in scenario_durations],
+        y=[f"{r:.2f} %" for r in scenario_rates],
+        colorscale='Blues',
+        hovertemplate="Durée : %{x}<br>Taux : %{y}<br>Mensualité : %{z:,.2f} €<extra></extra>"
+    ))
+    fig_scenarios.update_layout(
+        xaxis_title="Durée du remboursement",
+        yaxis_title="Taux d'intérêt annuel",
+        height=400,
+        margin=dict(l=20, r=20, t=30, b=20)
+    )
+    return fig_scenarios
+
+
+def compute_loan_view(principal, annual_interest_rate, duration_years, options=None):
+    """
+    Calcule tout ce qu'affiche le simulateur pour un jeu de paramètres.
+
+    Le résultat est mis en cache (LRU borné, partagé entre les sessions). Les figures y
+    sont conservées sous forme d'objets Plotly : st.plotly_chart ne fait alors que les
+    sérialiser, alors qu'un dict (JSON relu) serait d'abord revalidé en reconstruisant
+    une figure. Elles sont partagées et ne doivent pas être modifiées ; le tableau
+    d'amortissement est rendu en copie.
+
+    Args:
+        options (dict, optional): Options du prêt passées à calculate_loan ; les valeurs
+            doivent être hachables (tuples plutôt que listes).
+
+    Returns:
+        dict: mensualité, coût total, tableau d'amortissement et figures.
+    """
+    options = options or {}
+    key = (
+        round(float(principal), 2), round(float(annual_interest_rate), 4), int(duration_years),
+        tuple(sorted(options.items())),
+    )
+
+    def compute():
+        monthly_payment, total_credit_cost, amortization_table = calculate_loan(
+            principal, annual_interest_rate, duration_years, **options
+        )
+        with stage("simulateur.figures", rows=len(amortization_table)):
+            figures = {
+                'fig_amortization': build_amortization_figure(amortization_table),
+                'fig_monthly': build_monthly_figure(amortization_table),
+                'fig_scenarios': build_scenarios_figure(principal, annual_interest_rate),
+            }
+        return {
+            'monthly_payment': monthly_payment,
+            'total_credit_cost': total_credit_cost,
+            'amortization_table': amortization_table,
+            **figures,
+        }
+
+    view = get_loan_view_cache().get_or_compute(key, compute)
+    return {**view, 'amortization_table': view['amortization_table'].copy()}
+
+
+# Simulations préchauffées : valeurs par défaut du formulaire et durées les plus courantes
+WARM_UP_PRINCIPAL = 250000
+WARM_UP_DURATIONS = (20, 15, 25)
+
+
+def prechauffer_simulations():
+    annual_interest_rate = default_interest_rate(20)
+    for duration_years in WARM_UP_DURATIONS:
+        compute_loan_view(WARM_UP_PRINCIPAL, annual_interest_rate, duration_years)
+
+
+@st.cache_resource
+def start_warm_up():
+    """
+    Préchauffage des caches partagés, lancé une seule fois par processus dans un thread
+    de fond (voir tools/startup.py) : taux, simulations courantes, page DVF par défaut.
+    """
+    return WarmUp([
+        ("taux", prechauffer_taux),
+        ("simulateur", prechauffer_simulations),
+        ("dvf", prechauffer_dvf),
+    ]).start()
+
+
+# Configuration de la page Streamlit
+
+
+st.set_page_config(
+    page_title="Simulateur de Prêt Immobilier",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
+# Mesures de cette exécution du script (panneau développeur en bas de page)
+begin_run()
+if warm_up_enabled():
+    start_warm_up()
+# Suivi de fréquentation (journal d'événements en ajout seul, voir tools/session_tracker.py)
+track_user("accueil")
+
+st.title("🏡 Simulateur de Prêt Immobilier")
+st.info("Veuillez entrer les paramètres de votre prêt et cliquer sur 'Calculer le Prêt' pour visualisez l'évolution de votre remboursement.")
+
+# Section des entrées utilisateur
+st.header("Paramètres du Prêt")
+# Crée deux colonnes pour le capital et le taux
+col1, col2, col3 = st.columns(3)
+
+with col1:
+    principal_loan = st.number_input("Capital emprunté (€)", min_value=10000, max_value=10000000, value=250000, step=10000)
+
+with col2:
+    # Pré-rempli avec le dernier taux relevé pour la durée par défaut (20 ans)
+    interest_rate = st.number_input("Taux d'intérêt annuel (%)", min_value=0.1, max_value=10.0,
+                                    value=default_interest_rate(20), step=0.01)
+with col3:
+    loan_duration_years = st.slider("Durée du remboursement (années)", min_value=1, max_value=30, value=20)
+
+# Options du prêt : seules les options renseignées sont transmises au calcul
+loan_options = {}
+with st.expander("Options avancées : taux variable, assurance, différé, remboursement anticipé"):
+    col1, col2 = st.columns(2)
+    with col1:
+        insurance_rate = st.number_input("Taux de l'assurance emprunteur (% par an)", min_value=0.0, max_value=2.0,
+                                         value=0.0, step=0.01)
+        insurance_basis = st.radio("Assurance calculée sur", ["Capital initial", "Capital restant dû"], horizontal=True)
+        if insurance_rate > 0:
+            loan_options['insurance_rate'] = insurance_rate
+            loan_options['insurance_basis'] = 'initial' if insurance_basis == "Capital initial" else 'remaining'
+
+        deferral_months = st.number_input("Différé d'amortissement (mois)", min_value=0, max_value=36, value=0)
+        deferral_type = st.radio("Type de différé", ["Partiel (intérêts payés)", "Total (intérêts capitalisés)"],
+                                 horizontal=True)
+        if deferral_months > 0:
+            loan_options['deferral_months'] = int(deferral_months)
+            loan_options['deferral_type'] = 'partial' if deferral_type.startswith("Partiel") else 'total'
+    with col2:
+        revision_month = st.number_input("Révision du taux à partir du mois (0 = taux fixe)", min_value=0,
+                                         max_value=loan_duration_years * 12, value=0)
+        revised_rate = st.number_input("Nouveau taux annuel (%)", min_value=0.0, max_value=10.0,
+                                       value=float(interest_rate), step=0.01)
+        rate_cap = st.number_input("Cap de variation du taux (points, 0 = sans cap)", min_value=0.0, max_value=5.0,
+                                   value=1.0, step=0.25)
+        if revision_month > 0:
+            loan_options['rate_changes'] = ((int(revision_month), revised_rate),)
+            if rate_cap > 0:
+                loan_options['rate_cap'] = rate_cap
+
+        repayment_month = st.number_input("Remboursement anticipé au mois (0 = aucun)", min_value=0,
+                                          max_value=loan_duration_years * 12, value=0)
+        repayment_amount = st.number_input("Montant remboursé par anticipation (€)", min_value=0, value=0, step=1000)
+        repayment_mode = st.radio("Après le remboursement anticipé", ["Réduire la durée", "Réduire la mensualité"],
+                                  horizontal=True)
+        if repayment_month > 0 and repayment_amount > 0:
+            loan_options['early_repayments'] = ((int(repayment_month), float(repayment_amount)),)
+            loan_options['early_repayment_mode'] = 'duration' if repayment_mode == "Réduire la durée" else 'payment'
+
+
+# Calcul des résultats
+if st.button("Calculer le Prêt 🚀"):
+    loan_view = compute_loan_view(principal_loan, interest_rate, loan_duration_years, loan_options)
+    monthly_payment = loan_view['monthly_payment']
+    total_credit_cost = loan_view['total_credit_cost']
+    amortization_table = loan_view['amortization_table']
+
+    st.subheader("Résultats du Prêt")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Montant de la mensualité", f"{monthly_payment:,.2f} €")
+    with col2:
+        st.metric("Coût total du crédit", f"{total_credit_cost:,.2f} €")
+    with col3:
+        st.metric("Capital total remboursé", f"{principal_loan + total_credit_cost:,.2f} €")
+
+    st.markdown("---")
+
+    st.subheader("Graphique d'Amortissement")
+
+    st.plotly_chart(loan_view['fig_amortization'], use_container_width=True)
+
+    # ##### Composition Mensuelle de la Mensualité (Intérêts vs Capital) ---
+    st.markdown("##### Composition Mensuelle de la Mensualité (Intérêts vs Capital)")
+    st.plotly_chart(loan_view['fig_monthly'], use_container_width=True)
 
     st.subheader("Tableau d'Amortissement")
     st.dataframe(amortization_table.style.format({
@@ -224,14 +345,56 @@ if st.button("Calculer le Prêt 🚀"):
         'Intérêts payés (cumulés)': "{:,.2f} €"
     }))
 
+    # ##### Comparaison de scénarios (taux × durée) ---
+    st.subheader("Et si ? Mensualité selon le taux et la durée")
+    st.plotly_chart(loan_view['fig_scenarios'], use_container_width=True)
+
 #else:
     #st.info("Veuillez cliquer sur 'Calculer le Prêt' pour voir les résultats.")
 
 
+# Section capacité d'emprunt (calcul inverse : capital maximal pour une mensualité donnée)
+st.markdown("---")
+st.header("Capacité d'Emprunt")
+col1, col2, col3 = st.columns(3)
+with col1:
+    monthly_budget = st.number_input("Mensualité souhaitée (€)", min_value=100, max_value=50000, value=1200, step=50)
+with col2:
+    monthly_income = st.number_input("Revenus mensuels nets (€, 0 = non renseignés)", min_value=0, value=0, step=100)
+with col3:
+    existing_charges = st.number_input("Crédits en cours (€ par mois)", min_value=0, value=0, step=50)
+
+# Plafond de 35 % d'endettement, assurance comprise, si les revenus sont renseignés
+# Mêmes options (assurance, différé) pour la durée choisie et le tableau par durée
+capacity_options = dict(
+    monthly_income=monthly_income or None,
+    existing_charges=existing_charges,
+    insurance_rate=loan_options.get('insurance_rate', 0.0),
+    insurance_basis=loan_options.get('insurance_basis', 'initial'),
+    deferral_months=loan_options.get('deferral_months', 0),
+    deferral_type=loan_options.get('deferral_type', 'partial'),
+)
+capacity = max_principal(interest_rate, loan_duration_years, monthly_budget, **capacity_options)
+st.metric(f"Capital empruntable sur {loan_duration_years} ans", f"{capacity:,.2f} €")
+
+capacity_durations = np.arange(10, 31, 5)
+by_duration = capacity_batch([monthly_budget], capacity_durations, interest_rate, **capacity_options)
+st.dataframe(pd.DataFrame({
+    'Durée': [f"{d} ans" for d in capacity_durations],
+    'Capital empruntable': by_duration['capacity'][0],
+}).style.format({'Capital empruntable': "{:,.2f} €"}), hide_index=True)
+
+
 st.sidebar.markdown("---")
 st.sidebar.title("Actualité des taux")
 st.sidebar.page_link("pages/taux.py", label=" 📈%📉")
 
 st.markdown("---")
 st.sidebar.title("Retrouvez les dernières ventes près de chez vous")
-st.sidebar.page_link("pages/etalab.py", label=" 🏘️ 📉")
\ No newline at end of file
+st.sidebar.page_link("pages/etalab.py", label=" 🏘️ 📉")
+
+# Panneau des mesures, visible en mode développeur (SIMIMMO_DEV=1 ou ?dev=1)
+sidebar_panel()
+if dev_mode() and warm_up_enabled():
+    with st.sidebar.expander("🔥 Préchauffage (développeur)", expanded=False):
+        st.dataframe(start_warm_up().status_frame())
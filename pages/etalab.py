@@ -2,6 +2,21 @@
 import streamlit as st
 import pandas as pd
 
+from tools.dvf_aggregates import ALL_TYPES, market_summary
+from tools.instrumentation import begin_run, sidebar_panel, stage
+from tools.page_data import (
+    annees_disponibles,
+    charger_comparables,
+    charger_index_adresses,
+    charger_mutations,
+    charger_synthese,
+    ouvrir_mutations_partagees,
+)
+from tools.session_tracker import track_user
+
+# Mesures de cette exécution du script (panneau développeur en bas de page)
+begin_run()
+track_user("etalab")
 
 st.title("Visualisation des données DVF")
 
@@ -16,42 +31,177 @@ st.markdown("""
 Cette page permet d'explorer les transactions immobilières enregistrées dans la base publique **DVF (Demandes de Valeurs Foncières)**.
 """)
 
-# ----------- Téléchargement d'un fichier local exemple ----------- #
-@st.cache_data
-def charger_donnees(departement):
-    """
-    Charge un fichier CSV DVF pour un département donné.
-    Exemple : 'DVF_Paris.csv'
-    """
-    try:
-        df = pd.read_csv(f"data/DVF_{departement}.csv", delimiter='|')
-        return df
-    except FileNotFoundError:
-        st.error(f"Fichier DVF pour le département {departement} introuvable dans le dossier 'data/'.")
-        return pd.DataFrame()
-
-
 # ----------- Sélecteur de département ----------- #
+# Le premier département (DEPARTEMENT_PAR_DEFAUT) est préchargé au démarrage (voir tools/page_data.py)
 departement = st.selectbox("Choisir un département :", ["75", "13", "33", "69", "59"], format_func=lambda x: f"{x} - {x}")
 
-# Chargement des données
-df = charger_donnees(departement)
+# Mutations projetées en mémoire, partagées par toutes les sessions (voir tools/dvf_mapped.py) :
+# l'année et le code postal sélectionnent une tranche précalculée, sans copie ni masque
+jeu_partage = ouvrir_mutations_partagees(departement)
+if jeu_partage is not None:
+    annee = st.selectbox("Filtrer par année :", jeu_partage.years())
+    code_postal = st.selectbox("Code postal :", ["Tous"] + jeu_partage.postal_codes(annee))
+    with stage("dvf.tranche") as mesure:
+        df = jeu_partage.frame(annee, None if code_postal == "Tous" else code_postal)
+        mesure.rows = len(df)
+    nb_lots = int(df["nb_lots"].sum())
+else:
+    # Les années disponibles se lisent dans les noms de partitions, sans charger de données
+    annees_stockees = annees_disponibles(departement)
+    if annees_stockees:
+        annee = st.selectbox("Filtrer par année :", annees_stockees)
+        df, lots = charger_mutations(departement, annee)
+    else:
+        annee = None
+        df, lots = charger_mutations(departement)
+    nb_lots = len(lots)
+
+# ----------- Synthèse du marché (agrégats précalculés, sans lecture des transactions) ----------- #
+synthese = charger_synthese()
+if annee is not None and not synthese.empty:
+    marche = market_summary(synthese, departement, annee)
+    if not marche.empty:
+        st.subheader(f"Synthèse du marché en {annee}")
+        marche = marche[marche["type_local"].isin(["Appartement", "Maison", ALL_TYPES])]
+        st.dataframe(
+            marche[["code_postal", "type_local", "transactions", "volume", "prix_m2_q25", "prix_m2_median", "prix_m2_q75"]]
+            .rename(columns={
+                "code_postal": "Code postal",
+                "type_local": "Type de local",
+                "transactions": "Ventes",
+                "volume": "Volume (€)",
+                "prix_m2_q25": "Prix/m² (1er quartile)",
+                "prix_m2_median": "Prix/m² médian",
+                "prix_m2_q75": "Prix/m² (3e quartile)",
+            })
+            .style.format({
+                "Volume (€)": "{:,.0f} €",
+                "Prix/m² (1er quartile)": "{:,.0f} €",
+                "Prix/m² médian": "{:,.0f} €",
+                "Prix/m² (3e quartile)": "{:,.0f} €",
+            }, na_rep="-"),
+            hide_index=True,
+        )
+
+        ventes_par_mois = (
+            synthese.xs((departement, ALL_TYPES, int(annee)), level=["code_departement", "type_local", "annee"])
+            .groupby(level="mois")["transactions"].sum()
+            .drop(0, errors="ignore")
+        )
+        st.write("Nombre de ventes par mois")
+        st.bar_chart(ventes_par_mois)
 
 if not df.empty:
     # Affichage des 100 premières lignes
     st.subheader("Aperçu des transactions foncières")
-    st.dataframe(df.head(100))
-
-    # Filtrage par année si colonne 'date_mutation' présente
-    if "date_mutation" in df.columns:
-        df["date_mutation"] = pd.to_datetime(df["date_mutation"], errors='coerce')
-        annees_disponibles = df["date_mutation"].dt.year.dropna().unique()
-        annee = st.selectbox("Filtrer par année :", sorted(annees_disponibles, reverse=True))
-        df_filtré = df[df["date_mutation"].dt.year == annee]
+    st.caption(f"{len(df)} ventes regroupant {nb_lots} lots distincts.")
+    st.dataframe(df.drop(columns=["premier_lot"], errors="ignore").head(100))
+
+    # Filtrage par année (colonne 'annee' calculée à l'ingestion)
+    if "annee" in df.columns:
+        if annee is None:
+            annees_presentes = df["annee"].dropna().unique()
+            annee = st.selectbox("Filtrer par année :", sorted(annees_presentes, reverse=True))
+            df_filtré = df[df["annee"] == annee]
+        else:
+            df_filtré = df
 
         st.write(f"Nombre de transactions en {annee} : {len(df_filtré)}")
-        st.dataframe(df_filtré.head(50))
+        st.dataframe(df_filtré.drop(columns=["premier_lot"], errors="ignore").head(50))
 
 else:
     st.warning("Aucune donnée à afficher.")
 
+# ----------- Ventes d'une rue (index d'adresses : recherche sans parcourir les données) ----------- #
+st.subheader("Ventes dans ma rue")
+col1, col2 = st.columns([3, 1])
+with col1:
+    rue = st.text_input("Rue :", placeholder="ex : rue Le Chapelier")
+with col2:
+    code_postal_rue = st.text_input("Code postal (facultatif) :", max_chars=5)
+if rue:
+    index_adresses = charger_index_adresses(departement)
+    with stage("dvf.recherche_rue") as mesure:
+        rues = index_adresses.search(rue, code_postal=code_postal_rue.strip() or None)
+        mesure.rows = len(index_adresses)
+    if rues.empty:
+        st.info("Aucune rue correspondante dans ce département.")
+    else:
+        choix = st.selectbox(
+            "Rue trouvée :", range(len(rues)),
+            format_func=lambda i: f"{rues['voie'][i]} — {rues['code_postal'][i]} {rues['nom_commune'][i]} "
+                                  f"({rues['ventes'][i]} ventes)",
+        )
+        ventes_rue = index_adresses.sales(rues["cle"][choix]).sort_values("date_mutation", ascending=False)
+        st.dataframe(ventes_rue.drop(columns=["voie"]), hide_index=True)
+
+# ----------- Estimation d'un bien par comparables (k ventes les plus semblables) ----------- #
+st.subheader("Estimer un bien")
+comparables_index = charger_comparables(departement)
+if len(comparables_index) == 0:
+    st.info("Aucune vente comparable disponible pour ce département.")
+else:
+    centre = comparables_index.sales[["latitude", "longitude"]].median()
+    col1, col2 = st.columns(2)
+    with col1:
+        lat_bien = st.number_input("Latitude du bien :", value=float(centre["latitude"]), format="%.6f")
+        lon_bien = st.number_input("Longitude du bien :", value=float(centre["longitude"]), format="%.6f")
+        type_bien = st.selectbox("Type de bien :", [t for t in ["Appartement", "Maison"] if t in comparables_index.types])
+    with col2:
+        surface_bien = st.number_input("Surface (m²) :", min_value=5, max_value=2000, value=60)
+        pieces_bien = st.number_input("Nombre de pièces :", min_value=1, max_value=20, value=3)
+        k = st.slider("Nombre de comparables :", min_value=3, max_value=30, value=10)
+
+    if type_bien is None:
+        # Aucune vente d'appartement ni de maison dans le département : rien à comparer
+        st.info("Aucune vente d'appartement ou de maison pour ce département.")
+    else:
+        with stage("dvf.estimation", rows=len(comparables_index)):
+            estimation, comparables = comparables_index.estimate(
+                lat_bien, lon_bien, type_bien, surface_bien, pieces_bien, k
+            )
+        if comparables.empty:
+            st.info("Aucune vente comparable trouvée.")
+        else:
+            st.metric(
+                "Valeur estimée",
+                f"{estimation['valeur_estimee']:,.0f} €",
+                help=f"Fourchette : {estimation['valeur_basse']:,.0f} € – {estimation['valeur_haute']:,.0f} €",
+            )
+            st.write(
+                f"Prix au m² : **{estimation['prix_m2_median']:,} €** "
+                f"(de {estimation['prix_m2_bas']:,} € à {estimation['prix_m2_haut']:,} €), "
+                f"d'après {estimation['comparables']} ventes dans un rayon de {estimation['rayon_m']:,} m."
+            )
+            st.dataframe(
+                comparables[["date_mutation", "adresse_numero", "adresse_nom_voie", "code_postal", "surface_reelle_bati",
+                             "nombre_pieces_principales", "valeur_fonciere", "prix_m2", "distance_m"]]
+                .style.format({"valeur_fonciere": "{:,.0f} €", "prix_m2": "{:,.0f} €", "distance_m": "{:,.0f} m"}),
+                hide_index=True,
+            )
+
+    # Portefeuille : un fichier CSV d'un bien par ligne, estimé en une fois
+    portefeuille = st.file_uploader(
+        "Estimer un portefeuille (CSV : latitude, longitude, type_local, surface, pieces)", type="csv"
+    )
+    if portefeuille is not None:
+        biens = pd.read_csv(portefeuille)
+        manquantes = {"latitude", "longitude", "type_local", "surface"} - set(biens.columns)
+        if manquantes:
+            st.error(f"Colonnes manquantes dans le fichier : {', '.join(sorted(manquantes))}")
+        else:
+            try:
+                with stage("dvf.estimation_portefeuille", rows=len(biens)):
+                    estimations = comparables_index.estimate_portfolio(biens, k)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                st.dataframe(estimations, hide_index=True)
+                st.download_button(
+                    "Télécharger les estimations", estimations.to_csv(index=False).encode("utf-8"),
+                    file_name="estimations.csv", mime="text/csv",
+                )
+
+
+# Panneau des mesures, visible en mode développeur (SIMIMMO_DEV=1 ou ?dev=1)
+sidebar_panel()
@@ -1,46 +1,60 @@
-import requests
-from bs4 import BeautifulSoup
+import time
+
 import streamlit as st
 
+from tools.instrumentation import begin_run, sidebar_panel, timed
+from tools.page_data import get_rate_history, get_rate_service
+from tools.session_tracker import track_user
+
+# Mesures de cette exécution du script (panneau développeur en bas de page)
+begin_run()
+track_user("taux")
+
 # -------------------- Interface Streamlit -------------------- #
 st.title("Taux Moyen Immobilier ")
 st.write("Récupération du taux moyen affiché sur les sites spécialisés.")
 
-# -------------------- Fonction de scraping -------------------- #
-def get_meilleurtaux_rate():
+# -------------------- Service de récupération -------------------- #
+# Service et historique partagés avec le simulateur, préchauffés au démarrage (voir tools/page_data.py)
+@timed("taux.recuperer", rows=len)
+def recuperer_taux():
     """
-    Récupère le taux moyen immobilier sur 15 ans depuis le site Meilleurtaux.
+    Taux de toutes les sources (cache partagé) ; les nouveaux relevés rejoignent l'historique.
     """
-    url = "https://www.meilleurtaux.com/"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        credit_immobilier_card = soup.find('a', class_='cards fc', href='/demande-simulation/credit-immobilier/')
-        if credit_immobilier_card:
-            foot_div = credit_immobilier_card.find('div', class_='foot')
-            if foot_div:
-                rate_tag = foot_div.find('b')
-                if rate_tag:
-                    rate_text = rate_tag.get_text(strip=True)
-                    cleaned_rate = rate_text.replace(',', '.').replace('%', '').strip()
-                    return cleaned_rate
-                else:
-                    st.error("Impossible de trouver la balise <b> contenant le taux.")
-            else:
-                st.error("Impossible de trouver le div 'foot' pour le crédit immobilier.")
-        else:
-            st.error("Impossible de trouver la carte 'Crédit immobilier'.")
-    except requests.exceptions.RequestException as e:
-        st.error(f"Erreur lors de la récupération de la page web : {e}")
-    except Exception as e:
-        st.error(f"Une erreur inattendue s'est produite : {e}")
-    return None
+    results = get_rate_service().get_rates()
+    get_rate_history().record(results)
+    return results
 
 
+def afficher_erreur(result):
+    if result.stale:
+        st.warning(
+            f"Source indisponible ({result.error}) : affichage de la dernière valeur connue, "
+            f"récupérée le {time.strftime('%d/%m/%Y à %H:%M', time.localtime(result.fetched_at))}."
+        )
+    else:
+        st.error(f"Erreur lors de la récupération des taux : {result.error}")
 
 
+def get_meilleurtaux_rate():
+    """
+    Récupère le taux moyen immobilier sur 15 ans depuis le site Meilleurtaux.
+    """
+    result = recuperer_taux()["meilleurtaux"]
+    if result.error:
+        afficher_erreur(result)
+    return result.rates["15 ans"] if result.rates else None
+
+
+def get_empruntis_meilleurs_taux():
+    """
+    Récupère les meilleurs taux immobiliers (15, 20, 25 ans) depuis la page Empruntis.
+    Retourne un dictionnaire avec les durées comme clés et les taux en float.
+    """
+    result = recuperer_taux()["empruntis"]
+    if result.error:
+        afficher_erreur(result)
+    return result.rates
 
 
 if st.button("Afficher le taux sur Meilleurtaux.com"):
@@ -52,45 +66,6 @@ if st.button("Afficher le taux sur Meilleurtaux.com"):
             st.warning("Le taux n'a pas pu être récupéré. Veuillez réessayer plus tard ou vérifier la structure du site.")
 
 
-
-def get_empruntis_meilleurs_taux():
-    """
-    Récupère les meilleurs taux immobiliers (15, 20, 25 ans) depuis la page Empruntis.
-    Retourne un dictionnaire avec les durées comme clés et les taux en float.
-    """
-    url = "https://www.empruntis.com/financement/actualites/barometres_regionaux.php"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        bloc_taux = soup.find("div", class_="blocs_meilleur_taux")
-        if not bloc_taux:
-            st.error("Bloc des meilleurs taux non trouvé sur Empruntis.")
-            return None
-
-        taux_dict = {}
-        for taux_div in bloc_taux.find_all("div", class_="body_taux"):
-            duree = taux_div.find("span", class_="txt_taux")
-            taux = taux_div.find("span", class_="taux")
-            if duree and taux:
-                # Ex: "sur 15 ans(1)" → extraire juste "15 ans"
-                duree_text = duree.get_text(strip=True).split('(')[0].replace("sur ", "")
-                taux_text = taux.get_text(strip=True).replace('%', '').replace(',', '.')
-                try:
-                    taux_float = float(taux_text)
-                    taux_dict[duree_text] = taux_float
-                except ValueError:
-                    st.warning(f"Taux non convertible en float : {taux_text}")
-        return taux_dict if taux_dict else None
-
-    except requests.exceptions.RequestException as e:
-        st.error(f"Erreur lors de la récupération de la page Empruntis : {e}")
-    except Exception as e:
-        st.error(f"Une erreur inattendue s'est produite : {e}")
-
-    return None
-
 if st.button("Actualiser les taux Empruntis"):
     with st.spinner("Récupération des meilleurs taux Empruntis en cours..."):
         taux_empruntis = get_empruntis_meilleurs_taux()
@@ -101,7 +76,32 @@ if st.button("Actualiser les taux Empruntis"):
             st.warning("Les taux Empruntis n'ont pas pu être récupérés.")
 
 
+historique = get_rate_history().range()
+if historique["date"].nunique() > 1:
+    st.subheader("Évolution des taux relevés")
+    historique["serie"] = historique["source"] + " " + historique["duree"]
+    st.line_chart(historique.pivot_table(index="date", columns="serie", values="taux"))
+
+
+latences = get_rate_service().latencies()
+if latences:
+    with st.expander("Temps de réponse des sources"):
+        st.dataframe(
+            [
+                {
+                    "Source": source,
+                    "Téléchargement (ms)": round(l["fetch_seconds"] * 1000),
+                    "Analyse (ms)": round(l["parse_seconds"] * 1000),
+                    "Erreur": l["error"] or "",
+                }
+                for source, l in latences.items()
+            ],
+            hide_index=True,
+        )
+
+
 st.markdown("---")
 st.markdown("Note : Le scraping web peut être affecté par les changements de structure du site web cible. Si le taux ne s'affiche plus, le code de scraping pourrait nécessiter une mise à jour :)")
 
-
+# Panneau des mesures, visible en mode développeur (SIMIMMO_DEV=1 ou ?dev=1)
+sidebar_panel()
@@ -1,13 +1,27 @@
+import os
+import sys
 import streamlit as st
 import pandas as pd
-import folium
-from folium.plugins import MarkerCluster
-from geopy.distance import geodesic
+import math
 import io # Pour gérer le fichier CSV directement en mémoire
 
+# Rend le dossier 'tools' importable quand la page est lancée seule (streamlit run "test DVF/app_map.py")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.dvf_mutations import build_mutations, lots_of
+from tools.dvf_store import normalize_dvf
+from tools.instrumentation import begin_run, sidebar_panel, stage
+from tools.map_clusters import bounds_from_map_state, cluster_members, cluster_points, clusters_geojson
+from tools.spatial_index import GridIndex
+from tools.startup import lazy_import
+
+# Folium n'est importé qu'à la construction de la carte (voir tools/startup.py)
+folium = lazy_import("folium")
+
 # --- Configuration de la page Streamlit ---
 st.set_page_config(layout="wide")
 st.title("Visualisation des Mutations Immobilières")
+# Mesures de cette exécution du script (panneau développeur en bas de page)
+begin_run()
 
 # --- Votre jeu de données (simulé ici, mais vous utiliserez votre fichier téléchargé) ---
 # En temps normal, vous auriez déjà votre fichier 'full.csv' téléchargé
@@ -28,18 +42,32 @@ csv_data = """id_mutation,date_mutation,numero_disposition,nature_mutation,valeu
 # Utilisez StringIO pour simuler la lecture du fichier téléchargé 'full.csv'
 # Dans votre cas réel, après le téléchargement, vous feriez :
 # df_dvf = pd.read_csv('full.csv', sep=',') # ou le bon délimiteur
-try:
-    df_dvf = pd.read_csv(io.StringIO(csv_data), sep=',')
-    
+# Lu et nettoyé une seule fois par processus, puis partagé sans copie par toutes les
+# sessions et toutes les réexécutions (les données ne sont jamais modifiées par la page)
+@st.cache_resource
+def charger_mutations_carte():
+    with stage("carte.read_csv") as mesure:
+        df_dvf = pd.read_csv(io.StringIO(csv_data), sep=',')
+        mesure.rows = len(df_dvf)
+
     # Nettoyage des colonnes de lat/lon (convertir en numérique et supprimer les NaN)
     df_dvf['latitude'] = pd.to_numeric(df_dvf['latitude'], errors='coerce')
     df_dvf['longitude'] = pd.to_numeric(df_dvf['longitude'], errors='coerce')
     df_dvf.dropna(subset=['latitude', 'longitude'], inplace=True)
-    
-    st.success("Données de mutations chargées avec succès !")
+
+    # Une ligne par mutation : les lots répétés d'une même vente sont regroupés (voir tools/dvf_mutations.py)
+    with stage("carte.mutations", rows=len(df_dvf)):
+        return build_mutations(normalize_dvf(df_dvf))
+
+
+try:
+    df_mutations, df_lots = charger_mutations_carte()
+
+    st.success(f"Données de mutations chargées avec succès ! ({len(df_mutations)} ventes, {len(df_lots)} lots)")
     # st.dataframe(df_dvf.head()) # Décommentez pour voir les premières lignes du DataFrame
 except Exception as e:
     st.error(f"Erreur lors du chargement des données CSV : {e}")
+    sidebar_panel()
     st.stop() # Arrête l'exécution si le chargement échoue
 
 # --- Saisie des coordonnées par l'utilisateur ---
@@ -55,27 +83,37 @@ search_radius_meters = st.sidebar.slider("Rayon de recherche (mètres) :", min_v
 # Créer un point de référence à partir de l'entrée utilisateur
 center_point = (input_lat, input_lon)
 
-# Filtrer les mutations dans le rayon spécifié
-mutations_in_radius = []
-for index, row in df_dvf.iterrows():
-    mutation_point = (row['latitude'], row['longitude'])
-    distance = geodesic(center_point, mutation_point).meters
-    if distance <= search_radius_meters:
-        mutations_in_radius.append(row)
+# Index spatial construit une seule fois par processus (les données sont fixes). Il ne
+# prend pas les tableaux de coordonnées en argument, qui seraient hachés à chaque
+# réexécution : il les lit dans le jeu de mutations, lui-même en cache.
+@st.cache_resource
+def construire_index_spatial():
+    mutations, _ = charger_mutations_carte()
+    return GridIndex(mutations['latitude'].to_numpy(), mutations['longitude'].to_numpy())
 
-df_filtered = pd.DataFrame(mutations_in_radius)
+spatial_index = construire_index_spatial()
+
+# Filtrer les mutations dans le rayon spécifié (grille + haversine vectorisée, voir tools/spatial_index.py)
+with stage("carte.filtre_rayon", rows=len(df_mutations)):
+    positions_in_radius = spatial_index.query_radius(input_lat, input_lon, search_radius_meters)
+    df_filtered = df_mutations.iloc[positions_in_radius]
 
 st.subheader(f"Mutations trouvées dans un rayon de {search_radius_meters} mètres:")
 st.write(f"Nombre de mutations trouvées : **{len(df_filtered)}**")
 
 if not df_filtered.empty:
-    st.dataframe(df_filtered[['date_mutation', 'valeur_fonciere', 'adresse_nom_voie', 'latitude', 'longitude']])
+    st.dataframe(df_filtered[['date_mutation', 'valeur_fonciere', 'adresse_nom_voie', 'type_local', 'nb_lots', 'latitude', 'longitude']])
 else:
     st.info("Aucune mutation trouvée dans ce rayon.")
 
 # --- Affichage de la carte ---
 st.subheader("Carte des Mutations")
 
+# Zoom et zone visible de la carte au dernier affichage (renvoyés par st_folium)
+MAP_KEY = "carte_mutations"
+etat_carte = st.session_state.get(MAP_KEY) or {}
+zoom = int(etat_carte.get("zoom") or 15)
+
 # Créer une carte Folium centrée sur le point de recherche
 m = folium.Map(location=[input_lat, input_lon], zoom_start=15)
 
@@ -98,24 +136,59 @@ folium.Marker(
 ).add_to(m)
 
 
-# Ajouter les mutations filtrées sur la carte
-if not df_filtered.empty:
-    marker_cluster = MarkerCluster().add_to(m)
-    for idx, row in df_filtered.iterrows():
-        # Créer un popup avec les informations importantes
-        popup_html = f"""
-        <b>Date:</b> {row['date_mutation']}<br>
-        <b>Valeur:</b> {row['valeur_fonciere']}<br>
-        <b>Adresse:</b> {row['adresse_numero'] if pd.notna(row['adresse_numero']) else ''} {row['adresse_nom_voie']}<br>
-        <b>Code Postal:</b> {row['code_postal']}<br>
-        <b>Type Local:</b> {row['type_local'] if pd.notna(row['type_local']) else 'N/A'}<br>
-        <b>Surface Terrain:</b> {row['surface_terrain'] if pd.notna(row['surface_terrain']) else 'N/A'} m²
-        """
-        folium.Marker(
-            location=[row['latitude'], row['longitude']],
-            popup=folium.Popup(popup_html, max_width=300)
-        ).add_to(marker_cluster)
-
-# Afficher la carte dans Streamlit
+# Ventes regroupées côté serveur selon le zoom et la zone visible (voir tools/map_clusters.py) :
+# seuls les groupes visibles sont envoyés, en GeoJSON compact, sans popup HTML
+with stage("carte.regroupement", rows=len(df_filtered)):
+    clusters = cluster_points(
+        df_filtered['latitude'].to_numpy(), df_filtered['longitude'].to_numpy(),
+        zoom, bounds_from_map_state(etat_carte)
+    )
+couche_ventes = folium.FeatureGroup(name="Ventes")
+if not clusters.empty:
+    folium.GeoJson(
+        clusters_geojson(clusters),
+        marker=folium.CircleMarker(radius=6, color='darkgreen', fill=True, fill_opacity=0.7),
+        style_function=lambda feature: {"radius": 6 + 3 * math.log2(feature["properties"]["n"])},
+        tooltip=folium.GeoJsonTooltip(fields=["n"], aliases=["Ventes :"]),
+    ).add_to(couche_ventes)
+
+# La couche des ventes est ajoutée sans recharger la carte : le zoom et la position sont conservés
 from streamlit_folium import st_folium
-st_folium(m, width=1000, height=600)
\ No newline at end of file
+with stage("carte.folium", rows=len(clusters)):
+    etat_carte = st_folium(
+        m, key=MAP_KEY, width=1000, height=600,
+        feature_group_to_add=couche_ventes,
+        returned_objects=["zoom", "bounds", "last_active_drawing"],
+    )
+
+# --- Détail d'une vente ou d'un groupe, construit seulement au clic ---
+selection = (etat_carte or {}).get("last_active_drawing") or {}
+position = (selection.get("properties") or {}).get("i")
+membres = []
+if position is not None and position < len(df_filtered):
+    lon_clic, lat_clic = selection["geometry"]["coordinates"]
+    vente = df_filtered.iloc[int(position)]
+    # Le clic peut dater d'une autre recherche : on vérifie que la vente est proche du point cliqué
+    if abs(vente['latitude'] - lat_clic) < 0.01 and abs(vente['longitude'] - lon_clic) < 0.01:
+        membres = cluster_members(
+            df_filtered['latitude'].to_numpy(), df_filtered['longitude'].to_numpy(), zoom, int(position)
+        )
+if len(membres) == 1:
+    vente = df_filtered.iloc[membres[0]]
+    st.markdown("  \n".join([
+        f"**Date :** {vente['date_mutation']:%Y-%m-%d}",
+        f"**Valeur :** {vente['valeur_fonciere']}",
+        f"**Adresse :** {vente['adresse_numero'] if pd.notna(vente['adresse_numero']) else ''} {vente['adresse_nom_voie']}",
+        f"**Code Postal :** {vente['code_postal']}",
+        f"**Type Local :** {vente['type_local'] if pd.notna(vente['type_local']) else 'N/A'}",
+        f"**Surface Bâtie :** {vente['surface_reelle_bati'] if pd.notna(vente['surface_reelle_bati']) else 'N/A'} m²",
+        f"**Surface Terrain :** {vente['surface_terrain'] if pd.notna(vente['surface_terrain']) else 'N/A'} m²",
+        f"**Lots :** {vente['nb_lots']}",
+    ]))
+    st.dataframe(lots_of(df_mutations, df_lots, positions_in_radius[membres[0]]))
+elif len(membres) > 1:
+    st.write(f"**{len(membres)} ventes** dans ce groupe (zoomez pour les séparer) :")
+    st.dataframe(df_filtered.iloc[membres][['date_mutation', 'valeur_fonciere', 'adresse_nom_voie', 'type_local', 'nb_lots']])
+
+# Panneau des mesures, visible en mode développeur (SIMIMMO_DEV=1 ou ?dev=1)
+sidebar_panel()
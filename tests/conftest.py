@@ -0,0 +1,6 @@
+# tests/conftest.py
+
+import os
+
+# Les mesures des étapes (tools/instrumentation.py) ne sont pas journalisées pendant les tests
+os.environ.setdefault("SIMIMMO_PERF_LOG", "")
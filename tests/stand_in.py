@@ -0,0 +1,52 @@
+# tests/stand_in.py
+#
+# Serveur HTTP de substitution pour les tests des services distants (taux, géocodage).
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+
+class StandInServer:
+    """
+    Serveur HTTP local : chaque chemin (sans la chaîne de requête) sert une page
+    (statut, corps, délai) modifiable pendant le test, et les requêtes reçues sont
+    comptées par chemin.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.hits = {}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = urlsplit(self.path).path
+                server.hits[path] = server.hits.get(path, 0) + 1
+                status, body, delay = server.routes.get(path, (404, "", 0))
+                time.sleep(delay)
+                payload = body.encode("utf-8")
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def serve(self, path, body, status=200, delay=0):
+        self.routes[path] = (status, body, delay)
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
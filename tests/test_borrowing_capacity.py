@@ -0,0 +1,84 @@
+# tests/test_borrowing_capacity.py
+#
+# Capacité d'emprunt (tools/borrowing_capacity.py) : le capital trouvé, simulé par
+# tools/loan_engine.variant_arrays, doit donner une mensualité la plus élevée égale au
+# budget, lui-même plafonné par le taux d'endettement.
+
+import numpy as np
+import pytest
+
+from tools.borrowing_capacity import (
+    affordable_payment, capacity_batch, max_principal, max_principal_variant,
+)
+from tools.loan_engine import variant_arrays
+
+OPTIONS = [
+    {},
+    {'insurance_rate': 0.36, 'insurance_basis': 'initial'},
+    {'insurance_rate': 0.36, 'insurance_basis': 'remaining'},
+    {'deferral_months': 18, 'deferral_type': 'partial'},
+    {'deferral_months': 18, 'deferral_type': 'total'},
+    {'insurance_rate': 0.3, 'insurance_basis': 'remaining', 'deferral_months': 12, 'deferral_type': 'total'},
+]
+
+
+def peak_payment(principal, rate, duration, **options):
+    _, _, columns = variant_arrays(principal, rate, duration, **options)
+    return np.max(columns['Mensualité hors assurance'] + columns['Assurance du mois'])
+
+
+@pytest.mark.parametrize("options", OPTIONS)
+@pytest.mark.parametrize("rate, duration", [(0.0, 10), (3.85, 20), (6.0, 25)])
+def test_max_principal_is_the_inverse_of_the_simulator(rate, duration, options):
+    principal = max_principal(rate, duration, 1200, **options)
+    assert peak_payment(principal, rate, duration, **options) == pytest.approx(1200, rel=1e-9)
+
+
+def test_budget_is_capped_by_the_debt_ratio():
+    # 35 % de 3 000 € moins 250 € de crédits en cours : 800 € au plus
+    assert affordable_payment(1200, 3000, existing_charges=250) == pytest.approx(800)
+    assert affordable_payment(600, 3000, existing_charges=250) == pytest.approx(600)
+    assert affordable_payment(None, 3000) == pytest.approx(1050)
+    assert affordable_payment(1200, 500, existing_charges=250) == 0.0
+
+    principal = max_principal(3.85, 20, 1200, monthly_income=3000, existing_charges=250,
+                              deferral_months=12, deferral_type='partial')
+    assert peak_payment(principal, 3.85, 20, deferral_months=12, deferral_type='partial') == pytest.approx(800)
+
+
+@pytest.mark.parametrize("options", OPTIONS)
+def test_batch_capacity_matches_max_principal(options):
+    durations = [10, 15, 20, 25]
+    rates = [3.2, 3.5, 3.85, 4.0]
+    result = capacity_batch([900, 1500], durations, rates, monthly_income=[2000, 5000], **options)
+    for i, (budget, income) in enumerate(((900, 2000), (1500, 5000))):
+        expected = [max_principal(rate, duration, budget, monthly_income=income, **options)
+                    for rate, duration in zip(rates, durations)]
+        np.testing.assert_allclose(result['capacity'][i], expected, rtol=1e-12)
+    # Capital retenu et mensualité correspondante, simulés avec le même différé
+    for i in range(2):
+        duration, rate = int(result['duration_years'][i]), result['annual_interest_rate'][i]
+        assert peak_payment(result['max_principal'][i], rate, duration, **options) == pytest.approx(
+            result['monthly_payment'][i], rel=1e-9)
+        assert result['monthly_payment'][i] == pytest.approx(result['monthly_budget'][i], rel=1e-9)
+
+
+def test_batch_without_deferral_borrows_more_than_with_total_deferral():
+    plain = capacity_batch([1200], [20], 3.85)['capacity']
+    deferred = capacity_batch([1200], [20], 3.85, deferral_months=24, deferral_type='total')['capacity']
+    assert deferred[0, 0] < plain[0, 0]
+
+
+@pytest.mark.parametrize("mode", ['duration', 'payment'])
+def test_variant_with_early_repayment_fits_the_budget(mode):
+    options = {'early_repayments': ((36, 20_000.0),), 'early_repayment_mode': mode,
+               'insurance_rate': 0.3, 'deferral_months': 6}
+    principal = max_principal_variant(3.85, 20, 1200, **options)
+    assert peak_payment(principal, 3.85, 20, **options) <= 1200 + 1e-9
+    assert peak_payment(principal + 1, 3.85, 20, **options) > 1200
+
+
+def test_variant_without_early_repayment_matches_closed_form():
+    options = {'insurance_rate': 0.36, 'insurance_basis': 'remaining', 'deferral_months': 12, 'deferral_type': 'total'}
+    assert max_principal_variant(3.85, 20, 1200, monthly_income=3000, **options) == pytest.approx(
+        max_principal(3.85, 20, 1200, monthly_income=3000, **options), rel=1e-9)
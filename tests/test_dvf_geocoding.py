@@ -0,0 +1,151 @@
+# tests/test_dvf_geocoding.py
+#
+# Géocodage par lots (tools/dvf_geocoding.py) avec le service local de substitution
+# (LocalGeocoder, sans réseau) : dédoublonnage des adresses, cache persistant et
+# échecs temporaires non mis en cache ; réponses d'erreur de l'API Adresse (BanGeocoder)
+# servies par un serveur local.
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tests.stand_in import StandInServer
+from tools.dvf_geocoding import BanGeocoder, BatchGeocoder, GeocodeCache, GeocodeError, LocalGeocoder, address_frame
+from tools.dvf_store import normalize_dvf
+from tools.dvf_synthetic import generate_dvf
+
+
+class FlakyGeocoder:
+    """
+    Service local qui échoue (GeocodeError) sur les adresses de `failing`.
+    """
+
+    name = "flaky"
+
+    def __init__(self, backend, failing):
+        self.backend = backend
+        self.failing = set(failing)
+
+    def geocode(self, address):
+        if "|".join(address[f] for f in ("numero", "suffixe", "voie", "code_postal", "commune")) in self.failing:
+            raise GeocodeError("HTTP 503")
+        return self.backend.geocode(address)
+
+
+@pytest.fixture(scope="module")
+def rows():
+    return normalize_dvf(generate_dvf(3000, seed=7, departements=("69",)))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return GeocodeCache(str(tmp_path / "geocodes.sqlite"))
+
+
+def without_coordinates(df):
+    return df.assign(latitude=np.float32(np.nan), longitude=np.float32(np.nan))
+
+
+def test_addresses_are_deduplicated(rows, cache):
+    backend = LocalGeocoder(rows)
+    geocoder = BatchGeocoder(backend, cache, rate=None)
+    filled = geocoder.fill_missing(without_coordinates(rows))
+
+    distinct = address_frame(rows)["address"].nunique()
+    assert distinct < len(rows)
+    assert backend.calls == distinct
+    assert geocoder.stats["addresses"] == distinct
+    assert geocoder.stats["resolved"] == distinct
+    assert geocoder.stats["rows_filled"] == len(rows)
+    assert filled["latitude"].notna().all() and filled["longitude"].notna().all()
+    # Chaque ligne reçoit la position moyenne des ventes à son adresse
+    expected = rows["latitude"].astype(float).groupby(address_frame(rows)["address"]).transform("mean")
+    np.testing.assert_allclose(filled["latitude"].astype(float), expected, atol=1e-4)
+
+
+def test_rerun_resolves_only_new_addresses(rows, cache):
+    BatchGeocoder(LocalGeocoder(rows), cache, rate=None).fill_missing(without_coordinates(rows))
+
+    backend = LocalGeocoder(rows)
+    geocoder = BatchGeocoder(backend, cache, rate=None)
+    geocoder.fill_missing(without_coordinates(rows))
+    assert backend.calls == 0
+    assert geocoder.stats["cached"] == geocoder.stats["addresses"]
+
+    # Nouvelles adresses : numéros absents (position de la rue) et rue inconnue (introuvable)
+    new = without_coordinates(rows.head(5)).assign(adresse_numero=pd.array([901, 902, 903, 904, 905], dtype="Int32"))
+    unknown = without_coordinates(rows.head(1)).assign(adresse_nom_voie="RUE QUI N EXISTE PAS")
+    filled = geocoder.fill_missing(pd.concat([without_coordinates(rows), new, unknown], ignore_index=True))
+    assert backend.calls == 6
+    assert geocoder.stats["resolved"] == 5 and geocoder.stats["not_found"] == 1
+    assert filled["latitude"].isna().sum() == 1
+
+    # L'adresse introuvable est en cache aussi : plus aucun appel
+    BatchGeocoder(backend, cache, rate=None).fill_missing(unknown)
+    assert backend.calls == 6
+
+
+def test_transient_errors_are_not_cached(rows, cache):
+    addresses = address_frame(rows)["address"].drop_duplicates()
+    failing = set(addresses.iloc[:10])
+    first = BatchGeocoder(FlakyGeocoder(LocalGeocoder(rows), failing), cache, rate=None)
+    filled = first.fill_missing(without_coordinates(rows))
+    assert first.stats["errors"] == 10
+    assert len(cache) == len(addresses) - 10
+    assert filled["latitude"].isna().sum() == address_frame(rows)["address"].isin(failing).sum()
+
+    # À l'ingestion suivante, seules les adresses en échec sont redemandées
+    backend = LocalGeocoder(rows)
+    second = BatchGeocoder(backend, cache, rate=None)
+    filled = second.fill_missing(without_coordinates(rows))
+    assert backend.calls == 10
+    assert second.stats["errors"] == 0
+    assert filled["latitude"].notna().all()
+    assert len(cache) == len(addresses)
+
+
+@pytest.fixture
+def server():
+    server = StandInServer()
+    yield server
+    server.close()
+
+
+def ban_feature(lat, lon, score=0.9):
+    return json.dumps({"features": [{"geometry": {"coordinates": [lon, lat]}, "properties": {"score": score}}]})
+
+
+@pytest.mark.parametrize("status", [400, 404])
+def test_ban_rejected_queries_are_not_found(rows, cache, server, status):
+    server.serve("/search/", '{"code": %d, "message": "q must contain at least 3 chars"}' % status, status=status)
+    sample = without_coordinates(rows.head(20))
+    geocoder = BatchGeocoder(BanGeocoder(url=server.url + "/search/", timeout=2), cache, rate=None)
+    filled = geocoder.fill_missing(sample)
+
+    distinct = address_frame(sample)["address"].nunique()
+    assert geocoder.stats["not_found"] == distinct and geocoder.stats["errors"] == 0
+    assert filled["latitude"].isna().all()
+    assert len(cache) == distinct
+
+
+@pytest.mark.parametrize("status, body", [
+    (200, "<html>Service indisponible</html>"),
+    (200, '{"features": [{"geometry": {}}]}'),
+    (403, "interdit"),
+])
+def test_ban_unreadable_answers_do_not_abort_the_batch(rows, cache, server, status, body):
+    server.serve("/search/", body, status=status)
+    sample = without_coordinates(rows.head(20))
+    geocoder = BatchGeocoder(BanGeocoder(url=server.url + "/search/", timeout=2), cache, rate=None)
+    filled = geocoder.fill_missing(sample)
+
+    assert geocoder.stats["errors"] == address_frame(sample)["address"].nunique()
+    assert filled["latitude"].isna().all()
+    assert len(cache) == 0
+
+    # Le service rétabli, les mêmes adresses sont résolues
+    server.serve("/search/", ban_feature(45.76, 4.83))
+    filled = BatchGeocoder(BanGeocoder(url=server.url + "/search/", timeout=2), cache, rate=None).fill_missing(sample)
+    np.testing.assert_allclose(filled["latitude"].astype(float), 45.76, atol=1e-4)
@@ -0,0 +1,34 @@
+# tests/test_dvf_store.py
+#
+# Normalisation des fichiers DVF (tools/dvf_store.normalize_dvf) : codes INSEE des
+# communes reconstitués à partir des fichiers bruts « ValeursFoncieres-AAAA.txt ».
+
+import pandas as pd
+
+from tools.dvf_store import normalize_dvf
+
+
+def raw_file(departements, communes):
+    return pd.DataFrame({
+        "Date mutation": ["03/01/2023"] * len(communes),
+        "Valeur fonciere": ["150000,00"] * len(communes),
+        "Code departement": departements,
+        "Code commune": communes,
+    })
+
+
+def test_raw_commune_codes_include_the_departement():
+    df = normalize_dvf(raw_file(["75", "1", "2A", "13"], ["112", "4", "4", "55"]))
+    assert df["code_commune"].tolist() == ["75112", "01004", "2A004", "13055"]
+    assert df["code_departement"].tolist() == ["75", "01", "2A", "13"]
+
+
+def test_raw_overseas_commune_codes_have_five_characters():
+    df = normalize_dvf(raw_file(["971", "972", "974", "976"], ["101", "209", "411", "611"]))
+    assert df["code_commune"].tolist() == ["97101", "97209", "97411", "97611"]
+    assert df["code_departement"].tolist() == ["971", "972", "974", "976"]
+
+
+def test_raw_codes_read_as_numbers():
+    df = normalize_dvf(raw_file([971, 75], [101, 112]))
+    assert df["code_commune"].tolist() == ["97101", "75112"]
@@ -0,0 +1,56 @@
+# tests/test_dvf_update.py
+#
+# Mise à jour incrémentale (tools/dvf_update.py) sur une petite paire de publications
+# (tests/fixtures/dvf, écrite par tools.dvf_synthetic.write_release_pair) : le stockage
+# mis à jour doit être identique à une ingestion complète de la nouvelle publication.
+
+import os
+
+import pandas as pd
+
+from tools.dvf_ingest import ingest_streaming
+from tools.dvf_mapped import build_mapped
+from tools.dvf_synthetic import write_release_pair
+from tools.dvf_update import check_incremental, update_release
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "dvf")
+OLD = os.path.join(FIXTURES, "full_old.csv")
+NEW = os.path.join(FIXTURES, "full_new.csv")
+
+
+def quiet(*_):
+    pass
+
+
+def test_update_matches_full_ingestion(tmp_path):
+    assert check_incremental(OLD, NEW, str(tmp_path), report=quiet) == []
+
+
+def test_update_without_id_mutation_matches_full_ingestion(tmp_path):
+    # Fichiers sans id_mutation : les mutations sont reconnues par la clé de repli
+    old, new = str(tmp_path / "sans_id_old.csv"), str(tmp_path / "sans_id_new.csv")
+    for source, target in ((OLD, old), (NEW, new)):
+        pd.read_csv(source, dtype=str).drop(columns="id_mutation").to_csv(target, index=False)
+    assert check_incremental(old, new, str(tmp_path), report=quiet) == []
+
+
+def test_update_of_last_semester_only_matches_full_ingestion(tmp_path):
+    # Sans correction ni retrait, seules les dernières années des fichiers projetés sont
+    # refaites, les autres étant reprises du fichier existant
+    old, new = str(tmp_path / "semestre_old.csv"), str(tmp_path / "semestre_new.csv")
+    write_release_pair(old, new, 1500, seed=3, removed=0, changed=0)
+    assert check_incremental(old, new, str(tmp_path), report=quiet) == []
+
+
+def test_update_reports_each_kind_of_change(tmp_path):
+    store = str(tmp_path / "store")
+    ingest_streaming(OLD, store, part_name="full")
+    build_mapped(store)
+    result = update_release(NEW, store, part_name="full", report=quiet)
+    assert result["inserees"] > 0 and result["modifiees"] > 0 and result["retirees"] > 0
+    assert result["partitions"]
+
+    # Réappliquer la même publication ne change plus rien
+    again = update_release(NEW, store, part_name="full", report=quiet)
+    assert (again["inserees"], again["modifiees"], again["retirees"]) == (0, 0, 0)
+    assert again["partitions"] == {}
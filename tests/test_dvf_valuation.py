@@ -0,0 +1,80 @@
+# tests/test_dvf_valuation.py
+#
+# Estimation par comparables (tools/dvf_valuation.py) : données absentes ou incomplètes,
+# et estimation d'un portefeuille identique à l'estimation bien par bien.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tools.dvf_mutations import build_mutations
+from tools.dvf_store import normalize_dvf
+from tools.dvf_synthetic import generate_dvf
+from tools.dvf_valuation import ComparablesIndex
+
+
+@pytest.fixture(scope="module")
+def mutations():
+    return build_mutations(normalize_dvf(generate_dvf(20_000, seed=4, departements=("75",))))[0]
+
+
+@pytest.fixture(scope="module")
+def index(mutations):
+    return ComparablesIndex.from_mutations(mutations)
+
+
+def test_empty_mutations_give_empty_index():
+    index = ComparablesIndex.from_mutations(build_mutations(pd.DataFrame())[0])
+    assert len(index) == 0
+    assert index.types == []
+
+
+def test_mutations_without_coordinates_give_empty_index(mutations):
+    # Fichier brut non géocodé : ni latitude ni longitude
+    index = ComparablesIndex.from_mutations(mutations.drop(columns=["latitude", "longitude"]))
+    assert len(index) == 0
+    estimations = index.estimate_portfolio(pd.DataFrame({
+        "latitude": [48.85], "longitude": [2.35], "type_local": ["Appartement"], "surface": [50],
+    }))
+    assert estimations["comparables"].tolist() == [0]
+
+
+def test_sales_without_coordinates_or_surface_are_dropped(mutations):
+    damaged = mutations.copy()
+    damaged.loc[damaged.index[:500], "longitude"] = np.nan
+    damaged.loc[damaged.index[500:1000], "surface_reelle_bati"] = pd.NA
+    sales = ComparablesIndex.from_mutations(damaged).sales
+    assert sales["longitude"].notna().all()
+    assert (sales["surface_reelle_bati"] > 0).all()
+
+
+def test_portfolio_matches_single_estimates(index):
+    rng = np.random.default_rng(0)
+    sample = index.sales.sample(200, random_state=0)
+    portfolio = pd.DataFrame({
+        "latitude": sample["latitude"].to_numpy() + rng.normal(0, 0.005, 200),
+        "longitude": sample["longitude"].to_numpy() + rng.normal(0, 0.005, 200),
+        "type_local": rng.choice(["Appartement", "Maison", "Inconnu"], 200),
+        "surface": rng.integers(15, 150, 200),
+        "pieces": np.where(rng.random(200) < 0.2, np.nan, rng.integers(1, 6, 200)),
+    })
+    estimations = index.estimate_portfolio(portfolio, k=8)
+    for i, row in portfolio.iterrows():
+        pieces = None if pd.isna(row["pieces"]) else row["pieces"]
+        expected = index.estimate(row["latitude"], row["longitude"], row["type_local"], float(row["surface"]),
+                                  pieces, k=8)[0]
+        for column, value in expected.items():
+            if value is None:
+                assert pd.isna(estimations.at[i, column]), (i, column)
+            else:
+                assert estimations.at[i, column] == value, (i, column)
+
+
+@pytest.mark.parametrize("surface", [np.nan, 0, -20])
+def test_portfolio_rejects_invalid_surface(index, surface):
+    portfolio = pd.DataFrame({
+        "latitude": [48.85, 48.86], "longitude": [2.35, 2.34], "type_local": ["Appartement"] * 2,
+        "surface": [50, surface],
+    })
+    with pytest.raises(ValueError):
+        index.estimate_portfolio(portfolio)
@@ -0,0 +1,61 @@
+# tests/test_instrumentation.py
+#
+# Journal des mesures (tools/instrumentation.py) : écrit seulement par l'application,
+# et partagé sans perte de lignes entre plusieurs processus.
+
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+
+from tools.instrumentation import PerfRecorder, load_log
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = """
+from tools.instrumentation import begin_run, stage
+{begin}
+with stage("essai"):
+    pass
+"""
+
+
+def run_script(cwd, begin):
+    env = {k: v for k, v in os.environ.items() if k not in ("SIMIMMO_PERF_LOG", "SIMIMMO_DEV")}
+    env["PYTHONPATH"] = ROOT
+    code = SCRIPT.format(begin="begin_run()" if begin else "")
+    subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, check=True)
+
+
+def test_command_line_tools_write_no_log(tmp_path):
+    run_script(tmp_path, begin=False)
+    assert not (tmp_path / "logs").exists()
+
+
+def test_streamlit_pages_write_the_log(tmp_path):
+    run_script(tmp_path, begin=True)
+    log = load_log(str(tmp_path / "logs" / "perf.jsonl"))
+    assert log["stage"].tolist() == ["essai"]
+
+
+def write_records(path, worker, count):
+    recorder = PerfRecorder(path)
+    for i in range(count):
+        with recorder.stage(f"processus.{worker}", rows=i):
+            pass
+
+
+def test_processes_append_whole_lines(tmp_path):
+    path = str(tmp_path / "perf.jsonl")
+    workers = [multiprocessing.Process(target=write_records, args=(path, w, 300)) for w in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert len(records) == 4 * 300
+    for w in range(4):
+        assert sorted(r["rows"] for r in records if r["stage"] == f"processus.{w}") == list(range(300))
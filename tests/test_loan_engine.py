@@ -0,0 +1,214 @@
+# tests/test_loan_engine.py
+#
+# Parité du calcul vectorisé (tools/loan_engine.py) avec la boucle mois par mois
+# qu'utilisait app.calculate_loan, conservée ici comme référence ; les prêts avec
+# options (variant_arrays) sont comparés à une boucle mois par mois équivalente.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from tools.loan_engine import (
+    AMORTIZATION_COLUMNS, VARIANT_COLUMNS, amortization_schedule, simulate_batch, variant_arrays,
+)
+
+RATES = [0.0, 0.5, 1.5, 3.85, 8.0]
+DURATIONS = [1, 7, 15, 20, 25]
+
+
+def reference_loan(principal, annual_interest_rate, duration_years):
+    """
+    Boucle historique de app.calculate_loan (avant vectorisation).
+    """
+    monthly_interest_rate = (annual_interest_rate / 100) / 12
+    duration_months = duration_years * 12
+
+    if monthly_interest_rate == 0:
+        monthly_payment = principal / duration_months
+        total_cost_of_credit = 0
+    else:
+        monthly_payment = (principal * monthly_interest_rate) / (1 - (1 + monthly_interest_rate)**(-duration_months))
+        total_cost_of_credit = (monthly_payment * duration_months) - principal
+
+    rows = []
+    current_principal = principal
+    cumulative_principal = 0
+    cumulative_interest = 0
+    for month in range(1, duration_months + 1):
+        interest_for_month = current_principal * monthly_interest_rate
+        principal_for_month = monthly_payment - interest_for_month
+        if month == duration_months:
+            principal_for_month = current_principal
+            interest_for_month = max(0, monthly_payment - principal_for_month)
+
+        current_principal -= principal_for_month
+        cumulative_principal += principal_for_month
+        cumulative_interest += interest_for_month
+        rows.append([month, max(0, current_principal), cumulative_principal, cumulative_interest,
+                     principal_for_month, interest_for_month])
+
+    return monthly_payment, total_cost_of_credit, pd.DataFrame(rows, columns=AMORTIZATION_COLUMNS)
+
+
+@pytest.mark.parametrize("rate", RATES)
+@pytest.mark.parametrize("duration", DURATIONS)
+def test_schedule_matches_reference_loop(rate, duration):
+    payment, cost, table = amortization_schedule(250_000, rate, duration)
+    expected_payment, expected_cost, expected_table = reference_loan(250_000, rate, duration)
+    assert payment == pytest.approx(expected_payment, rel=1e-12)
+    assert cost == pytest.approx(expected_cost, abs=1e-6)
+    pd.testing.assert_frame_equal(table, expected_table, check_dtype=False, rtol=1e-9, atol=1e-6)
+
+
+def test_batch_matches_reference_loop():
+    principals = [100_000, 320_000]
+    result = simulate_batch(principals, RATES, DURATIONS, schedules=True)
+    for i, principal in enumerate(principals):
+        for j, rate in enumerate(RATES):
+            for d, duration in enumerate(DURATIONS):
+                payment, cost, table = reference_loan(principal, rate, duration)
+                assert result["monthly_payment"][i, j, d] == pytest.approx(payment, rel=1e-12)
+                assert result["total_cost_of_credit"][i, j, d] == pytest.approx(cost, abs=1e-6)
+                months = duration * 12
+                for column in AMORTIZATION_COLUMNS:
+                    np.testing.assert_allclose(result[column][i, j, d, :months], table[column], rtol=1e-9, atol=1e-6)
+                assert np.isnan(result["Mois"][i, j, d, months:]).all()
+
+
+@pytest.mark.parametrize("durations", [[20, 12.5], [0], [-5], [np.nan]])
+def test_batch_rejects_invalid_durations(durations):
+    with pytest.raises(ValueError):
+        simulate_batch(200_000, 3.5, durations)
+
+
+def reference_variant(principal, annual_interest_rate, duration_years, rate_changes=(), rate_cap=None,
+                      insurance_rate=0.0, insurance_basis='initial', deferral_months=0, deferral_type='partial',
+                      early_repayments=(), early_repayment_mode='duration'):
+    """
+    Prêt avec options calculé mois par mois, sans forme fermée ni segments.
+    """
+    duration_months = duration_years * 12
+
+    def annual_rate(month):
+        rate = annual_interest_rate
+        for change_month, change_rate in sorted(rate_changes):
+            if change_month <= month:
+                if rate_cap is not None:
+                    change_rate = min(max(change_rate, annual_interest_rate - rate_cap), annual_interest_rate + rate_cap)
+                rate = max(change_rate, 0.0)
+        return rate
+
+    def annuity(balance, monthly_rate, months):
+        if monthly_rate == 0:
+            return balance / months
+        return balance * monthly_rate / (1 - (1 + monthly_rate) ** -months)
+
+    def months_to_repay(balance, monthly_rate, payment):
+        months = 0
+        while balance > 1e-6:
+            balance = balance * (1 + monthly_rate) - payment
+            months += 1
+        return months
+
+    lump_sums = {}
+    for month, amount in early_repayments:
+        lump_sums[month] = lump_sums.get(month, 0.0) + amount
+
+    rows = []
+    balance, payment, end, month = float(principal), None, duration_months, 1
+    while month <= end:
+        rate = annual_rate(month) / 100 / 12
+        opening = balance
+        interest = opening * rate
+        if month <= deferral_months:
+            principal_part = -interest if deferral_type == 'total' else 0.0
+            installment = 0.0 if deferral_type == 'total' else interest
+        else:
+            if payment is None or annual_rate(month) != annual_rate(month - 1):
+                payment = annuity(balance, rate, end - month + 1)
+            principal_part, installment = payment - interest, payment
+            if month == end:
+                principal_part, installment = opening, opening + interest
+        balance -= principal_part
+
+        lump = 0.0
+        if month in lump_sums and month < end:
+            lump = min(lump_sums[month], balance)
+            balance -= lump
+            next_rate = annual_rate(month + 1) / 100 / 12
+            if balance <= 1e-9:
+                end = month
+            elif payment is not None:
+                if early_repayment_mode == 'payment':
+                    payment = annuity(balance, next_rate, end - month)
+                else:
+                    end = month + months_to_repay(balance, next_rate, payment)
+
+        insurance_base = opening if insurance_basis == 'remaining' else principal
+        rows.append([month, max(0.0, balance), principal_part + lump, interest, annual_rate(month),
+                     installment, insurance_base * insurance_rate / 100 / 12, lump])
+        month += 1
+
+    table = pd.DataFrame(rows, columns=['Mois', 'Capital restant dû', 'Capital remboursé du mois',
+                                        'Intérêts du mois'] + VARIANT_COLUMNS)
+    table['Capital remboursé (cumulé)'] = table['Capital remboursé du mois'].cumsum()
+    table['Intérêts payés (cumulés)'] = table['Intérêts du mois'].cumsum()
+    return table[AMORTIZATION_COLUMNS + VARIANT_COLUMNS]
+
+
+VARIANTS = {
+    'taux capé à la hausse': {'rate_changes': ((25, 7.0), (121, 5.5)), 'rate_cap': 1.0},
+    'taux capé à la baisse': {'rate_changes': ((61, 0.5),), 'rate_cap': 2.0},
+    'taux révisé sans cap': {'rate_changes': ((13, 4.5), (49, 2.0))},
+    'anticipé, durée réduite': {'early_repayments': ((36, 30_000.0), (90, 10_000.0)),
+                                'early_repayment_mode': 'duration'},
+    'anticipé, mensualité réduite': {'early_repayments': ((36, 30_000.0), (90, 10_000.0)),
+                                     'early_repayment_mode': 'payment'},
+    'anticipé puis révision': {'early_repayments': ((24, 25_000.0),), 'rate_changes': ((61, 5.0),),
+                               'rate_cap': 1.5},
+    'différé partiel': {'deferral_months': 18, 'deferral_type': 'partial', 'insurance_rate': 0.36},
+    'différé total': {'deferral_months': 18, 'deferral_type': 'total',
+                      'insurance_rate': 0.36, 'insurance_basis': 'remaining'},
+    'différé total puis anticipé': {'deferral_months': 12, 'deferral_type': 'total',
+                                    'early_repayments': ((48, 40_000.0),)},
+    'solde anticipé': {'early_repayments': ((60, 10_000_000.0),), 'insurance_rate': 0.3},
+    'solde en deux versements': {'early_repayments': ((30, 100_000.0), (40, 200_000.0)),
+                                 'early_repayment_mode': 'payment'},
+}
+
+
+@pytest.mark.parametrize("rate", [0.0, 3.85])
+@pytest.mark.parametrize("options", VARIANTS.values(), ids=VARIANTS.keys())
+def test_variant_matches_reference_loop(rate, options):
+    first_payment, cost, columns = variant_arrays(250_000, rate, 20, **options)
+    expected = reference_variant(250_000, rate, 20, **options)
+
+    table = pd.DataFrame(columns)
+    pd.testing.assert_frame_equal(table, expected, check_dtype=False, rtol=1e-9, atol=1e-6)
+    first = min(options.get('deferral_months', 0), len(expected) - 1)
+    assert first_payment == pytest.approx(
+        expected['Mensualité hors assurance'][first] + expected['Assurance du mois'][first])
+    assert cost == pytest.approx(expected['Intérêts du mois'].sum() + expected['Assurance du mois'].sum())
+
+
+def test_variant_rate_cap_bounds_the_revised_rate():
+    _, _, columns = variant_arrays(200_000, 3.0, 20, rate_changes=((25, 7.0), (61, -1.0)), rate_cap=1.0)
+    rates = columns['Taux annuel (%)']
+    assert rates[:24].tolist() == [3.0] * 24
+    assert rates[24:60].tolist() == [4.0] * 36
+    assert rates[60:].tolist() == [2.0] * (240 - 60)
+
+
+def test_variant_payoff_ends_the_schedule():
+    _, _, columns = variant_arrays(200_000, 3.85, 20, early_repayments=((60, 1_000_000.0),))
+    assert len(columns['Mois']) == 60
+    assert columns['Capital restant dû'][-1] == 0
+    assert columns['Capital remboursé (cumulé)'][-1] == pytest.approx(200_000)
+    assert columns['Remboursement anticipé'][-1] < 200_000
+
+
+def test_variant_without_options_matches_amortization_schedule():
+    _, _, columns = variant_arrays(250_000, 3.85, 20)
+    _, _, table = amortization_schedule(250_000, 3.85, 20)
+    for column in AMORTIZATION_COLUMNS:
+        np.testing.assert_allclose(columns[column], table[column], rtol=1e-9, atol=1e-6)
@@ -0,0 +1,52 @@
+# tests/test_page_data.py
+#
+# Fichiers DVF partagés (tools/page_data.py) : mis en cache par version du fichier, ils
+# sont rechargés quand une ingestion ou une mise à jour les réécrit, et l'ancienne
+# version n'est plus gardée en mémoire.
+
+import gc
+import os
+import weakref
+
+import pytest
+
+from tools import page_data
+from tools.dvf_ingest import ingest_streaming
+from tools.dvf_mapped import build_mapped
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "dvf")
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    store = str(tmp_path / "store")
+    ingest_streaming(os.path.join(FIXTURES, "full_old.csv"), store, part_name="full")
+    build_mapped(store, ["75"])
+    shared = page_data.VersionedCache()
+    monkeypatch.setattr(page_data, "DVF_STORE", store)
+    monkeypatch.setattr(page_data, "fichiers_partages", lambda: shared)
+    return shared
+
+
+def test_shared_mutations_are_loaded_once_per_version(cache):
+    first = page_data.ouvrir_mutations_partagees("75")
+    assert first is not None
+    assert page_data.ouvrir_mutations_partagees("75") is first
+    assert len(cache) == 1
+
+
+def test_rewritten_file_replaces_the_cached_version(cache):
+    first = page_data.ouvrir_mutations_partagees("75")
+    comparables = page_data.charger_comparables("75")
+    old = [weakref.ref(first), weakref.ref(comparables)]
+    rows = len(first)
+    del first, comparables
+
+    build_mapped(page_data.DVF_STORE, ["75"])
+    second = page_data.ouvrir_mutations_partagees("75")
+    page_data.charger_comparables("75")
+
+    gc.collect()
+    assert len(second) == rows
+    assert [ref() for ref in old] == [None, None]
+    assert len(cache) == 2  # une entrée par clé : mutations et comparables du département
@@ -0,0 +1,108 @@
+# tests/test_rate_fetcher.py
+#
+# Service des taux (tools/rate_fetcher.py) contre des pages HTML locales (tests/fixtures/rates)
+# servies par un serveur HTTP de substitution : analyse, cache, dernière valeur valide en
+# cas d'erreur ou de délai dépassé.
+
+import os
+import time
+
+import pytest
+
+from tests.stand_in import StandInServer
+from tools.rate_fetcher import RateService, parse_empruntis, parse_meilleurtaux
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "rates")
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture
+def server():
+    server = StandInServer()
+    server.serve("/meilleurtaux", fixture("meilleurtaux.html"))
+    server.serve("/empruntis", fixture("empruntis.html"))
+    yield server
+    server.close()
+
+
+def make_service(server, **kwargs):
+    kwargs.setdefault("timeout", (1, 1))
+    return RateService(
+        sources={
+            "meilleurtaux": (server.url + "/meilleurtaux", parse_meilleurtaux),
+            "empruntis": (server.url + "/empruntis", parse_empruntis),
+        },
+        **kwargs,
+    )
+
+
+def test_parsers_read_fixture_pages():
+    assert parse_meilleurtaux(fixture("meilleurtaux.html")) == {"15 ans": 3.12}
+    # Le taux « nc » (30 ans) est ignoré
+    assert parse_empruntis(fixture("empruntis.html")) == {"15 ans": 3.05, "20 ans": 3.20, "25 ans": 3.35}
+    for parser in (parse_meilleurtaux, parse_empruntis):
+        with pytest.raises(ValueError):
+            parser(fixture("page_modifiee.html"))
+
+
+def test_service_fetches_all_sources(server):
+    service = make_service(server)
+    results = service.get_rates()
+    assert results["meilleurtaux"].rates == {"15 ans": 3.12}
+    assert results["empruntis"].rates["20 ans"] == 3.20
+    assert all(r.error is None and not r.stale for r in results.values())
+    assert server.hits == {"/meilleurtaux": 1, "/empruntis": 1}
+    service.close()
+
+
+def test_results_are_cached_for_ttl(server):
+    service = make_service(server, ttl=0.5)
+    service.get_rates()
+    service.get_rates()
+    assert server.hits == {"/meilleurtaux": 1, "/empruntis": 1}
+    time.sleep(0.6)
+    service.get_rates()
+    assert server.hits == {"/meilleurtaux": 2, "/empruntis": 2}
+    service.get_rates(force=True)
+    assert server.hits == {"/meilleurtaux": 3, "/empruntis": 3}
+    service.close()
+
+
+@pytest.mark.parametrize("failure", [
+    {"status": 500, "body": "erreur"},
+    {"body": fixture("page_modifiee.html")},
+    {"body": fixture("empruntis.html"), "delay": 1.5},
+])
+def test_last_good_value_is_served_on_failure(server, failure):
+    service = make_service(server, timeout=(1, 0.5), retry_after=60)
+    first = service.get_rate("empruntis")
+    server.serve("/empruntis", **failure)
+    result = service.get_rate("empruntis", force=True)
+    assert result.error is not None
+    assert result.stale
+    assert result.rates == first.rates
+    assert result.fetched_at == first.fetched_at
+
+    # Une source en échec n'est pas réinterrogée avant retry_after
+    hits = server.hits["/empruntis"]
+    assert service.get_rate("empruntis").error is not None
+    assert server.hits["/empruntis"] == hits
+    service.close()
+
+
+def test_failure_without_previous_value(server):
+    server.serve("/meilleurtaux", "indisponible", status=503)
+    service = make_service(server, retry_after=0)
+    result = service.get_rate("meilleurtaux")
+    assert result.rates is None and not result.stale
+    assert "503" in result.error
+
+    # Une fois la source rétablie, la tentative suivante réussit
+    server.serve("/meilleurtaux", fixture("meilleurtaux.html"))
+    result = service.get_rate("meilleurtaux")
+    assert result.rates == {"15 ans": 3.12} and result.error is None
+    service.close()
@@ -0,0 +1,35 @@
+# tests/test_session_tracker.py
+#
+# Journal d'événements (tools/session_tracker.py) : un événement non sérialisable est
+# écarté sans arrêter le thread d'écriture ni bloquer les événements suivants.
+
+import time
+
+from tools.session_tracker import EventLog, load_events
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_unserializable_event_is_dropped_and_writer_keeps_running(tmp_path):
+    log = EventLog(str(tmp_path), flush_interval=0.05)
+    try:
+        log.emit("session_start", session_id="a", page="accueil")
+        log.emit("page_view", session_id="a", page=object())
+        log.emit("page_view", session_id="a", page="taux", ts=float("nan"))
+        log.emit("activity", session_id="a", page="accueil")
+        assert wait_for(lambda: log.rejected == 2 and len(load_events(str(tmp_path))) == 2)
+
+        # Le thread d'écriture est toujours là pour les événements suivants
+        log.emit("page_view", session_id="a", page="etalab")
+        assert wait_for(lambda: len(load_events(str(tmp_path))) == 3)
+        assert log._thread.is_alive()
+    finally:
+        log.close()
+
+    events = load_events(str(tmp_path))
+    assert events["event"].tolist() == ["session_start", "activity", "page_view"]
@@ -0,0 +1,53 @@
+# tests/test_startup.py
+#
+# Imports différés (tools/startup.py) : un module importé depuis deux threads à la fois
+# (préchauffage et page) n'est rendu qu'une fois entièrement initialisé.
+
+import sys
+import threading
+
+from tools.startup import timed_import
+
+SIGNAL_MODULE = """
+import threading
+
+started = threading.Event()
+"""
+
+SLOW_MODULE = """
+import time
+
+import simimmo_signal
+
+simimmo_signal.started.set()
+time.sleep(0.3)
+VALUE = 42
+"""
+
+
+def test_concurrent_imports_wait_for_initialization(tmp_path, monkeypatch):
+    (tmp_path / "simimmo_signal.py").write_text(SIGNAL_MODULE, encoding="utf-8")
+    (tmp_path / "simimmo_slow.py").write_text(SLOW_MODULE, encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    for name in ("simimmo_signal", "simimmo_slow"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+
+    results, errors = [], []
+
+    def load():
+        try:
+            results.append(timed_import("simimmo_slow").VALUE)
+        except Exception as e:
+            errors.append(e)
+
+    first = threading.Thread(target=load)
+    first.start()
+    # Le second import commence pendant que le premier exécute encore le module
+    timed_import("simimmo_signal").started.wait(5)
+    second = threading.Thread(target=load)
+    second.start()
+    first.join(5)
+    second.join(5)
+
+    assert errors == []
+    assert results == [42, 42]
@@ -0,0 +1,319 @@
+# tools/benchmarks.py
+#
+# Mesures de performance reproductibles du simulateur et des données DVF, sans réseau
+# ni fichier DVF réel (données générées par tools/dvf_synthetic.py) :
+#   python -m tools.benchmarks --sizes 10000 100000 1000000
+#   python -m tools.benchmarks --sizes 10000000 --repeat 1
+#
+# Chaque exécution écrit un fichier JSON horodaté (data/benchmarks/ par défaut) avec les
+# versions des bibliothèques et le commit courant. Pour repérer une régression :
+#   python -m tools.benchmarks --sizes 100000 --compare data/benchmarks/benchmark-....json
+# compare chaque mesure à la précédente et sort en erreur si l'une est plus lente que
+# le seuil (--threshold, 1,25 par défaut).
+#
+# Mesures :
+#   loan_schedule        tableau d'amortissement (calculate_loan) pour des durées de 5 à 30 ans
+#   loan_variant         tableau avec options (taux révisé, assurance, remboursement anticipé)
+#   loan_batch           grille de 1 000 scénarios capital × taux × durée
+#   load_csv             chargement CSV + normalisation (repli de charger_donnees)
+#   ingest_store         ingestion par blocs vers le stockage Parquet partitionné
+#   load_store           chargement d'un département depuis le stockage (charger_donnees)
+#   filter_year_frame    filtre d'une année sur le DataFrame chargé
+#   filter_year_store    lecture de la seule partition d'une année
+#   filter_postal_code   présélection d'un code postal
+#   build_mutations      regroupement en une ligne par vente
+#   mapped_build         écriture des mutations triées et projetables (tools/dvf_mapped.py)
+#   mapped_year_slice    tranche d'une année du jeu projeté (sans copie)
+#   mapped_postal_frame  DataFrame d'une année et d'un code postal du jeu projeté
+#   radius_index_build   construction de l'index spatial en grille
+#   radius_query_200m    recherche dans un rayon de 200 m (index)
+#   radius_query_2km     recherche dans un rayon de 2 km (index)
+#   radius_bruteforce    haversine vectorisée sur tous les points (référence)
+#   valuation_build      index des ventes comparables (tools/dvf_valuation.py)
+#   valuation_knn        estimation d'un bien par ses 10 ventes les plus semblables
+
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from tools.dvf_mutations import build_mutations
+from tools.dvf_ingest import ingest_streaming
+from tools.dvf_mapped import MappedDataset, build_mapped
+from tools.dvf_store import available_years, load_partition, normalize_dvf, read_source
+from tools.dvf_synthetic import write_synthetic_csv
+from tools.dvf_valuation import ComparablesIndex
+from tools.loan_engine import amortization_schedule, simulate_batch, variant_schedule
+from tools.spatial_index import GridIndex, haversine_meters
+
+DEFAULT_OUTPUT = os.path.join("data", "benchmarks")
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+DEFAULT_THRESHOLD = 1.25
+# Département des mesures DVF
+BENCH_DEPARTEMENT = "75"
+# Appels par mesure des opérations de l'ordre de la milliseconde
+FAST_NUMBER = 50
+
+
+def measure(func, repeat=3, number=1):
+    """
+    Exécute func `repeat` fois et renvoie ses durées (min, médiane, max) en secondes.
+
+    Args:
+        func (callable): Fonction sans argument à mesurer.
+        repeat (int): Nombre de mesures.
+        number (int): Appels par mesure (durée moyenne d'un appel), pour les opérations
+            trop brèves pour être mesurées isolément.
+
+    Returns:
+        tuple: (statistiques, résultat du dernier appel)
+    """
+    durations = []
+    result = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        for _ in range(number):
+            result = func()
+        durations.append((time.perf_counter() - started) / number)
+    stats = {
+        "min": min(durations),
+        "median": statistics.median(durations),
+        "max": max(durations),
+        "repeat": repeat,
+        "number": number,
+    }
+    return stats, result
+
+
+def _environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    import pyarrow
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "pyarrow": pyarrow.__version__,
+        "git_commit": commit,
+    }
+
+
+def bench_loans(repeat=3):
+    """
+    Mesures du simulateur de prêt (indépendantes de la taille des données DVF).
+    """
+    results = []
+    for years in (5, 10, 15, 20, 25, 30):
+        stats, _ = measure(lambda: amortization_schedule(250_000, 3.5, years), repeat, FAST_NUMBER)
+        results.append({"benchmark": "loan_schedule", "duration_years": years, "seconds": stats})
+
+    options = dict(rate_changes=[(61, 4.5)], rate_cap=1.0, insurance_rate=0.3, insurance_basis="remaining",
+                   early_repayments=[(48, 20_000)])
+    stats, _ = measure(lambda: variant_schedule(250_000, 3.5, 25, **options), repeat, FAST_NUMBER)
+    results.append({"benchmark": "loan_variant", "duration_years": 25, "seconds": stats})
+
+    stats, _ = measure(lambda: simulate_batch(np.linspace(100_000, 500_000, 10), np.linspace(1, 5, 20),
+                                              np.arange(5, 30, 5)), repeat, FAST_NUMBER)
+    results.append({"benchmark": "loan_batch", "scenarios": 1000, "seconds": stats})
+    return results
+
+
+def bench_dvf(rows, workdir, repeat=3, seed=0):
+    """
+    Mesures de chargement, de filtrage et de recherche par rayon sur `rows` lignes synthétiques.
+    """
+    results = []
+
+    def record(name, stats, **extra):
+        results.append({"benchmark": name, "rows": rows, "seconds": stats, **extra})
+
+    # Fichier au format géolocalisé (comme full.csv), un seul département
+    csv_path = os.path.join(workdir, f"dvf_{BENCH_DEPARTEMENT}.csv")
+    started = time.perf_counter()
+    write_synthetic_csv(csv_path, rows, seed=seed, departements=(BENCH_DEPARTEMENT,))
+    generation_seconds = time.perf_counter() - started
+
+    stats, df = measure(lambda: normalize_dvf(read_source(csv_path)), repeat)
+    record("load_csv", stats, file_bytes=os.path.getsize(csv_path), generation_seconds=generation_seconds)
+
+    store = os.path.join(workdir, "store")
+
+    def ingest():
+        shutil.rmtree(store, ignore_errors=True)
+        return ingest_streaming(csv_path, store)
+
+    stats, _ = measure(ingest, max(1, repeat - 1))
+    record("ingest_store", stats)
+
+    stats, stored = measure(lambda: load_partition(store, BENCH_DEPARTEMENT), repeat)
+    record("load_store", stats)
+
+    year = available_years(store, BENCH_DEPARTEMENT)[0]
+    stats, subset = measure(lambda: df[df["annee"] == year], repeat)
+    record("filter_year_frame", stats, matched=len(subset))
+    stats, subset = measure(lambda: load_partition(store, BENCH_DEPARTEMENT, [year]), repeat)
+    record("filter_year_store", stats, matched=len(subset))
+
+    code_postal = df["code_postal"].iloc[0]
+    stats, subset = measure(lambda: df[df["code_postal"] == code_postal], repeat)
+    record("filter_postal_code", stats, matched=len(subset))
+
+    stats, (mutations, _) = measure(lambda: build_mutations(stored), repeat)
+    record("build_mutations", stats, mutations=len(mutations))
+
+    stats, _ = measure(lambda: build_mapped(store, [BENCH_DEPARTEMENT]), repeat)
+    record("mapped_build", stats)
+    dataset = MappedDataset.open(store, BENCH_DEPARTEMENT)
+    stats, subset = measure(lambda: dataset.slice(year), repeat, FAST_NUMBER)
+    record("mapped_year_slice", stats, matched=subset.num_rows)
+    stats, subset = measure(lambda: dataset.frame(year, code_postal), repeat, FAST_NUMBER)
+    record("mapped_postal_frame", stats, matched=len(subset))
+
+    latitudes = mutations["latitude"].to_numpy()
+    longitudes = mutations["longitude"].to_numpy()
+    stats, index = measure(lambda: GridIndex(latitudes, longitudes), repeat)
+    record("radius_index_build", stats, points=len(index))
+
+    # Recherche centrée sur une vente (déterministe pour une graine donnée)
+    lat, lon = latitudes[0], longitudes[0]
+    for name, radius in (("radius_query_200m", 200), ("radius_query_2km", 2000)):
+        stats, found = measure(lambda: index.query_radius(lat, lon, radius), repeat, FAST_NUMBER)
+        record(name, stats, matched=len(found))
+
+    def bruteforce():
+        return np.flatnonzero(haversine_meters(lat, lon, latitudes, longitudes) <= 2000)
+
+    stats, found = measure(bruteforce, repeat, FAST_NUMBER)
+    record("radius_bruteforce", stats, matched=len(found))
+
+    stats, comparables = measure(lambda: ComparablesIndex.from_mutations(mutations), repeat)
+    record("valuation_build", stats, sales=len(comparables))
+    if len(comparables):
+        sale = comparables.sales.iloc[0]
+        stats, (estimation, _) = measure(
+            lambda: comparables.estimate(sale["latitude"], sale["longitude"], sale["type_local"], 60, 3),
+            repeat, FAST_NUMBER,
+        )
+        record("valuation_knn", stats, radius=estimation["rayon_m"])
+    return results
+
+
+def run(sizes=DEFAULT_SIZES, repeat=3, seed=0, workdir=None, report=print):
+    """
+    Lance toutes les mesures et renvoie le rapport (dictionnaire sérialisable en JSON).
+    """
+    report_data = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "environment": _environment(),
+        "parameters": {"sizes": list(sizes), "repeat": repeat, "seed": seed},
+        "results": [],
+    }
+    report_data["results"] += bench_loans(repeat)
+    for rows in sizes:
+        directory = tempfile.mkdtemp(prefix="simimmo-bench-", dir=workdir)
+        try:
+            report(f"{rows} lignes...")
+            report_data["results"] += bench_dvf(rows, directory, repeat, seed)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    return report_data
+
+
+def _result_key(result):
+    return (result["benchmark"],) + tuple(sorted((k, v) for k, v in result.items()
+                                                 if k in ("rows", "duration_years", "scenarios")))
+
+
+def compare(current, previous, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare deux rapports mesure par mesure (durée minimale).
+
+    Returns:
+        DataFrame: une ligne par mesure commune, avec le rapport actuel / précédent et
+        la colonne « regression » (rapport supérieur au seuil).
+    """
+    before = {_result_key(r): r["seconds"]["min"] for r in previous["results"]}
+    rows = []
+    for result in current["results"]:
+        key = _result_key(result)
+        if key in before:
+            now = result["seconds"]["min"]
+            rows.append({
+                "benchmark": result["benchmark"],
+                "rows": result.get("rows", result.get("scenarios")),
+                "duration_years": result.get("duration_years"),
+                "avant_s": before[key],
+                "apres_s": now,
+                "rapport": now / before[key] if before[key] else float("nan"),
+            })
+    frame = pd.DataFrame(rows)
+    if not frame.empty:
+        frame[["rows", "duration_years"]] = frame[["rows", "duration_years"]].astype("Int64")
+        frame["regression"] = frame["rapport"] > threshold
+    return frame
+
+
+def format_results(report_data):
+    frame = pd.DataFrame([
+        {"benchmark": r["benchmark"], "rows": r.get("rows", r.get("scenarios")),
+         "duration_years": r.get("duration_years"), "min_s": r["seconds"]["min"],
+         "median_s": r["seconds"]["median"]}
+        for r in report_data["results"]
+    ])
+    frame[["rows", "duration_years"]] = frame[["rows", "duration_years"]].astype("Int64")
+    return frame.to_string(index=False, float_format=lambda v: f"{v:.6f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesures de performance du simulateur et des données DVF.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="Nombres de lignes DVF synthétiques (10 000 à 10 000 000)")
+    parser.add_argument("--repeat", type=int, default=3, help="Répétitions de chaque mesure")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du générateur")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Dossier des rapports JSON")
+    parser.add_argument("--workdir", default=None, help="Dossier des fichiers temporaires")
+    parser.add_argument("--compare", default=None, help="Rapport JSON précédent à comparer")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Rapport de durée au-delà duquel une mesure est une régression")
+    args = parser.parse_args()
+
+    report_data = run(args.sizes, args.repeat, args.seed, args.workdir)
+    print(format_results(report_data))
+
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report_data, f, indent=2)
+    print(f"Rapport écrit dans {path}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        comparison = compare(report_data, previous, args.threshold)
+        print(comparison.to_string(index=False))
+        if not comparison.empty and comparison["regression"].any():
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+# tools/borrowing_capacity.py
+#
+# Capacité d'emprunt : calcul inverse du simulateur (« combien puis-je emprunter pour
+# X € par mois ? »).
+#
+# La mensualité d'un prêt est proportionnelle au capital emprunté, y compris avec
+# assurance (sur capital initial ou restant dû), différé ou révisions de taux : le
+# capital maximal s'obtient donc directement en divisant le budget par la mensualité
+# maximale d'un prêt de 1 €. Seuls les remboursements anticipés d'un montant fixe
+# rompent cette proportionnalité ; on recourt alors à une recherche par dichotomie,
+# menée simultanément pour tous les budgets.
+#
+# Le budget peut être plafonné par un taux d'endettement (35 % des revenus par défaut,
+# assurance comprise, charges de crédit existantes déduites).
+
+import numpy as np
+import pandas as pd
+
+from tools.loan_engine import _annuity, variant_arrays
+
+DEFAULT_MAX_DEBT_RATIO = 0.35
+
+# Correspondance entre les clés de capacity_batch et les colonnes du DataFrame
+CAPACITY_COLUMNS = {
+    'monthly_budget': 'Budget mensuel',
+    'duration_years': 'Durée (années)',
+    'annual_interest_rate': "Taux d'intérêt annuel (%)",
+    'max_principal': 'Capital empruntable',
+    'monthly_payment': 'Montant de la mensualité',
+    'reaches_target': 'Objectif atteint',
+}
+
+
+def affordable_payment(monthly_budget=None, monthly_income=None, max_debt_ratio=DEFAULT_MAX_DEBT_RATIO,
+                       existing_charges=0.0):
+    """
+    Mensualité maximale : le budget indiqué, plafonné par le taux d'endettement si les
+    revenus sont connus (diffusable).
+
+    Args:
+        monthly_budget (float | array, optional): Mensualité souhaitée.
+        monthly_income (float | array, optional): Revenus mensuels nets.
+        max_debt_ratio (float): Part maximale des revenus consacrée aux crédits.
+        existing_charges (float | array): Mensualités des crédits en cours.
+
+    Returns:
+        float | ndarray: Mensualité maximale (jamais négative).
+    """
+    if monthly_budget is None and monthly_income is None:
+        raise ValueError("Indiquer un budget mensuel ou des revenus mensuels.")
+    budget = np.inf if monthly_budget is None else np.asarray(monthly_budget, dtype=float)
+    if monthly_income is not None:
+        cap = np.asarray(monthly_income, dtype=float) * max_debt_ratio - np.asarray(existing_charges, dtype=float)
+        budget = np.minimum(budget, cap)
+    budget = np.maximum(0.0, budget)
+    return budget[()] if budget.ndim == 0 else budget
+
+
+def payment_per_euro(annual_interest_rate, duration_years, insurance_rate=0.0, insurance_basis='initial',
+                     deferral_months=0, deferral_type='partial'):
+    """
+    Mensualité la plus élevée (assurance comprise) d'un prêt de 1 € (forme fermée, diffusable).
+
+    C'est la première échéance d'amortissement : le capital restant dû ne fait ensuite
+    que baisser, et les échéances de différé sont plus faibles.
+    """
+    monthly_rate = np.asarray(annual_interest_rate, dtype=float) / 100 / 12
+    duration_months = np.asarray(duration_years) * 12
+    deferral = np.minimum(np.maximum(np.asarray(deferral_months), 0), duration_months - 1)
+    # Capital dû au début de l'amortissement (les intérêts sont capitalisés en différé total)
+    balance = (1 + monthly_rate) ** deferral if deferral_type == 'total' else np.ones_like(monthly_rate)
+    insurance_base = balance if insurance_basis == 'remaining' else 1.0
+    peak = _annuity(balance, monthly_rate, duration_months - deferral) + insurance_base * insurance_rate / 100 / 12
+    return peak[()] if peak.ndim == 0 else peak
+
+
+def max_principal(annual_interest_rate, duration_years, monthly_budget=None, monthly_income=None,
+                  max_debt_ratio=DEFAULT_MAX_DEBT_RATIO, existing_charges=0.0, insurance_rate=0.0,
+                  insurance_basis='initial', deferral_months=0, deferral_type='partial'):
+    """
+    Capital maximal empruntable pour une mensualité donnée (forme fermée, diffusable).
+
+    Inverse de la formule d'annuité de calculate_loan : P = budget / mensualité d'un prêt de 1 €.
+
+    Returns:
+        float | ndarray: Capital maximal.
+    """
+    budget = affordable_payment(monthly_budget, monthly_income, max_debt_ratio, existing_charges)
+    principal = np.asarray(budget / payment_per_euro(
+        annual_interest_rate, duration_years, insurance_rate, insurance_basis, deferral_months, deferral_type
+    ))
+    return principal[()] if principal.ndim == 0 else principal
+
+
+def _peak_payment(principal, annual_interest_rate, duration_years, options):
+    _, _, columns = variant_arrays(principal, annual_interest_rate, duration_years, **options)
+    return float(np.max(columns['Mensualité hors assurance'] + columns['Assurance du mois']))
+
+
+def solve_increasing(func, targets, low, high, tolerance=0.01, max_iterations=200):
+    """
+    Résout func(x) = target pour chaque cible, func étant croissante, par dichotomie
+    vectorisée : tous les intervalles sont resserrés ensemble à chaque itération.
+
+    Args:
+        func (callable): Fonction vectorisée (tableau -> tableau).
+        targets (array): Valeurs cibles.
+        low, high (array): Bornes telles que func(low) <= cible <= func(high).
+        tolerance (float): Largeur d'intervalle à atteindre.
+
+    Returns:
+        ndarray: Plus grande valeur trouvée telle que func(x) <= cible (à tolerance près).
+    """
+    targets = np.asarray(targets, dtype=float)
+    low = np.broadcast_to(np.asarray(low, dtype=float), targets.shape).copy()
+    high = np.broadcast_to(np.asarray(high, dtype=float), targets.shape).copy()
+    for _ in range(max_iterations):
+        if np.all(high - low <= tolerance):
+            break
+        middle = (low + high) / 2
+        below = func(middle) <= targets
+        low = np.where(below, middle, low)
+        high = np.where(below, high, middle)
+    return low
+
+
+def max_principal_variant(annual_interest_rate, duration_years, monthly_budget=None, monthly_income=None,
+                          max_debt_ratio=DEFAULT_MAX_DEBT_RATIO, existing_charges=0.0, **options):
+    """
+    Capital maximal empruntable pour un prêt avec options quelconques
+    (voir tools/loan_engine.variant_arrays), mensualité la plus élevée plafonnée au budget.
+
+    Sans remboursement anticipé, la mensualité est proportionnelle au capital et le calcul
+    est direct ; sinon on cherche le capital par dichotomie (vectorisée sur les budgets).
+
+    Returns:
+        float | ndarray: Capital maximal, au centime près.
+    """
+    budget = np.asarray(affordable_payment(monthly_budget, monthly_income, max_debt_ratio, existing_charges))
+    unit = _peak_payment(1.0, annual_interest_rate, duration_years, options)
+    if not options.get('early_repayments'):
+        principal = budget / unit
+    else:
+        peak = np.vectorize(lambda p: _peak_payment(p, annual_interest_rate, duration_years, options))
+        # Un remboursement anticipé ne peut que baisser les échéances : budget / unit est
+        # une borne basse ; on double la borne haute jusqu'à dépasser le budget
+        low = budget / unit
+        high = np.maximum(low * 2, 1.0)
+        below = peak(high) <= budget
+        while np.any(below):
+            high = np.where(below, high * 2, high)
+            below = peak(high) <= budget
+        principal = solve_increasing(peak, budget, low, high)
+    return principal[()] if principal.ndim == 0 else principal
+
+
+def capacity_batch(monthly_budgets, durations_years, annual_interest_rates, target_principal=None,
+                   monthly_income=None, max_debt_ratio=DEFAULT_MAX_DEBT_RATIO, existing_charges=0.0,
+                   insurance_rate=0.0, insurance_basis='initial', deferral_months=0, deferral_type='partial'):
+    """
+    Meilleure durée et capital pour de nombreux budgets à la fois (calcul vectorisé).
+
+    Le capital maximal est calculé pour chaque budget × durée. Sans objectif, la meilleure
+    durée est celle qui permet d'emprunter le plus. Avec un capital objectif, c'est la plus
+    courte qui l'atteint (le coût du crédit croît avec la durée) ; si aucune ne l'atteint,
+    celle qui s'en approche le plus.
+
+    Args:
+        monthly_budgets (array): Mensualités souhaitées (ou None si seuls les revenus comptent).
+        durations_years (array): Durées envisagées en années.
+        annual_interest_rates (float | array): Taux par durée (même longueur que
+            durations_years) ou taux unique.
+        target_principal (float | array, optional): Capital recherché, par budget.
+        monthly_income (float | array, optional): Revenus mensuels, par budget (taux d'endettement).
+        deferral_months, deferral_type: Différé en début de prêt, comme pour max_principal
+            (compris dans chaque durée).
+
+    Returns:
+        dict: {nom: ndarray} avec 'monthly_budget', 'duration_years', 'annual_interest_rate',
+        'max_principal', 'monthly_payment', 'reaches_target' (une valeur par budget) et
+        'capacity' (capital maximal, forme (n_budgets, n_durées)).
+    """
+    durations = np.atleast_1d(np.asarray(durations_years, dtype=int))
+    rates = np.broadcast_to(np.asarray(annual_interest_rates, dtype=float), durations.shape)
+    budgets = np.atleast_1d(affordable_payment(
+        monthly_budgets, monthly_income, max_debt_ratio, existing_charges
+    )).astype(float)
+
+    unit = payment_per_euro(rates, durations, insurance_rate, insurance_basis, deferral_months, deferral_type)
+    capacity = budgets[:, None] / unit[None, :]
+
+    if target_principal is None:
+        best = np.argmax(capacity, axis=1)
+        principal = capacity[np.arange(budgets.size), best]
+        reaches = np.ones(budgets.size, dtype=bool)
+    else:
+        target = np.broadcast_to(np.asarray(target_principal, dtype=float), budgets.shape)
+        reaching = capacity >= target[:, None]
+        # Durées triées : la plus courte qui atteint l'objectif
+        order = np.argsort(durations, kind='stable')
+        first = np.argmax(reaching[:, order], axis=1)
+        reaches = reaching.any(axis=1)
+        best = np.where(reaches, order[first], np.argmax(capacity, axis=1))
+        principal = np.where(reaches, target, capacity[np.arange(budgets.size), best])
+
+    return {
+        'monthly_budget': budgets,
+        'duration_years': durations[best],
+        'annual_interest_rate': rates[best],
+        'max_principal': principal,
+        'monthly_payment': principal * unit[best],
+        'reaches_target': reaches,
+        'capacity': capacity,
+    }
+
+
+def capacity_batch_frame(monthly_budgets, durations_years, annual_interest_rates, **kwargs):
+    """
+    Variante de capacity_batch renvoyant un DataFrame (une ligne par budget).
+    """
+    result = capacity_batch(monthly_budgets, durations_years, annual_interest_rates, **kwargs)
+    return pd.DataFrame({CAPACITY_COLUMNS[key]: result[key] for key in CAPACITY_COLUMNS})
@@ -0,0 +1,325 @@
+# tools/dvf_address_index.py
+#
+# Index des ventes DVF par adresse : rue normalisée + code postal + commune.
+#
+# Construit à l'ingestion, à partir de la table des mutations (tools/dvf_mutations.py) :
+#   <stockage>/_address_index/code_departement=75/<source>.parquet   entrées d'une source
+#   <stockage>/_address_index/code_departement=75/index.parquet      index consolidé
+#
+# L'index consolidé est trié par (voie, code_postal, nom_commune) : les ventes d'une même
+# rue sont contiguës, et une clé se retrouve par recherche dichotomique dans la liste
+# triée des rues, sans parcourir les données. Les recherches proposées :
+#   - exacte, après normalisation (majuscules, sans accents ni ponctuation, type de voie
+#     abrégé comme dans DVF : « avenue » -> « AV ») ;
+#   - par préfixe (autocomplétion) ;
+#   - approchée, par trigrammes (fautes de frappe, mots manquants).
+
+import bisect
+import glob
+import os
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+ADDRESS_DIR = "_address_index"
+INDEX_NAME = "index.parquet"
+
+KEY_COLUMNS = ["voie", "code_postal", "nom_commune"]
+# Colonnes des ventes conservées dans l'index (de quoi afficher un résultat sans relire le stockage)
+SALE_COLUMNS = [
+    "id_mutation", "date_mutation", "valeur_fonciere", "adresse_numero", "adresse_suffixe", "adresse_nom_voie",
+    "type_local", "surface_reelle_bati", "nombre_pieces_principales", "surface_terrain", "annee",
+]
+
+# Types de voie écrits en toutes lettres -> abréviation utilisée dans DVF
+STREET_TYPES = {
+    "ALLEE": "ALL", "AVENUE": "AV", "BOULEVARD": "BD", "CHEMIN": "CHE", "CHAUSSEE": "CHS", "COURS": "CRS",
+    "FAUBOURG": "FG", "HAMEAU": "HAM", "IMPASSE": "IMP", "LIEU DIT": "LD", "LOTISSEMENT": "LOT", "PASSAGE": "PAS",
+    "PLACE": "PL", "PROMENADE": "PROM", "QUARTIER": "QUA", "RESIDENCE": "RES", "ROND POINT": "RPT", "ROUTE": "RTE",
+    "SENTIER": "SEN", "SQUARE": "SQ", "VILLA": "VLA",
+}
+WORD_ABBREVIATIONS = {"SAINT": "ST", "SAINTE": "STE"}
+_STREET_TYPE_RE = re.compile(r"^(" + "|".join(sorted(STREET_TYPES, key=len, reverse=True)) + r")\b")
+_WORD_RE = re.compile(r"\b(" + "|".join(WORD_ABBREVIATIONS) + r")\b")
+_NON_ALNUM = re.compile(r"[^A-Z0-9]+")
+_ABBREVIATIONS = {**STREET_TYPES, **WORD_ABBREVIATIONS}
+
+
+def address_dir(store_dir, departement=None):
+    path = os.path.join(store_dir, ADDRESS_DIR)
+    if departement is not None:
+        path = os.path.join(path, f"code_departement={departement}")
+    return path
+
+
+def _normalize_one(text):
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").upper()
+    text = _NON_ALNUM.sub(" ", text).strip()
+    text = _STREET_TYPE_RE.sub(lambda m: _ABBREVIATIONS[m.group(1)], text)
+    return _WORD_RE.sub(lambda m: _ABBREVIATIONS[m.group(1)], text)
+
+
+def normalize_street(values):
+    """
+    Normalise des noms de voie (chaque nom distinct n'est traité qu'une fois).
+
+    « Avenue de l'Église » -> « AV DE L EGLISE »
+    """
+    series = pd.Series(values, dtype="string")
+    codes, uniques = pd.factorize(series)
+    normalized = np.array([_normalize_one(u) for u in uniques] + [None], dtype=object)
+    # Le code -1 (valeur manquante) désigne le dernier élément, None
+    return pd.Series(normalized[codes], index=series.index, dtype="string")
+
+
+def normalize_query(text):
+    return _normalize_one(text or "")
+
+
+def index_entries(mutations):
+    """
+    Entrées d'index d'une table de mutations : clé d'adresse et colonnes de SALE_COLUMNS.
+    """
+    columns = [c for c in SALE_COLUMNS if c in mutations.columns]
+    entries = mutations[columns].copy()
+    entries.insert(0, "voie", normalize_street(mutations["adresse_nom_voie"]))
+    entries.insert(1, "code_postal", mutations["code_postal"].astype("string"))
+    entries.insert(2, "nom_commune", mutations["nom_commune"].astype("string") if "nom_commune" in mutations.columns
+                   else pd.Series(pd.NA, index=mutations.index, dtype="string"))
+    entries["code_departement"] = mutations["code_departement"].astype("string")
+    return entries.dropna(subset=["voie"]).reset_index(drop=True)
+
+
+class AddressAccumulator:
+    """
+    Cumule les entrées d'index d'une source au fil des blocs d'ingestion.
+    """
+
+    def __init__(self):
+        self.frames = []
+
+    def add(self, mutations):
+        if not mutations.empty and "adresse_nom_voie" in mutations.columns:
+            self.frames.append(index_entries(mutations))
+
+    def write(self, store_dir, part_name):
+        """
+        Enregistre les entrées de la source, par département (remplace celles d'une
+        ingestion précédente).
+        """
+        if not self.frames:
+            return
+        entries = pd.concat(self.frames, ignore_index=True)
+        for departement, part in entries.groupby("code_departement", sort=False):
+            directory = address_dir(store_dir, departement)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"{part_name}.parquet")
+            part.drop(columns="code_departement").to_parquet(path + ".tmp", index=False)
+            os.replace(path + ".tmp", path)
+
+
+def _sort_entries(entries):
+    keys = entries[KEY_COLUMNS].fillna("")
+    order = np.lexsort([keys[c].to_numpy(dtype=str) for c in reversed(KEY_COLUMNS)])
+    return entries.iloc[order].reset_index(drop=True)
+
+
+def build_address_index(store_dir, departements=None):
+    """
+    Consolide les entrées de toutes les sources en un index trié par département.
+
+    Returns:
+        dict: {departement: nombre_de_ventes_indexées}
+    """
+    if departements is None:
+        departements = [
+            name.split("=", 1)[1] for name in sorted(os.listdir(address_dir(store_dir)))
+            if name.startswith("code_departement=")
+        ] if os.path.isdir(address_dir(store_dir)) else []
+    built = {}
+    for departement in departements:
+        directory = address_dir(store_dir, departement)
+        files = [f for f in sorted(glob.glob(os.path.join(directory, "*.parquet")))
+                 if os.path.basename(f) != INDEX_NAME]
+        if not files:
+            continue
+        entries = _sort_entries(pd.concat([pd.read_parquet(f) for f in files], ignore_index=True))
+        path = os.path.join(directory, INDEX_NAME)
+        entries.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        built[departement] = len(entries)
+    return built
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AddressIndex:
+    """
+    Index en mémoire des ventes par adresse.
+
+    Args:
+        entries (DataFrame): Entrées d'index (voir index_entries), triées ou non.
+        sorted_entries (bool): Les entrées sont déjà triées par KEY_COLUMNS.
+    """
+
+    def __init__(self, entries, sorted_entries=False):
+        self.entries = entries.reset_index(drop=True) if sorted_entries else _sort_entries(entries)
+        keys = self.entries[KEY_COLUMNS].fillna("")
+        if len(keys):
+            changed = np.zeros(len(keys), dtype=bool)
+            changed[0] = True
+            for column in KEY_COLUMNS:
+                values = keys[column].to_numpy(dtype=object)
+                changed[1:] |= values[1:] != values[:-1]
+            starts = np.flatnonzero(changed)
+        else:
+            starts = np.array([], dtype=np.int64)
+        self._bounds = np.append(starts, len(keys))
+        self.keys = keys.iloc[starts].reset_index(drop=True)
+        self.keys["ventes"] = np.diff(self._bounds)
+        # Colonnes des clés en tableaux : une recherche ne construit qu'un petit DataFrame
+        self._key_columns = {column: self.keys[column].to_numpy(dtype=object) for column in self.keys.columns}
+        self._key_columns["ventes"] = self.keys["ventes"].to_numpy()
+        # Liste triée des rues (une par clé) pour les recherches par dichotomie
+        self._streets = self.keys["voie"].tolist()
+        self._trigram_postings = None
+
+    @classmethod
+    def from_mutations(cls, mutations):
+        return cls(index_entries(mutations))
+
+    @classmethod
+    def load(cls, store_dir, departement):
+        """
+        Charge l'index consolidé d'un département (None s'il n'a pas été construit).
+        """
+        path = os.path.join(address_dir(store_dir, departement), INDEX_NAME)
+        if not os.path.exists(path):
+            return None
+        return cls(pd.read_parquet(path), sorted_entries=True)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _filter(self, key_positions, code_postal=None, commune=None):
+        key_positions = np.asarray(key_positions, dtype=np.int64)
+        if code_postal:
+            key_positions = key_positions[self._key_columns["code_postal"][key_positions] == str(code_postal)]
+        if commune:
+            communes = [_normalize_one(c) for c in self._key_columns["nom_commune"][key_positions]]
+            key_positions = key_positions[np.array(communes, dtype=object) == normalize_query(commune)]
+        return key_positions
+
+    def _key_frame(self, key_positions, score=None):
+        key_positions = np.asarray(key_positions, dtype=np.int64)
+        frame = {"cle": key_positions}
+        frame.update({column: values[key_positions] for column, values in self._key_columns.items()})
+        if score is not None:
+            frame["score"] = np.asarray(score, dtype=float)
+        return pd.DataFrame(frame)
+
+    def _find_positions(self, street, code_postal=None, commune=None):
+        street = normalize_query(street)
+        low = bisect.bisect_left(self._streets, street)
+        high = bisect.bisect_right(self._streets, street, lo=low)
+        return self._filter(np.arange(low, high), code_postal, commune)
+
+    def _complete_positions(self, prefix, code_postal=None, commune=None, limit=20):
+        prefix = normalize_query(prefix)
+        if not prefix:
+            return np.array([], dtype=np.int64)
+        low = bisect.bisect_left(self._streets, prefix)
+        high = bisect.bisect_left(self._streets, prefix + "\uffff", lo=low)
+        return self._filter(np.arange(low, high), code_postal, commune)[:limit]
+
+    def _build_trigrams(self):
+        # Trigrammes des rues distinctes (construits au premier besoin)
+        names, name_of_key = np.unique(np.asarray(self._streets, dtype=object), return_inverse=True)
+        postings = {}
+        sizes = np.empty(len(names), dtype=np.int32)
+        for i, name in enumerate(names):
+            grams = _trigrams(name)
+            sizes[i] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        # Clés de chaque rue distincte (les clés d'une même rue sont contiguës)
+        key_bounds = np.searchsorted(name_of_key, np.arange(len(names) + 1))
+        self._trigram_postings = (names, sizes, postings, key_bounds)
+
+    def _fuzzy_positions(self, text, code_postal=None, commune=None, limit=10, min_score=0.5):
+        query = normalize_query(text)
+        if not query or not self._streets:
+            return np.array([], dtype=np.int64), np.array([])
+        if self._trigram_postings is None:
+            self._build_trigrams()
+        names, sizes, postings, key_bounds = self._trigram_postings
+        grams = _trigrams(query)
+        hits = [postings[g] for g in grams if g in postings]
+        if not hits:
+            return np.array([], dtype=np.int64), np.array([])
+        shared = np.bincount(np.concatenate(hits), minlength=len(names))
+        scores = 2 * shared / (sizes + len(grams))
+        candidates = np.flatnonzero(scores >= min_score)
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        positions, key_scores = [], []
+        for name_id in candidates:
+            keys = self._filter(np.arange(key_bounds[name_id], key_bounds[name_id + 1]), code_postal, commune)
+            positions.extend(keys)
+            key_scores.extend([scores[name_id]] * len(keys))
+            if len(positions) >= limit:
+                break
+        return np.array(positions[:limit], dtype=np.int64), np.array(key_scores[:limit])
+
+    def find(self, street, code_postal=None, commune=None):
+        """
+        Clés dont la rue correspond exactement (après normalisation).
+
+        Returns:
+            DataFrame: cle (position de la clé, pour sales), voie, code_postal, nom_commune, ventes.
+        """
+        return self._key_frame(self._find_positions(street, code_postal, commune))
+
+    def complete(self, prefix, code_postal=None, commune=None, limit=20):
+        """
+        Clés dont la rue commence par le texte saisi (autocomplétion).
+        """
+        return self._key_frame(self._complete_positions(prefix, code_postal, commune, limit))
+
+    def fuzzy(self, text, code_postal=None, commune=None, limit=10, min_score=0.5):
+        """
+        Clés dont la rue ressemble au texte saisi (coefficient de Dice sur les trigrammes).
+
+        Returns:
+            DataFrame: colonnes de find et « score » (1 = identique), par score décroissant.
+        """
+        return self._key_frame(*self._fuzzy_positions(text, code_postal, commune, limit, min_score))
+
+    def search(self, text, code_postal=None, commune=None, limit=20):
+        """
+        Recherche exacte, puis par préfixe, puis approchée : les meilleures clés d'abord.
+        """
+        positions = np.concatenate([
+            self._find_positions(text, code_postal, commune),
+            self._complete_positions(text, code_postal, commune, limit),
+        ])
+        if not len(positions):
+            positions = self._fuzzy_positions(text, code_postal, commune, limit)[0]
+        _, first = np.unique(positions, return_index=True)
+        return self._key_frame(positions[np.sort(first)][:limit])
+
+    def sales(self, key_positions):
+        """
+        Ventes des clés données (tranches contiguës de l'index, sans recherche).
+        """
+        key_positions = np.atleast_1d(np.asarray(key_positions, dtype=np.int64))
+        if not len(key_positions):
+            return self.entries.iloc[0:0]
+        rows = np.concatenate([np.arange(self._bounds[k], self._bounds[k + 1]) for k in key_positions])
+        return self.entries.iloc[rows]
@@ -0,0 +1,224 @@
+# tools/dvf_aggregates.py
+#
+# Agrégats de prix précalculés (€/m², nombre de ventes, volume) par
+# département × code postal × type de local × année × mois.
+#
+# Les agrégats portent sur les mutations (tools/dvf_mutations.py) et non sur les lignes
+# brutes : une vente de plusieurs lots n'est comptée qu'une fois, avec sa surface totale.
+#
+# Les médianes ne s'additionnent pas d'un lot à l'autre : on cumule donc, pendant
+# l'ingestion, un histogramme des prix au m² sur des classes logarithmiques fixes
+# (résolution ~1,5 %), qui lui s'additionne. Les quantiles sont interpolés dans ces
+# classes lors de la consolidation.
+#
+#   <stockage>/_aggregates/<source>.totals.parquet   cumuls d'une source
+#   <stockage>/_aggregates/<source>.hist.parquet     histogramme d'une source
+#   <stockage>/_aggregates/summary.parquet           synthèse interrogée par les pages
+#
+# Dans la synthèse, mois = 0 désigne l'année entière et type_local = "Tous" l'ensemble
+# des types de local.
+
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+AGGREGATES_DIR = "_aggregates"
+SUMMARY_NAME = "summary.parquet"
+
+GROUP_COLUMNS = ["code_departement", "code_postal", "type_local", "annee", "mois"]
+ALL_TYPES = "Tous"
+QUANTILES = {"prix_m2_q10": 0.10, "prix_m2_q25": 0.25, "prix_m2_median": 0.50, "prix_m2_q75": 0.75, "prix_m2_q90": 0.90}
+
+# Classes logarithmiques de 100 à 100 000 €/m² (les valeurs hors bornes vont dans les classes extrêmes)
+PRICE_BIN_EDGES = np.logspace(2, 5, 461)
+_LOG_EDGES = np.log(PRICE_BIN_EDGES)
+
+
+def aggregates_dir(store_dir):
+    return os.path.join(store_dir, AGGREGATES_DIR)
+
+
+def partial_aggregates(df):
+    """
+    Calcule les cumuls et l'histogramme des prix au m² d'un bloc de mutations
+    (table des mutations de tools/dvf_mutations.build_mutations).
+
+    Returns:
+        tuple: (totaux, histogramme) — totaux : nombre de ventes, volume et surface par
+        groupe ; histogramme : nombre de ventes par groupe et par classe de prix au m².
+    """
+    if df.empty or "date_mutation" not in df.columns:
+        return pd.DataFrame(), pd.DataFrame()
+
+    keys = pd.DataFrame({
+        "code_departement": df["code_departement"].astype("string"),
+        "code_postal": df["code_postal"].astype("string").fillna(""),
+        "type_local": df["type_local"].astype("string").fillna("Non bâti"),
+        "annee": df["date_mutation"].dt.year.astype("Int16"),
+        "mois": df["date_mutation"].dt.month.astype("Int8"),
+    })
+    valeur = df["valeur_fonciere"].astype(float)
+    if "surface_reelle_bati" in df.columns:
+        surface = df["surface_reelle_bati"].astype(float)
+    else:
+        surface = pd.Series(np.nan, index=df.index)
+
+    totals = keys.assign(transactions=1, volume=valeur.fillna(0))
+    totals = totals.dropna(subset=["annee"]).groupby(GROUP_COLUMNS, observed=True).sum().reset_index()
+
+    with_price = (valeur > 0) & (surface > 0)
+    price_m2 = (valeur[with_price] / surface[with_price]).to_numpy()
+    bins = np.clip(np.searchsorted(PRICE_BIN_EDGES, price_m2, side="right") - 1, 0, len(PRICE_BIN_EDGES) - 2)
+    hist = keys[with_price].assign(bin=bins.astype(np.int16), n=1)
+    hist = hist.dropna(subset=["annee"]).groupby(GROUP_COLUMNS + ["bin"], observed=True).sum().reset_index()
+    return totals, hist
+
+
+class AggregateAccumulator:
+    """
+    Cumule les agrégats partiels au fil des blocs d'une ingestion.
+
+    La taille de l'état dépend du nombre de groupes (codes postaux × types × mois),
+    pas du nombre de lignes lues.
+    """
+
+    def __init__(self):
+        self.totals = pd.DataFrame()
+        self.hist = pd.DataFrame()
+
+    def add(self, df):
+        totals, hist = partial_aggregates(df)
+        self.totals = _merge(self.totals, totals, GROUP_COLUMNS)
+        self.hist = _merge(self.hist, hist, GROUP_COLUMNS + ["bin"])
+
+    def write(self, store_dir, part_name):
+        """
+        Enregistre les agrégats de la source (remplace ceux d'une ingestion précédente).
+        """
+        directory = aggregates_dir(store_dir)
+        os.makedirs(directory, exist_ok=True)
+        for kind, frame in (("totals", self.totals), ("hist", self.hist)):
+            path = os.path.join(directory, f"{part_name}.{kind}.parquet")
+            frame.to_parquet(path + ".tmp", index=False)
+            os.replace(path + ".tmp", path)
+
+
+def _merge(left, right, keys):
+    if left.empty:
+        return right
+    if right.empty:
+        return left
+    return pd.concat([left, right], ignore_index=True).groupby(keys, observed=True).sum().reset_index()
+
+
+def _read_partials(store_dir, kind):
+    files = sorted(glob.glob(os.path.join(aggregates_dir(store_dir), f"*.{kind}.parquet")))
+    frames = [pd.read_parquet(f) for f in files]
+    frames = [f for f in frames if not f.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def _with_rollups(frame):
+    """
+    Ajoute les regroupements « année entière » (mois = 0) et « tous types » (type_local = Tous).
+    """
+    frame = frame.astype({"type_local": "string", "mois": "int8"})
+    yearly = frame.assign(mois=np.int8(0))
+    frames = [frame, yearly]
+    frames += [f.assign(type_local=ALL_TYPES) for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def histogram_quantiles(hist, group_columns, quantiles=QUANTILES):
+    """
+    Interpole des quantiles de prix au m² à partir d'histogrammes groupés (vectorisé).
+
+    Args:
+        hist (DataFrame): colonnes group_columns + ['bin', 'n'].
+        quantiles (dict): {nom_colonne: probabilité}.
+
+    Returns:
+        DataFrame: une ligne par groupe, une colonne par quantile et l'effectif
+        « ventes_avec_surface » de l'histogramme.
+    """
+    hist = hist.sort_values(group_columns + ["bin"]).reset_index(drop=True)
+    grouped = hist.groupby(group_columns, observed=True, sort=False)["n"]
+    cumulative = grouped.cumsum().to_numpy(dtype=float)
+    total = grouped.transform("sum").to_numpy(dtype=float)
+    counts = hist["n"].to_numpy(dtype=float)
+    bins = hist["bin"].to_numpy()
+
+    starts = hist[group_columns].drop_duplicates().index.to_numpy()
+    result = hist.loc[starts, group_columns].reset_index(drop=True)
+    result["ventes_avec_surface"] = total[starts].astype(np.int64)
+    for name, q in quantiles.items():
+        reached = cumulative >= q * total
+        first = hist[reached].drop_duplicates(group_columns).index.to_numpy()
+        # Position du quantile dans la classe, interpolée en échelle logarithmique
+        fraction = (q * total[first] - (cumulative[first] - counts[first])) / counts[first]
+        low, high = _LOG_EDGES[bins[first]], _LOG_EDGES[bins[first] + 1]
+        result[name] = np.exp(low + np.clip(fraction, 0, 1) * (high - low))
+    return result
+
+
+def build_summary(store_dir):
+    """
+    Consolide les agrégats de toutes les sources en une synthèse unique.
+
+    Returns:
+        DataFrame: synthèse indexée par GROUP_COLUMNS (également écrite dans summary.parquet).
+    """
+    totals = _read_partials(store_dir, "totals")
+    if totals.empty:
+        return pd.DataFrame()
+    totals = _with_rollups(totals).groupby(GROUP_COLUMNS, observed=True).sum().reset_index()
+
+    hist = _read_partials(store_dir, "hist")
+    if not hist.empty:
+        hist = _with_rollups(hist).groupby(GROUP_COLUMNS + ["bin"], observed=True).sum().reset_index()
+        prices = histogram_quantiles(hist, GROUP_COLUMNS)
+        totals = totals.merge(prices, on=GROUP_COLUMNS, how="left")
+
+    summary = totals.set_index(GROUP_COLUMNS).sort_index()
+    path = os.path.join(aggregates_dir(store_dir), SUMMARY_NAME)
+    summary.to_parquet(path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return summary
+
+
+def load_summary(store_dir):
+    """
+    Charge la synthèse précalculée (DataFrame vide si elle n'existe pas encore).
+    """
+    path = os.path.join(aggregates_dir(store_dir), SUMMARY_NAME)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    return pd.read_parquet(path)
+
+
+def market_summary(summary, code_departement, annee, mois=0):
+    """
+    Extrait la synthèse d'un département pour une année (ou un mois) sans toucher aux données brutes.
+
+    Returns:
+        DataFrame: une ligne par (code postal, type de local).
+    """
+    if summary.empty:
+        return summary
+    try:
+        part = summary.xs((code_departement, int(annee), int(mois)), level=["code_departement", "annee", "mois"])
+    except KeyError:
+        return summary.iloc[0:0]
+    return part.reset_index()
+
+
+def lookup(summary, code_departement, code_postal, annee, type_local=ALL_TYPES, mois=0):
+    """
+    Statistiques d'un groupe précis (accès direct par l'index), ou None s'il est absent.
+    """
+    try:
+        return summary.loc[(code_departement, code_postal, type_local, int(annee), int(mois))].to_dict()
+    except KeyError:
+        return None
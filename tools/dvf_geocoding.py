@@ -0,0 +1,395 @@
+# tools/dvf_geocoding.py
+#
+# Géocodage par lots des ventes DVF sans coordonnées, à l'ingestion.
+#
+# Les fichiers bruts (ValeursFoncieres-AAAA.txt) n'ont pas de latitude/longitude, et une
+# partie des lignes du format géolocalisé en est dépourvue : plutôt que de les supprimer,
+# tools/dvf_ingest.py peut les géocoder (option --geocode).
+#
+#   - les adresses sont normalisées (voir tools/dvf_address_index.normalize_street) puis
+#     dédoublonnées : une adresse n'est résolue qu'une fois, quel que soit le nombre de
+#     lignes qui la partagent ;
+#   - les résultats, y compris « introuvable », sont conservés dans un cache SQLite
+#     persistant (data/geocode_cache.sqlite) : une nouvelle ingestion ne résout que les
+#     adresses nouvelles ;
+#   - les adresses manquantes sont résolues en parallèle, sous un débit maximal commun à
+#     tous les threads ;
+#   - le service de géocodage est interchangeable : API Adresse (BAN), Nominatim (geopy,
+#     optionnel) ou LocalGeocoder, qui s'appuie sur les ventes déjà géolocalisées et ne
+#     fait aucun appel réseau (essais, ingestion hors ligne).
+
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import requests
+
+from tools.dvf_address_index import normalize_street
+
+DEFAULT_CACHE = os.path.join("data", "geocode_cache.sqlite")
+# Requêtes par seconde (l'API Adresse tolère 50 requêtes par seconde et par IP)
+DEFAULT_RATE = 10.0
+DEFAULT_WORKERS = 4
+BAN_URL = "https://api-adresse.data.gouv.fr/search/"
+# Score minimal d'un résultat de l'API Adresse pour être retenu
+MIN_SCORE = 0.5
+# (connexion, lecture) en secondes
+DEFAULT_TIMEOUT = (3.05, 10)
+USER_AGENT = "SimImmo/1.0 (geocodage DVF)"
+
+ADDRESS_FIELDS = ["numero", "suffixe", "voie", "code_postal", "commune"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocodes (
+    address TEXT PRIMARY KEY,
+    latitude REAL,
+    longitude REAL,
+    backend TEXT NOT NULL,
+    resolved_at REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+
+class GeocodeError(Exception):
+    """
+    Échec temporaire du service (délai dépassé, quota, erreur serveur, réponse
+    illisible) : l'adresse n'est pas mise en cache et sera retentée à la prochaine
+    ingestion.
+    """
+
+
+def address_frame(df):
+    """
+    Adresse normalisée de chaque ligne DVF.
+
+    Returns:
+        DataFrame: colonnes de ADDRESS_FIELDS et « address » (clé du cache, NA si la ligne
+        n'a pas de nom de voie).
+    """
+    def text(column):
+        if column not in df.columns:
+            return pd.Series("", index=df.index, dtype="string")
+        return df[column].astype("string").fillna("").str.strip()
+
+    voie = normalize_street(df["adresse_nom_voie"]) if "adresse_nom_voie" in df.columns else text("")
+    commune = normalize_street(df["nom_commune"]).fillna("") if "nom_commune" in df.columns else text("")
+    addresses = pd.DataFrame({
+        "numero": text("adresse_numero"),
+        "suffixe": text("adresse_suffixe").str.upper(),
+        "voie": voie,
+        "code_postal": text("code_postal"),
+        "commune": commune,
+    }, index=df.index)
+    addresses["address"] = addresses["numero"].str.cat(addresses[ADDRESS_FIELDS[1:]], sep="|")
+    addresses.loc[addresses["voie"].isna() | (addresses["voie"] == ""), "address"] = pd.NA
+    return addresses
+
+
+def query_text(address):
+    """
+    Adresse en clair pour un service de géocodage (« 12 B RUE X 75001 PARIS »).
+    """
+    numero = f"{address['numero']}{address['suffixe']}".strip()
+    return " ".join(p for p in (numero, address["voie"], address["code_postal"], address["commune"]) if p)
+
+
+class GeocodeCache:
+    """
+    Cache persistant adresse -> coordonnées, dans une base SQLite (mode WAL : plusieurs
+    processus d'ingestion peuvent le partager). Une adresse introuvable est conservée
+    avec des coordonnées nulles, pour ne pas être redemandée.
+
+    Args:
+        path (str): Chemin de la base (créée au besoin).
+    """
+
+    def __init__(self, path=DEFAULT_CACHE):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get_many(self, addresses, batch_size=500):
+        """
+        Returns:
+            dict: {adresse: (latitude, longitude)} pour les adresses connues,
+            (None, None) pour celles déjà signalées introuvables.
+        """
+        addresses = list(addresses)
+        found = {}
+        with self._connect() as conn:
+            for start in range(0, len(addresses), batch_size):
+                batch = addresses[start:start + batch_size]
+                rows = conn.execute(
+                    f"SELECT address, latitude, longitude FROM geocodes WHERE address IN ({','.join('?' * len(batch))})",
+                    batch,
+                )
+                found.update((address, (lat, lon)) for address, lat, lon in rows)
+        return found
+
+    def put_many(self, results, backend):
+        """
+        Enregistre des résultats {adresse: (latitude, longitude) ou None}.
+        """
+        now = time.time()
+        rows = [
+            (address, *(coordinates if coordinates is not None else (None, None)), backend, now)
+            for address, coordinates in results.items()
+        ]
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM geocodes").fetchone()[0]
+
+
+class RateLimiter:
+    """
+    Débit maximal partagé par plusieurs threads (intervalle minimal entre deux appels).
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class BanGeocoder:
+    """
+    API Adresse de la Base Adresse Nationale (api-adresse.data.gouv.fr), sans clé d'API.
+
+    L'URL est configurable, ce qui permet de viser une instance locale (addok) ou un
+    serveur de test.
+    """
+
+    name = "ban"
+
+    def __init__(self, url=BAN_URL, timeout=DEFAULT_TIMEOUT, min_score=MIN_SCORE):
+        self.url = url
+        self.timeout = timeout
+        self.min_score = min_score
+        self._local = threading.local()
+
+    def _session(self):
+        # Une session HTTP par thread (requests.Session n'est pas garantie thread-safe)
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.headers["User-Agent"] = USER_AGENT
+        return session
+
+    def geocode(self, address):
+        params = {"q": query_text(address), "limit": 1}
+        if address["code_postal"]:
+            params["postcode"] = address["code_postal"]
+        try:
+            response = self._session().get(self.url, params=params, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise GeocodeError(f"{type(e).__name__}: {e}") from e
+        # Requête refusée (adresse inexploitable) ou rien à cette adresse : introuvable
+        if response.status_code in (400, 404):
+            return None
+        if response.status_code >= 400:
+            raise GeocodeError(f"HTTP {response.status_code}")
+        # Réponse illisible (page d'erreur d'un proxy, JSON tronqué) : échec temporaire
+        try:
+            features = response.json().get("features") or []
+            if not features or features[0]["properties"].get("score", 0) < self.min_score:
+                return None
+            lon, lat = features[0]["geometry"]["coordinates"]
+            return float(lat), float(lon)
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise GeocodeError(f"Réponse invalide : {type(e).__name__}: {e}") from e
+
+
+class NominatimGeocoder:
+    """
+    Nominatim (OpenStreetMap) via geopy, installé séparément (pip install geopy).
+    Les conditions d'utilisation du service public limitent le débit à 1 requête par seconde.
+    """
+
+    name = "nominatim"
+
+    def __init__(self, user_agent=USER_AGENT, timeout=10):
+        from geopy.exc import GeocoderServiceError, GeocoderTimedOut
+        from geopy.geocoders import Nominatim
+        self._geolocator = Nominatim(user_agent=user_agent, timeout=timeout)
+        self._transient = (GeocoderTimedOut, GeocoderServiceError)
+
+    def geocode(self, address):
+        try:
+            location = self._geolocator.geocode(f"{query_text(address)}, France")
+        except self._transient as e:
+            raise GeocodeError(f"{type(e).__name__}: {e}") from e
+        return None if location is None else (location.latitude, location.longitude)
+
+
+class LocalGeocoder:
+    """
+    Géocodeur hors ligne à partir de ventes déjà géolocalisées : position moyenne des
+    ventes à la même adresse, à défaut dans la même rue (même code postal).
+
+    Args:
+        reference (DataFrame): lignes DVF normalisées avec latitude et longitude.
+        delay (float): Latence simulée par requête, en secondes (essais).
+    """
+
+    name = "local"
+
+    def __init__(self, reference, delay=0.0):
+        reference = reference.dropna(subset=["latitude", "longitude"])
+        addresses = address_frame(reference)
+        coordinates = reference[["latitude", "longitude"]].astype(float)
+        by_address = coordinates.groupby(addresses["address"]).mean()
+        by_street = coordinates.groupby(addresses["voie"].str.cat(addresses["code_postal"], sep="|")).mean()
+        self._addresses = dict(zip(by_address.index, zip(by_address["latitude"], by_address["longitude"])))
+        self._streets = dict(zip(by_street.index, zip(by_street["latitude"], by_street["longitude"])))
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_store(cls, store_dir, departements=None, **kwargs):
+        """
+        Référence construite à partir des ventes géolocalisées du stockage Parquet.
+        """
+        from tools.dvf_store import available_departements, load_partition
+        columns = ["adresse_numero", "adresse_suffixe", "adresse_nom_voie", "code_postal", "nom_commune",
+                   "latitude", "longitude"]
+        frames = [load_partition(store_dir, departement, columns=columns)
+                  for departement in (departements or available_departements(store_dir))]
+        reference = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+        return cls(reference, **kwargs)
+
+    def geocode(self, address):
+        with self._lock:
+            self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        key = "|".join(address[f] for f in ADDRESS_FIELDS)
+        if key in self._addresses:
+            return self._addresses[key]
+        return self._streets.get(f"{address['voie']}|{address['code_postal']}")
+
+
+class BatchGeocoder:
+    """
+    Géocode des lots d'adresses : cache, dédoublonnage, appels parallèles à débit limité.
+
+    Args:
+        backend: Service de géocodage (méthode geocode(adresse) -> (lat, lon) ou None,
+            GeocodeError en cas d'échec temporaire).
+        cache (GeocodeCache, optional): Cache persistant (aucun cache si None).
+        max_workers (int): Requêtes simultanées.
+        rate (float): Requêtes par seconde au plus, tous threads confondus (None : sans limite).
+
+    Attributes:
+        stats (dict): Compteurs cumulés : adresses distinctes, trouvées en cache, résolues,
+            introuvables, en erreur, et lignes complétées.
+    """
+
+    def __init__(self, backend, cache=None, max_workers=DEFAULT_WORKERS, rate=DEFAULT_RATE):
+        self.backend = backend
+        self.cache = cache
+        self.max_workers = max_workers
+        self.limiter = RateLimiter(rate)
+        self.stats = {"addresses": 0, "cached": 0, "resolved": 0, "not_found": 0, "errors": 0, "rows_filled": 0}
+
+    def _resolve(self, address):
+        self.limiter.wait()
+        try:
+            return self.backend.geocode(address)
+        except GeocodeError:
+            return GeocodeError
+
+    def geocode(self, addresses):
+        """
+        Coordonnées d'adresses distinctes.
+
+        Args:
+            addresses (DataFrame): une ligne par adresse, colonnes de ADDRESS_FIELDS et « address ».
+
+        Returns:
+            dict: {adresse: (latitude, longitude)} pour les adresses trouvées.
+        """
+        addresses = addresses.dropna(subset=["address"]).drop_duplicates(subset="address")
+        keys = addresses["address"].tolist()
+        known = self.cache.get_many(keys) if self.cache is not None else {}
+        missing = addresses[~addresses["address"].isin(known)]
+        self.stats["addresses"] += len(keys)
+        self.stats["cached"] += len(known)
+
+        records = missing[ADDRESS_FIELDS].to_dict("records")
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            resolved = dict(zip(missing["address"], pool.map(self._resolve, records)))
+        resolved = {address: r for address, r in resolved.items() if r is not GeocodeError}
+        self.stats["errors"] += len(missing) - len(resolved)
+        self.stats["not_found"] += sum(r is None for r in resolved.values())
+        self.stats["resolved"] += sum(r is not None for r in resolved.values())
+        if self.cache is not None and resolved:
+            self.cache.put_many(resolved, self.backend.name)
+
+        results = {address: c for address, c in known.items() if c[0] is not None}
+        results.update((address, c) for address, c in resolved.items() if c is not None)
+        return results
+
+    def fill_missing(self, df):
+        """
+        Complète la latitude et la longitude des lignes qui n'en ont pas (colonnes créées
+        au besoin, pour les fichiers bruts).
+
+        Returns:
+            DataFrame: df complété ; les lignes dont l'adresse reste introuvable gardent des NaN.
+        """
+        df = df.copy()
+        for column in ("latitude", "longitude"):
+            if column not in df.columns:
+                df[column] = np.float32(np.nan)
+        missing = df["latitude"].isna() | df["longitude"].isna()
+        if not missing.any():
+            return df
+        addresses = address_frame(df[missing])
+        coordinates = self.geocode(addresses)
+        if coordinates:
+            found = addresses["address"].map(coordinates).dropna()
+            df.loc[found.index, "latitude"] = np.float32([c[0] for c in found])
+            df.loc[found.index, "longitude"] = np.float32([c[1] for c in found])
+            self.stats["rows_filled"] += len(found)
+        return df
+
+
+BACKENDS = {"ban": BanGeocoder, "nominatim": NominatimGeocoder}
+
+
+def make_geocoder(backend, cache_path=DEFAULT_CACHE, rate=DEFAULT_RATE, max_workers=DEFAULT_WORKERS,
+                  store_dir=None):
+    """
+    BatchGeocoder à partir du nom d'un service (« ban », « nominatim » ou « local », ce
+    dernier s'appuyant sur les ventes géolocalisées du stockage store_dir).
+    """
+    if backend == "local":
+        instance = LocalGeocoder.from_store(store_dir)
+    else:
+        instance = BACKENDS[backend]()
+    cache = GeocodeCache(cache_path) if cache_path else None
+    return BatchGeocoder(instance, cache, max_workers=max_workers, rate=rate)
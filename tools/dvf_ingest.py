@@ -0,0 +1,436 @@
+# tools/dvf_ingest.py
+#
+# Ingestion par lots des fichiers DVF nationaux (full.csv, ValeursFoncieres-AAAA.txt)
+# vers le stockage Parquet partitionné de tools/dvf_store.py, à mémoire bornée :
+#   python -m tools.dvf_ingest "full.csv" "ValeursFoncieres-2023.txt" --store data/dvf_store
+#
+# Le fichier source est lu par blocs de `chunksize` lignes ; chaque bloc est normalisé
+# (opérations vectorisées) puis ajouté aux fichiers Parquet des partitions concernées.
+# La mémoire utilisée dépend de la taille d'un bloc, pas de celle du fichier.
+#
+# Rafraîchissement complet (un fichier par département et par année), en parallèle :
+#   python -m tools.dvf_ingest data/raw --store data/dvf_store --workers 8
+# Les sources dont la somme de contrôle n'a pas changé depuis la dernière ingestion
+# (manifeste « _ingest_manifest.json » du stockage) sont ignorées : une ingestion
+# interrompue reprend là où elle s'était arrêtée.
+#
+# Les lignes sans coordonnées (fichiers bruts notamment) peuvent être géocodées à
+# l'ingestion, avec un cache persistant des adresses (voir tools/dvf_geocoding.py) :
+#   python -m tools.dvf_ingest data/raw --store data/dvf_store --geocode ban
+#
+# Une nouvelle publication d'une source déjà ingérée (DVF est republié chaque semestre)
+# peut être appliquée sans réingestion complète, voir tools/dvf_update.py :
+#   python -m tools.dvf_update full_2025S1.csv --store data/dvf_store --part-name full
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pyarrow.parquet as pq
+
+from tools.dvf_address_index import AddressAccumulator, build_address_index
+from tools.dvf_aggregates import AggregateAccumulator, build_summary
+from tools.dvf_geocoding import (
+    DEFAULT_CACHE as DEFAULT_GEOCODE_CACHE,
+    DEFAULT_RATE as DEFAULT_GEOCODE_RATE,
+    make_geocoder,
+)
+from tools.dvf_mapped import build_mapped
+from tools.dvf_mutations import build_mutations, split_complete_mutations
+from tools.dvf_store import (
+    DEFAULT_STORE,
+    PARTITION_COLUMNS,
+    RAW_COLUMNS,
+    STORE_DTYPES,
+    normalize_dvf,
+    partition_path,
+    read_source,
+    source_part_name,
+    to_arrow,
+)
+
+DEFAULT_CHUNKSIZE = 250_000
+MANIFEST_NAME = "_ingest_manifest.json"
+SOURCE_EXTENSIONS = (".csv", ".txt", ".csv.gz", ".txt.gz", ".csv.zip", ".txt.zip")
+
+
+def _wanted_column(column):
+    """
+    Colonnes de la source à lire : celles du stockage (sous leur nom brut ou géolocalisé).
+    """
+    name = RAW_COLUMNS.get(column, column)
+    return name in STORE_DTYPES or name == "code_departement"
+
+
+def iter_normalized_chunks(path, chunksize=DEFAULT_CHUNKSIZE, departement=None, drop_missing_coordinates=True,
+                           geocoder=None):
+    """
+    Lit un export DVF par blocs et renvoie des DataFrames normalisés.
+
+    Args:
+        path (str): Fichier source (.csv géolocalisé ou .txt brut).
+        chunksize (int): Nombre de lignes lues à la fois.
+        departement (str, optional): Code département si la source n'en contient pas.
+        drop_missing_coordinates (bool): Supprime les lignes sans latitude/longitude
+            (sans effet sur les fichiers bruts, qui n'ont pas de coordonnées).
+        geocoder (BatchGeocoder, optional): Géocode les lignes sans coordonnées avant
+            ce filtrage (voir tools/dvf_geocoding.py).
+
+    Yields:
+        DataFrame: bloc normalisé (schéma de tools/dvf_store.STORE_DTYPES + partitions),
+        ne contenant que des mutations complètes.
+    """
+    reader = read_source(path, chunksize=chunksize, usecols=_wanted_column)
+    carry = None
+    with reader:
+        for chunk in reader:
+            df = normalize_dvf(chunk, departement=departement)
+            has_coordinates = {"latitude", "longitude"} <= set(df.columns)
+            if geocoder is not None:
+                df = geocoder.fill_missing(df)
+            if drop_missing_coordinates and has_coordinates:
+                df = df.dropna(subset=["latitude", "longitude"])
+            # La dernière mutation du bloc peut continuer dans le bloc suivant : on la reporte
+            df, carry = split_complete_mutations(df, carry)
+            if not df.empty:
+                yield df
+    if carry is not None and not carry.empty:
+        yield carry
+
+
+class PartitionWriter:
+    """
+    Ajoute des blocs normalisés aux fichiers Parquet « <part_name>.parquet » des partitions.
+
+    Un ParquetWriter reste ouvert par partition rencontrée ; chaque bloc devient un
+    groupe de lignes. Les fichiers sont écrits sous un nom temporaire puis renommés
+    à la fermeture, de sorte qu'une ingestion interrompue ne laisse pas de fichier
+    partiel visible, et que réingérer une source remplace ses anciens fichiers.
+    """
+
+    def __init__(self, store_dir, part_name):
+        self.store_dir = store_dir
+        self.part_name = part_name
+        self._writers = {}
+        self.rows = {}
+
+    def _final_path(self, departement, annee):
+        return os.path.join(partition_path(self.store_dir, departement, annee), f"{self.part_name}.parquet")
+
+    def write(self, df):
+        df = df.dropna(subset=PARTITION_COLUMNS)
+        for (departement, annee), part in df.groupby(PARTITION_COLUMNS, observed=True, sort=False):
+            key = (str(departement), int(annee))
+            table = to_arrow(part.drop(columns=PARTITION_COLUMNS).reset_index(drop=True))
+            writer = self._writers.get(key)
+            if writer is None:
+                tmp_path = self._final_path(*key) + ".tmp"
+                os.makedirs(os.path.dirname(tmp_path), exist_ok=True)
+                writer = self._writers[key] = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table)
+            self.rows[key] = self.rows.get(key, 0) + len(part)
+
+    def close(self):
+        """
+        Finalise les fichiers et supprime ceux d'une ingestion précédente de la même source
+        dans les partitions qui n'ont plus de lignes.
+
+        Returns:
+            dict: {(departement, annee): nombre_de_lignes}
+        """
+        for writer in self._writers.values():
+            writer.close()
+        final_paths = {self._final_path(*key) for key in self._writers}
+        pattern = os.path.join(self.store_dir, "code_departement=*", "annee=*", f"{self.part_name}.parquet")
+        for stale in set(glob.glob(pattern)) - final_paths:
+            os.remove(stale)
+        for path in final_paths:
+            os.replace(path + ".tmp", path)
+        self._writers = {}
+        return dict(self.rows)
+
+    def abort(self):
+        """
+        Abandonne l'ingestion en cours : les fichiers temporaires sont supprimés.
+        """
+        for key, writer in self._writers.items():
+            writer.close()
+            os.remove(self._final_path(*key) + ".tmp")
+        self._writers = {}
+
+
+def ingest_streaming(
+    path,
+    store_dir=DEFAULT_STORE,
+    chunksize=DEFAULT_CHUNKSIZE,
+    departement=None,
+    drop_missing_coordinates=True,
+    part_name=None,
+    geocoder=None,
+):
+    """
+    Convertit un export DVF (éventuellement national) en partitions Parquet, bloc par bloc.
+
+    Les agrégats de prix de la source (tools/dvf_aggregates.py) et les entrées de l'index
+    d'adresses (tools/dvf_address_index.py) sont cumulés au fil des blocs ; appeler
+    build_summary et build_address_index ensuite pour mettre à jour la synthèse et l'index.
+
+    Args:
+        part_name (str, optional): Nom des fichiers écrits dans les partitions (dérivé du
+            nom de la source par défaut). Il doit être unique par source.
+        geocoder (BatchGeocoder, optional): Géocode les lignes sans coordonnées
+            (compteurs dans geocoder.stats).
+
+    Returns:
+        dict: {(departement, annee): nombre_de_lignes}
+    """
+    part_name = part_name or source_part_name(path)
+    writer = PartitionWriter(store_dir, part_name)
+    aggregates = AggregateAccumulator()
+    addresses = AddressAccumulator()
+    try:
+        for df in iter_normalized_chunks(path, chunksize, departement, drop_missing_coordinates, geocoder):
+            writer.write(df)
+            mutations = build_mutations(df)[0]
+            aggregates.add(mutations)
+            addresses.add(mutations)
+    except BaseException:
+        writer.abort()
+        raise
+    rows = writer.close()
+    # Agrégats et index d'adresses de la source, consolidés ensuite par build_summary
+    # et build_address_index
+    aggregates.write(store_dir, part_name)
+    addresses.write(store_dir, part_name)
+    return rows
+
+
+def file_checksum(path, block_size=1024 * 1024):
+    """
+    Somme de contrôle SHA-256 d'un fichier, lue par blocs.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(store_dir):
+    path = os.path.join(store_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(store_dir, manifest):
+    """
+    Écrit le manifeste de façon atomique (fichier temporaire puis renommage).
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    path = os.path.join(store_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def collect_sources(paths):
+    """
+    Développe les répertoires en fichiers sources et associe à chacun un nom de partition unique.
+
+    Pour un fichier situé dans un répertoire donné (ex : data/raw/2023/departements/75.csv.gz),
+    le nom reprend le chemin relatif (« 2023_departements_75 ») afin que les fichiers
+    homonymes de plusieurs années ne s'écrasent pas.
+
+    Returns:
+        list[tuple]: [(chemin_source, nom_de_partition)]
+    """
+    sources = []
+    for path in paths:
+        if not os.path.isdir(path):
+            sources.append((path, source_part_name(path)))
+            continue
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                if not name.lower().endswith(SOURCE_EXTENSIONS):
+                    continue
+                source = os.path.join(root, name)
+                relative = os.path.relpath(source, path)
+                parent = os.path.dirname(relative).replace(os.sep, "_")
+                part_name = source_part_name(source)
+                sources.append((source, f"{parent}_{part_name}" if parent else part_name))
+    return sorted(sources)
+
+
+def _ingest_task(source, part_name, store_dir, chunksize, departement, drop_missing_coordinates, previous_checksum,
+                 geocoding=None):
+    """
+    Tâche exécutée dans un processus du pool : ingère une source si elle a changé.
+
+    Le géocodeur est construit dans le processus à partir de `geocoding` (arguments de
+    tools/dvf_geocoding.make_geocoder) : sessions HTTP et connexions au cache ne se
+    transmettent pas d'un processus à l'autre.
+    """
+    started = time.perf_counter()
+    checksum = file_checksum(source)
+    if checksum == previous_checksum:
+        return {"source": source, "part_name": part_name, "checksum": checksum, "skipped": True}
+    geocoder = make_geocoder(store_dir=store_dir, **geocoding) if geocoding else None
+    rows = ingest_streaming(source, store_dir, chunksize, departement, drop_missing_coordinates, part_name, geocoder)
+    return {
+        "source": source,
+        "part_name": part_name,
+        "checksum": checksum,
+        "skipped": False,
+        "seconds": round(time.perf_counter() - started, 3),
+        "partitions": {f"{dep}/{year}": count for (dep, year), count in sorted(rows.items())},
+        "geocoding": geocoder.stats if geocoder else None,
+    }
+
+
+def ingest_many(
+    paths,
+    store_dir=DEFAULT_STORE,
+    workers=None,
+    chunksize=DEFAULT_CHUNKSIZE,
+    departement=None,
+    drop_missing_coordinates=True,
+    force=False,
+    report=print,
+    geocode=None,
+    geocode_cache=DEFAULT_GEOCODE_CACHE,
+    geocode_rate=DEFAULT_GEOCODE_RATE,
+):
+    """
+    Ingère plusieurs sources en parallèle (un processus par source) avec reprise idempotente.
+
+    Chaque source terminée est aussitôt inscrite au manifeste avec sa somme de contrôle,
+    le temps passé et le nombre de lignes par partition.
+
+    Args:
+        paths (list[str]): Fichiers ou répertoires sources.
+        workers (int, optional): Nombre de processus (nombre de cœurs par défaut).
+        force (bool): Réingère même les sources inchangées.
+        report (callable): Fonction appelée avec une ligne de compte rendu par source.
+        geocode (str, optional): Service de géocodage des lignes sans coordonnées
+            (« ban », « nominatim » ou « local », voir tools/dvf_geocoding.py).
+        geocode_cache (str): Cache des adresses géocodées, partagé par les processus.
+        geocode_rate (float): Requêtes par seconde au plus, réparties entre les processus.
+
+    Returns:
+        list[dict]: résultat de chaque tâche (source, skipped, seconds, partitions).
+    """
+    manifest = load_manifest(store_dir)
+    sources = collect_sources(paths)
+    results = []
+    geocoding = None
+    if geocode:
+        processes = max(1, min(workers or os.cpu_count() or 1, len(sources)))
+        geocoding = {"backend": geocode, "cache_path": geocode_cache, "rate": geocode_rate / processes}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                _ingest_task,
+                source,
+                part_name,
+                store_dir,
+                chunksize,
+                departement,
+                drop_missing_coordinates,
+                None if force else manifest.get(part_name, {}).get("checksum"),
+                geocoding,
+            )
+            for source, part_name in sources
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if result["skipped"]:
+                report(f"{result['source']} : inchangé, ignoré")
+                continue
+            manifest[result["part_name"]] = {
+                "source": result["source"],
+                "checksum": result["checksum"],
+                "seconds": result["seconds"],
+                "partitions": result["partitions"],
+                "ingested_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            save_manifest(store_dir, manifest)
+            report(
+                f"{result['source']} : {sum(result['partitions'].values())} lignes en {result['seconds']:.1f} s"
+            )
+            for partition, count in result["partitions"].items():
+                report(f"    {partition} : {count} lignes")
+            if result["geocoding"]:
+                g = result["geocoding"]
+                report(
+                    f"    géocodage : {g['addresses']} adresses ({g['cached']} en cache, {g['resolved']} résolues, "
+                    f"{g['not_found']} introuvables, {g['errors']} en erreur), {g['rows_filled']} lignes complétées"
+                )
+
+    if any(not r["skipped"] for r in results):
+        started = time.perf_counter()
+        build_summary(store_dir)
+        report(f"Synthèse des prix mise à jour en {time.perf_counter() - started:.1f} s")
+        started = time.perf_counter()
+        build_address_index(store_dir)
+        report(f"Index des adresses mis à jour en {time.perf_counter() - started:.1f} s")
+        started = time.perf_counter()
+        departements = sorted({
+            partition.split("/")[0] for r in results if not r["skipped"] for partition in r["partitions"]
+        })
+        build_mapped(store_dir, departements)
+        report(f"Mutations projetées de {len(departements)} départements mises à jour en "
+               f"{time.perf_counter() - started:.1f} s")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingestion par lots des fichiers DVF vers le stockage Parquet.")
+    parser.add_argument("sources", nargs="+", help="Fichiers DVF (.csv géolocalisé ou .txt brut) ou répertoires")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="Répertoire du stockage")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE, help="Lignes lues par bloc")
+    parser.add_argument("--departement", default=None, help="Code département si absent de la source")
+    parser.add_argument("--workers", type=int, default=None, help="Nombre de processus (nombre de cœurs par défaut)")
+    parser.add_argument("--force", action="store_true", help="Réingère même les sources inchangées")
+    parser.add_argument(
+        "--keep-missing-coordinates", action="store_true", help="Conserve les lignes sans latitude/longitude"
+    )
+    parser.add_argument(
+        "--geocode", choices=["ban", "nominatim", "local"], default=None,
+        help="Géocode les lignes sans coordonnées avec ce service",
+    )
+    parser.add_argument("--geocode-cache", default=DEFAULT_GEOCODE_CACHE, help="Cache des adresses géocodées")
+    parser.add_argument(
+        "--geocode-rate", type=float, default=DEFAULT_GEOCODE_RATE, help="Requêtes de géocodage par seconde au plus (0 : sans limite)"
+    )
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    results = ingest_many(
+        args.sources,
+        args.store,
+        workers=args.workers,
+        chunksize=args.chunksize,
+        departement=args.departement,
+        drop_missing_coordinates=not args.keep_missing_coordinates,
+        force=args.force,
+        geocode=args.geocode,
+        geocode_cache=args.geocode_cache,
+        geocode_rate=args.geocode_rate,
+    )
+    ingested = [r for r in results if not r["skipped"]]
+    print(
+        f"{len(ingested)} sources ingérées, {len(results) - len(ingested)} inchangées, "
+        f"en {time.perf_counter() - started:.1f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
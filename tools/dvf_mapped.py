@@ -0,0 +1,204 @@
+# tools/dvf_mapped.py
+#
+# Jeu de données DVF partagé en lecture seule, projeté en mémoire (mmap).
+#
+# Pour chaque département, la table des mutations (une ligne par vente, voir
+# tools/dvf_mutations.py) est écrite au format Arrow IPC non compressé :
+#   data/dvf_store/_mapped/code_departement=75.arrow
+# triée par (annee, code_postal, date_mutation). Les bornes de chaque année et de chaque
+# couple (année, code postal) sont calculées à l'écriture et rangées dans les
+# métadonnées du schéma.
+#
+# À l'ouverture, le fichier est projeté en mémoire : rien n'est lu ni copié. Filtrer une
+# année ou un code postal revient à découper la table (Table.slice, sans copie) entre des
+# bornes précalculées, au lieu d'évaluer un masque booléen sur toutes les lignes. Le
+# fichier est ouvert une fois par processus (st.cache_resource, voir tools/page_data.py)
+# et les pages du système de fichiers sont partagées par le système entre les processus ;
+# seule la tranche affichée est convertie en DataFrame.
+#
+# Construction (après l'ingestion, appelée par tools/dvf_store.py et tools/dvf_ingest.py) :
+#   python -m tools.dvf_mapped --store data/dvf_store
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from tools.dvf_mutations import build_mutations
+from tools.dvf_store import DEFAULT_STORE, available_departements, load_partition
+
+MAPPED_DIR = "_mapped"
+SLICES_KEY = b"simimmo.slices"
+SORT_COLUMNS = ["annee", "code_postal", "date_mutation"]
+
+# Colonnes lues dans le stockage pour construire les mutations
+STORE_COLUMNS = [
+    "id_mutation", "date_mutation", "nature_mutation", "valeur_fonciere", "adresse_numero", "adresse_suffixe",
+    "adresse_nom_voie", "code_postal", "code_commune", "nom_commune", "type_local", "surface_reelle_bati",
+    "nombre_pieces_principales", "nature_culture", "surface_terrain", "longitude", "latitude", "annee",
+]
+
+
+def mapped_path(store_dir, departement):
+    return os.path.join(store_dir, MAPPED_DIR, f"code_departement={departement}.arrow")
+
+
+def slice_bounds(mutations):
+    """
+    Bornes [début, fin) de chaque année et de chaque (année, code postal) d'une table
+    triée selon SORT_COLUMNS.
+    """
+    annees = mutations["annee"].to_numpy(dtype=np.int64)
+    codes = mutations["code_postal"].astype("string").fillna("").to_numpy(dtype=object)
+    bounds = {"annees": {}, "codes_postaux": []}
+    if not len(mutations):
+        return bounds
+    # Début de chaque série de (année, code postal) identiques
+    change = np.flatnonzero((annees[1:] != annees[:-1]) | (codes[1:] != codes[:-1])) + 1
+    starts = np.concatenate([[0], change])
+    stops = np.concatenate([change, [len(mutations)]])
+    for start, stop in zip(starts.tolist(), stops.tolist()):
+        annee, code = int(annees[start]), codes[start]
+        first, _ = bounds["annees"].get(annee, (start, stop))
+        bounds["annees"][annee] = (first, stop)
+        if code:
+            bounds["codes_postaux"].append((annee, code, start, stop))
+    return bounds
+
+
+def sort_mutations(mutations):
+    """
+    Mutations datées, triées selon SORT_COLUMNS, sans la colonne premier_lot.
+    """
+    mutations = mutations.dropna(subset=["annee"])
+    mutations = mutations.sort_values(SORT_COLUMNS, kind="stable", na_position="last").reset_index(drop=True)
+    # premier_lot désigne des lignes de la table des lots, qui n'est pas conservée ici
+    return mutations.drop(columns=["premier_lot"], errors="ignore")
+
+
+def write_mapped_table(table, path):
+    """
+    Écrit une table Arrow déjà triée selon SORT_COLUMNS, avec ses bornes recalculées, au
+    format Arrow IPC non compressé.
+
+    Returns:
+        int: nombre de mutations écrites.
+    """
+    bounds = slice_bounds(table.select(["annee", "code_postal"]).to_pandas())
+    metadata = {SLICES_KEY: json.dumps({
+        "annees": {str(a): b for a, b in bounds["annees"].items()},
+        "codes_postaux": bounds["codes_postaux"],
+    }).encode("utf-8")}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+    return table.num_rows
+
+
+def write_mapped(mutations, path):
+    """
+    Écrit une table de mutations triée, avec ses bornes, au format Arrow IPC non compressé.
+
+    Returns:
+        int: nombre de mutations écrites.
+    """
+    return write_mapped_table(pa.Table.from_pandas(sort_mutations(mutations), preserve_index=False), path)
+
+
+def build_mapped(store_dir=DEFAULT_STORE, departements=None):
+    """
+    (Re)construit le fichier projeté de chaque département à partir des partitions.
+
+    Returns:
+        dict: {departement: nombre_de_mutations}
+    """
+    written = {}
+    for departement in departements or available_departements(store_dir):
+        mutations = build_mutations(load_partition(store_dir, departement, columns=STORE_COLUMNS))[0]
+        written[departement] = write_mapped(mutations, mapped_path(store_dir, departement))
+    return written
+
+
+class MappedDataset:
+    """
+    Mutations d'un département, projetées en mémoire, découpées sans copie.
+
+    Args:
+        table (pyarrow.Table): mutations triées selon SORT_COLUMNS, avec les bornes dans
+            les métadonnées du schéma (voir write_mapped).
+    """
+
+    def __init__(self, table):
+        self.table = table
+        bounds = json.loads(table.schema.metadata[SLICES_KEY])
+        self._years = {int(a): tuple(b) for a, b in bounds["annees"].items()}
+        self._postal = {(int(a), code): (start, stop) for a, code, start, stop in bounds["codes_postaux"]}
+
+    @classmethod
+    def open(cls, store_dir, departement):
+        """
+        Projette le fichier d'un département en mémoire (None s'il n'a pas été construit).
+        """
+        path = mapped_path(store_dir, departement)
+        if not os.path.exists(path):
+            return None
+        return cls(pa.ipc.open_file(pa.memory_map(path, "r")).read_all())
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def years(self):
+        return sorted(self._years, reverse=True)
+
+    def postal_codes(self, annee=None):
+        return sorted({code for (a, code) in self._postal if annee is None or a == int(annee)})
+
+    def _ranges(self, annee=None, code_postal=None):
+        if annee is None and code_postal is None:
+            return [(0, len(self))]
+        if code_postal is None:
+            return [self._years[int(annee)]] if int(annee) in self._years else []
+        years = self.years() if annee is None else [int(annee)]
+        return [self._postal[(a, code_postal)] for a in sorted(years) if (a, code_postal) in self._postal]
+
+    def slice(self, annee=None, code_postal=None, columns=None):
+        """
+        Mutations d'une année et/ou d'un code postal, sans copie.
+
+        Returns:
+            pyarrow.Table: vue sur le fichier projeté (une tranche par année).
+        """
+        table = self.table if columns is None else self.table.select(columns)
+        ranges = self._ranges(annee, code_postal)
+        if not ranges:
+            return table.slice(0, 0)
+        if len(ranges) == 1:
+            start, stop = ranges[0]
+            return table.slice(start, stop - start)
+        return pa.concat_tables([table.slice(start, stop - start) for start, stop in ranges])
+
+    def frame(self, annee=None, code_postal=None, columns=None):
+        """
+        DataFrame d'une tranche (seule la tranche est convertie).
+        """
+        return self.slice(annee, code_postal, columns).to_pandas()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Construction des fichiers DVF projetés en mémoire.")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="Répertoire du stockage")
+    parser.add_argument("--departement", action="append", default=None, help="Département (tous par défaut)")
+    args = parser.parse_args(argv)
+    for departement, count in build_mapped(args.store, args.departement).items():
+        print(f"{departement} : {count} mutations")
+
+
+if __name__ == "__main__":
+    main()
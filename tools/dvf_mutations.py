@@ -0,0 +1,158 @@
+# tools/dvf_mutations.py
+#
+# Modèle « une ligne par mutation » pour les données DVF.
+#
+# Une vente (id_mutation) est répétée dans DVF sur autant de lignes qu'elle compte de
+# locaux, de lots et de parcelles (une même ligne de local est même recopiée pour
+# chaque parcelle), avec la même valeur foncière sur chaque ligne. On construit donc,
+# en une passe de group-by vectorisée :
+#   - une table des mutations, une ligne par vente, qui sert à la carte, aux filtres
+#     et aux agrégats de prix ;
+#   - une table des lots (lignes distinctes de la mutation), rangés de façon contiguë :
+#     les lots de la mutation i sont lots.iloc[premier_lot[i] : premier_lot[i] + nb_lots[i]].
+
+import numpy as np
+import pandas as pd
+
+# Type de local principal d'une mutation : le premier présent dans cet ordre
+TYPE_PRIORITY = ["Maison", "Appartement", "Local industriel. commercial ou assimilé", "Dépendance"]
+
+# Attributs recopiés à l'identique sur toutes les lignes d'une mutation
+MUTATION_COLUMNS = [
+    "id_mutation", "date_mutation", "nature_mutation", "valeur_fonciere",
+    "adresse_numero", "adresse_suffixe", "adresse_nom_voie", "code_postal",
+    "code_commune", "nom_commune", "code_departement", "annee",
+]
+
+# Colonnes décrivant un lot : deux lignes identiques sur ces colonnes sont un même lot
+LOT_COLUMNS = [
+    "adresse_numero", "adresse_suffixe", "adresse_nom_voie", "type_local",
+    "surface_reelle_bati", "nombre_pieces_principales", "nature_culture",
+    "surface_terrain", "longitude", "latitude",
+]
+
+# Clé de repli pour les fichiers bruts, qui n'ont pas d'id_mutation
+_FALLBACK_KEY_COLUMNS = ["date_mutation", "numero_disposition", "valeur_fonciere", "code_commune", "code_postal"]
+
+
+def mutation_keys(df):
+    """
+    Identifiant de mutation de chaque ligne : id_mutation, ou à défaut (fichiers bruts)
+    la combinaison date / disposition / valeur / commune.
+    """
+    if "id_mutation" in df.columns:
+        return df["id_mutation"].astype("string")
+    columns = [c for c in _FALLBACK_KEY_COLUMNS if c in df.columns]
+    return pd.Series(pd.util.hash_pandas_object(df[columns], index=False), index=df.index)
+
+
+def build_mutations(df):
+    """
+    Regroupe les lignes DVF par mutation.
+
+    Args:
+        df (DataFrame): lignes DVF normalisées (voir tools/dvf_store.normalize_dvf).
+
+    Returns:
+        tuple: (mutations, lots)
+            mutations : une ligne par vente, avec le type de local principal, la surface
+            bâtie et le nombre de pièces de ce type (lots dédoublonnés), la surface de
+            terrain, la position moyenne des lots, nb_locaux, premier_lot et nb_lots ;
+            lots : lignes distinctes, triées par mutation, avec la colonne mutation_index.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=MUTATION_COLUMNS), df.assign(mutation_index=pd.Series(dtype=np.int32))
+
+    codes, _ = pd.factorize(mutation_keys(df), sort=False)
+    order = np.argsort(codes, kind="stable")
+    lots = df.iloc[order].reset_index(drop=True)
+    lots.insert(0, "mutation_index", codes[order].astype(np.int32))
+
+    # Les lignes répétées (même local recopié pour chaque parcelle) ne forment qu'un lot
+    lot_columns = ["mutation_index"] + [c for c in LOT_COLUMNS if c in lots.columns]
+    lots = lots.drop_duplicates(subset=lot_columns).reset_index(drop=True)
+
+    grouped = lots.groupby("mutation_index", sort=True)
+    mutations = grouped[[c for c in MUTATION_COLUMNS if c in lots.columns]].first()
+    nb_lots = grouped.size().to_numpy()
+    mutations["nb_lots"] = nb_lots
+    mutations["premier_lot"] = np.concatenate([[0], np.cumsum(nb_lots)[:-1]])
+
+    if {"latitude", "longitude"} <= set(lots.columns):
+        coordinates = grouped[["latitude", "longitude"]].mean()
+        mutations["latitude"] = coordinates["latitude"].astype("float32")
+        mutations["longitude"] = coordinates["longitude"].astype("float32")
+
+    if "surface_terrain" in lots.columns:
+        terrain_columns = ["mutation_index"] + [c for c in ("nature_culture", "surface_terrain") if c in lots.columns]
+        terrains = lots.dropna(subset=["surface_terrain"]).drop_duplicates(subset=terrain_columns)
+        mutations["surface_terrain"] = (
+            terrains.groupby("mutation_index")["surface_terrain"].sum().reindex(mutations.index).astype("Int32")
+        )
+
+    if "type_local" in lots.columns:
+        _add_principal_local(mutations, lots)
+
+    mutations.index.name = None
+    return mutations.reset_index(drop=True), lots
+
+
+def _add_principal_local(mutations, lots):
+    """
+    Type de local principal, surface bâtie et pièces de ce type, nombre de locaux.
+    """
+    locaux = lots.dropna(subset=["type_local"])
+    locaux = locaux.drop_duplicates(
+        subset=[c for c in ["mutation_index", "adresse_numero", "adresse_nom_voie", "type_local",
+                            "surface_reelle_bati", "nombre_pieces_principales"] if c in locaux.columns]
+    )
+    rank = (
+        locaux["type_local"].astype("string")
+        .map({t: i for i, t in enumerate(TYPE_PRIORITY)})
+        .fillna(len(TYPE_PRIORITY))
+        .to_numpy()
+    )
+    best_rank = pd.Series(rank, index=locaux.index).groupby(locaux["mutation_index"]).transform("min")
+    principal = locaux[rank == best_rank.to_numpy()]
+
+    by_mutation = principal.groupby("mutation_index")
+    mutations["type_local"] = by_mutation["type_local"].first().reindex(mutations.index).astype("category")
+    if "surface_reelle_bati" in principal.columns:
+        mutations["surface_reelle_bati"] = (
+            by_mutation["surface_reelle_bati"].sum(min_count=1).reindex(mutations.index).astype("Int32")
+        )
+    if "nombre_pieces_principales" in principal.columns:
+        mutations["nombre_pieces_principales"] = (
+            by_mutation["nombre_pieces_principales"].sum(min_count=1).reindex(mutations.index).astype("Int16")
+        )
+    mutations["nb_locaux"] = locaux.groupby("mutation_index").size().reindex(mutations.index, fill_value=0)
+
+
+def split_complete_mutations(df, carry=None):
+    """
+    Sépare un bloc de lignes en mutations complètes et en lignes de la dernière mutation,
+    qui peut se poursuivre dans le bloc suivant (les lignes d'une mutation sont contiguës
+    dans les fichiers DVF).
+
+    Args:
+        df (DataFrame): bloc courant.
+        carry (DataFrame, optional): lignes reportées du bloc précédent.
+
+    Returns:
+        tuple: (lignes_completes, lignes_reportees)
+    """
+    if carry is not None and not carry.empty:
+        df = pd.concat([carry, df], ignore_index=True)
+    if df.empty:
+        return df, df
+    keys = mutation_keys(df)
+    last = keys.eq(keys.iloc[-1]).to_numpy()
+    return df[~last], df[last]
+
+
+def lots_of(mutations, lots, position):
+    """
+    Lots de la mutation située à la position donnée dans la table des mutations.
+    """
+    start = int(mutations["premier_lot"].iloc[position])
+    return lots.iloc[start:start + int(mutations["nb_lots"].iloc[position])]
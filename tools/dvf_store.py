@@ -0,0 +1,353 @@
+# tools/dvf_store.py
+#
+# Stockage colonnaire (Parquet) des données DVF, partitionné par département et par année :
+#   data/dvf_store/code_departement=75/annee=2023/<source>.parquet
+#
+# Conversion unique des exports CSV/TXT :
+#   python -m tools.dvf_store data/full.csv data/ValeursFoncieres-2023.txt --store data/dvf_store
+# Pour les fichiers nationaux, préférer la lecture par lots de tools/dvf_ingest.py.
+
+import argparse
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from tools.dvf_address_index import AddressAccumulator, build_address_index
+from tools.dvf_aggregates import AggregateAccumulator, build_summary
+from tools.dvf_mutations import build_mutations
+
+DEFAULT_STORE = os.path.join("data", "dvf_store")
+
+# En-têtes des fichiers bruts « ValeursFoncieres-AAAA.txt » -> noms du format géolocalisé (full.csv)
+RAW_COLUMNS = {
+    "Date mutation": "date_mutation",
+    "No disposition": "numero_disposition",
+    "Nature mutation": "nature_mutation",
+    "Valeur fonciere": "valeur_fonciere",
+    "No voie": "adresse_numero",
+    "B/T/Q": "adresse_suffixe",
+    "Voie": "adresse_nom_voie",
+    "Code voie": "adresse_code_voie",
+    "Code postal": "code_postal",
+    "Commune": "nom_commune",
+    "Code departement": "code_departement",
+    "Code commune": "code_commune",
+    "Code type local": "code_type_local",
+    "Type local": "type_local",
+    "Surface reelle bati": "surface_reelle_bati",
+    "Nombre pieces principales": "nombre_pieces_principales",
+    "Nature culture": "nature_culture",
+    "Surface terrain": "surface_terrain",
+}
+
+# Colonnes conservées dans le stockage et types compacts associés
+STORE_DTYPES = {
+    "id_mutation": "string",
+    "date_mutation": "datetime64[ns]",
+    "numero_disposition": "Int16",
+    "nature_mutation": "category",
+    "valeur_fonciere": "float64",
+    "adresse_numero": "Int32",
+    "adresse_suffixe": "category",
+    "adresse_nom_voie": "string",
+    "adresse_code_voie": "string",
+    "code_postal": "string",
+    "code_commune": "string",
+    "nom_commune": "category",
+    "code_type_local": "Int8",
+    "type_local": "category",
+    "surface_reelle_bati": "Int32",
+    "nombre_pieces_principales": "Int16",
+    "nature_culture": "category",
+    "surface_terrain": "Int32",
+    "longitude": "float32",
+    "latitude": "float32",
+}
+
+# Types Arrow équivalents : un schéma fixe garde des fichiers compatibles d'un lot à l'autre
+ARROW_TYPES = {
+    "string": pa.string(),
+    "datetime64[ns]": pa.timestamp("ns"),
+    "category": pa.dictionary(pa.int32(), pa.string()),
+    "float64": pa.float64(),
+    "float32": pa.float32(),
+    "Int32": pa.int32(),
+    "Int16": pa.int16(),
+    "Int8": pa.int8(),
+}
+
+# Colonnes de partitionnement (répertoires Hive « colonne=valeur »)
+PARTITION_COLUMNS = ["code_departement", "annee"]
+
+
+def _clean_number(series):
+    """
+    Convertit une colonne en nombre, y compris les valeurs à virgule décimale des fichiers bruts.
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+    return pd.to_numeric(series.astype("string").str.replace(",", ".", regex=False), errors="coerce")
+
+
+def _clean_code(series, width):
+    """
+    Normalise un code (postal, commune, département) : texte complété par des zéros à gauche.
+
+    Les codes lus comme des nombres (ex : 1170.0) sont ramenés à l'entier avant complétion.
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        series = series.astype("Int64")
+    series = series.astype("string").str.strip().str.replace(r"\.0$", "", regex=True)
+    return series.str.zfill(width).replace("", pd.NA)
+
+
+def derive_departement(df):
+    """
+    Déduit le code département à partir du code commune (INSEE) ou, à défaut, du code postal.
+
+    Les départements d'outre-mer (97x) utilisent trois caractères, la Corse (2A/2B) est
+    correctement portée par le code commune.
+    """
+    if "code_commune" in df.columns:
+        codes = df["code_commune"].astype("string")
+    else:
+        codes = df["code_postal"].astype("string")
+    return codes.str.slice(0, 2).where(~codes.str.startswith("97"), codes.str.slice(0, 3))
+
+
+def normalize_dvf(df, departement=None):
+    """
+    Normalise un DataFrame DVF (format brut ou géolocalisé) vers le schéma du stockage.
+
+    Args:
+        df (DataFrame): Données DVF lues depuis un CSV/TXT.
+        departement (str, optional): Code département à appliquer si le fichier n'en contient pas.
+
+    Returns:
+        DataFrame: colonnes de STORE_DTYPES présentes dans la source, plus code_departement et annee.
+    """
+    df = df.rename(columns=RAW_COLUMNS)
+    df = df[[c for c in list(STORE_DTYPES) + ["code_departement"] if c in df.columns]].copy()
+
+    if "date_mutation" in df.columns:
+        # Format géolocalisé AAAA-MM-JJ, format brut JJ/MM/AAAA
+        dates = df["date_mutation"].astype("string")
+        df["date_mutation"] = pd.to_datetime(dates, format="%Y-%m-%d", errors="coerce").fillna(
+            pd.to_datetime(dates, format="%d/%m/%Y", errors="coerce")
+        )
+
+    if "code_postal" in df.columns:
+        df["code_postal"] = _clean_code(df["code_postal"], 5)
+    if "code_commune" in df.columns:
+        if "code_departement" in df.columns and df["code_commune"].astype("string").str.len().max() < 5:
+            # Fichiers bruts : le code commune est relatif au département (3 chiffres). Outre-mer,
+            # le département a 3 caractères et le code INSEE reprend les 2 derniers chiffres
+            # de la commune (971 + 101 -> 97101)
+            departements = _clean_code(df["code_departement"], 2)
+            communes = _clean_code(df["code_commune"], 3)
+            df["code_commune"] = (departements + communes).where(
+                ~departements.str.startswith("97"), departements + communes.str.slice(-2)
+            )
+        else:
+            df["code_commune"] = _clean_code(df["code_commune"], 5)
+
+    if departement is not None:
+        df["code_departement"] = str(departement)
+    elif "code_departement" in df.columns:
+        df["code_departement"] = _clean_code(df["code_departement"], 2)
+    else:
+        df["code_departement"] = derive_departement(df)
+
+    for column, dtype in STORE_DTYPES.items():
+        if column not in df.columns or column == "date_mutation":
+            continue
+        if dtype.startswith(("Int", "float")):
+            values = _clean_number(df[column])
+            if dtype.startswith("Int"):
+                values = values.round()
+            df[column] = values.astype(dtype)
+        else:
+            df[column] = df[column].astype(dtype)
+
+    df["annee"] = df["date_mutation"].dt.year.astype("Int16") if "date_mutation" in df.columns else pd.NA
+    df["code_departement"] = df["code_departement"].astype("string")
+    return df
+
+
+def to_arrow(df):
+    """
+    Convertit un DataFrame normalisé (sans colonnes de partition) en table Arrow au schéma fixe.
+    """
+    schema = pa.schema([(column, ARROW_TYPES[STORE_DTYPES[column]]) for column in df.columns])
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+def _strip_compression(path):
+    root, ext = os.path.splitext(path)
+    return root if ext.lower() in (".gz", ".bz2", ".zip", ".xz", ".zst") else path
+
+
+def read_source(path, **read_csv_kwargs):
+    """
+    Lit un export DVF : « .txt » brut (séparateur '|') ou CSV géolocalisé (séparateur ','),
+    éventuellement compressé (« .gz », « .zip »…, décompressé par pandas).
+    """
+    sep = "|" if _strip_compression(path).lower().endswith(".txt") else ","
+    read_csv_kwargs.setdefault("sep", sep)
+    read_csv_kwargs.setdefault("dtype", str)
+    read_csv_kwargs.setdefault("low_memory", False)
+    return pd.read_csv(path, **read_csv_kwargs)
+
+
+def partition_path(store_dir, departement, annee=None):
+    """
+    Chemin du répertoire d'une partition (département, et éventuellement année).
+    """
+    path = os.path.join(store_dir, f"code_departement={departement}")
+    if annee is not None:
+        path = os.path.join(path, f"annee={int(annee)}")
+    return path
+
+
+def write_partitions(df, store_dir, part_name):
+    """
+    Écrit un DataFrame normalisé dans les partitions (département, année) correspondantes.
+
+    Chaque partition reçoit un fichier « <part_name>.parquet » : réécrire la même
+    source remplace ses fichiers au lieu de dupliquer les lignes.
+
+    Returns:
+        dict: {(departement, annee): nombre_de_lignes}
+    """
+    written = {}
+    df = df.dropna(subset=PARTITION_COLUMNS)
+    for (departement, annee), part in df.groupby(PARTITION_COLUMNS, observed=True, sort=False):
+        directory = partition_path(store_dir, departement, annee)
+        os.makedirs(directory, exist_ok=True)
+        part = part.drop(columns=PARTITION_COLUMNS).reset_index(drop=True)
+        pq.write_table(to_arrow(part), os.path.join(directory, f"{part_name}.parquet"))
+        written[(departement, int(annee))] = len(part)
+    return written
+
+
+def source_part_name(path):
+    """
+    Nom de fichier de partition dérivé du nom de la source (ex : « ValeursFoncieres-2023 »).
+    """
+    return re.sub(r"[^\w\-]", "_", os.path.splitext(os.path.basename(_strip_compression(path)))[0])
+
+
+def ingest_file(path, store_dir=DEFAULT_STORE, departement=None):
+    """
+    Convertit un export DVF CSV/TXT en partitions Parquet compactes.
+
+    Args:
+        path (str): Fichier source.
+        store_dir (str): Racine du stockage.
+        departement (str, optional): Code département si la source n'en contient pas
+            (ex : anciens fichiers « DVF_75.csv »).
+
+    Returns:
+        dict: {(departement, annee): nombre_de_lignes}
+    """
+    df = normalize_dvf(read_source(path), departement=departement)
+    written = write_partitions(df, store_dir, source_part_name(path))
+    mutations = build_mutations(df)[0]
+    aggregates = AggregateAccumulator()
+    aggregates.add(mutations)
+    aggregates.write(store_dir, source_part_name(path))
+    addresses = AddressAccumulator()
+    addresses.add(mutations)
+    addresses.write(store_dir, source_part_name(path))
+    return written
+
+
+def available_departements(store_dir=DEFAULT_STORE):
+    """
+    Liste les départements présents dans le stockage (lecture des noms de répertoires).
+    """
+    if not os.path.isdir(store_dir):
+        return []
+    return sorted(
+        name.split("=", 1)[1] for name in os.listdir(store_dir) if name.startswith("code_departement=")
+    )
+
+
+def available_years(store_dir, departement):
+    """
+    Liste les années disponibles pour un département, sans lire aucune donnée.
+    """
+    directory = partition_path(store_dir, departement)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        (int(name.split("=", 1)[1]) for name in os.listdir(directory) if name.startswith("annee=")),
+        reverse=True,
+    )
+
+
+def load_partition(store_dir, departement, annees=None, columns=None):
+    """
+    Charge uniquement les partitions et colonnes demandées.
+
+    Args:
+        store_dir (str): Racine du stockage.
+        departement (str): Code département.
+        annees (list[int], optional): Années à charger (toutes par défaut).
+        columns (list[str], optional): Colonnes à lire (toutes par défaut).
+
+    Returns:
+        DataFrame: données de la partition, avec la colonne « annee ».
+    """
+    years = available_years(store_dir, departement) if annees is None else [int(a) for a in annees]
+    frames = []
+    for annee in years:
+        directory = partition_path(store_dir, departement, annee)
+        if not os.path.isdir(directory):
+            continue
+        files = sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.endswith(".parquet"))
+        for file in files:
+            # Une source brute n'a pas toutes les colonnes (id_mutation, coordonnées) : on lit celles présentes
+            read_columns = None
+            if columns is not None:
+                present = set(pq.read_schema(file).names)
+                read_columns = [c for c in columns if c != "annee" and c in present]
+            frame = pq.read_table(file, columns=read_columns).to_pandas()
+            frame["annee"] = np.int16(annee)
+            frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    # La concaténation de catégories différentes repasse en objet : on rétablit le type
+    df = pd.concat(frames, ignore_index=True)
+    for column, dtype in STORE_DTYPES.items():
+        if column in df.columns and df[column].dtype != dtype:
+            df[column] = df[column].astype(dtype)
+    ordered = [c for c in list(STORE_DTYPES) + ["annee"] if c in df.columns]
+    return df[ordered]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Conversion des exports DVF en stockage Parquet partitionné.")
+    parser.add_argument("sources", nargs="+", help="Fichiers DVF (.csv géolocalisé ou .txt brut)")
+    parser.add_argument("--store", default=DEFAULT_STORE, help="Répertoire du stockage")
+    parser.add_argument("--departement", default=None, help="Code département si absent de la source")
+    args = parser.parse_args(argv)
+
+    results = []
+    for source in args.sources:
+        written = ingest_file(source, args.store, departement=args.departement)
+        results.append(written)
+        print(f"{source} : {sum(written.values())} lignes, {len(written)} partitions")
+    build_summary(args.store)
+    build_address_index(args.store)
+    # Import local : tools/dvf_mapped.py lit le stockage avec les fonctions de ce module
+    from tools.dvf_mapped import build_mapped
+    build_mapped(args.store, sorted({departement for written in results for departement, _ in written}))
+
+
+if __name__ == "__main__":
+    main()
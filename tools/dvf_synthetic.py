@@ -0,0 +1,239 @@
+# tools/dvf_synthetic.py
+#
+# Générateur de données DVF synthétiques, au format géolocalisé (mêmes colonnes que
+# l'extrait de « test DVF/app_map.py » et que full.csv), pour les mesures de performance
+# et les essais sans fichier DVF réel :
+#   python -m tools.dvf_synthetic data/synthetic/full_1M.csv --rows 1000000
+#
+# Les données sont plausibles sans être réalistes : ventes de plusieurs lots (lignes
+# contiguës d'une même id_mutation, même valeur foncière), prix au m² propre à chaque
+# département, coordonnées regroupées autour des codes postaux. Le générateur est
+# déterministe pour une graine donnée, et produit les gros volumes par blocs.
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Colonnes du format géolocalisé, dans l'ordre du fichier
+SYNTHETIC_COLUMNS = [
+    "id_mutation", "date_mutation", "numero_disposition", "nature_mutation", "valeur_fonciere",
+    "adresse_numero", "adresse_suffixe", "adresse_nom_voie", "adresse_code_voie", "code_postal",
+    "code_commune", "nom_commune", "code_departement", "code_type_local", "type_local",
+    "surface_reelle_bati", "nombre_pieces_principales", "code_nature_culture", "nature_culture",
+    "code_nature_culture_speciale", "nature_culture_speciale", "surface_terrain", "longitude", "latitude",
+]
+
+# Département -> (latitude, longitude du centre, prix moyen au m²)
+DEPARTEMENTS = {
+    "75": (48.8566, 2.3522, 10500.0),
+    "13": (43.2965, 5.3698, 3600.0),
+    "33": (44.8378, -0.5792, 4500.0),
+    "69": (45.7640, 4.8357, 5000.0),
+    "59": (50.6292, 3.0573, 3300.0),
+}
+DEFAULT_YEARS = (2019, 2020, 2021, 2022, 2023, 2024)
+POSTAL_CODES_PER_DEPARTEMENT = 20
+
+# Types de local : (code, libellé, probabilité, surface médiane en m²)
+_LOCAL_TYPES = [
+    (2, "Appartement", 0.45, 55.0),
+    (1, "Maison", 0.20, 100.0),
+    (3, "Dépendance", 0.15, 12.0),
+    (4, "Local industriel. commercial ou assimilé", 0.05, 150.0),
+    (0, None, 0.15, 0.0),
+]
+_CULTURES = [("S", "sols"), ("J", "jardins"), ("T", "terres"), ("P", "prés"), ("AB", "terrains a bâtir")]
+_STREET_TYPES = ["RUE", "AV", "BD", "PL", "CHE", "IMP", "ALL", "QUAI"]
+_STREET_WORDS = [
+    "DE LA REPUBLIQUE", "VICTOR HUGO", "JEAN JAURES", "DU GENERAL DE GAULLE", "PASTEUR", "DES LILAS",
+    "DE LA GARE", "DU MOULIN", "DES ECOLES", "DE L EGLISE", "GAMBETTA", "DE LA PAIX", "DU CHATEAU",
+    "DES ROSIERS", "DE PARIS", "DU STADE", "DES TILLEULS", "DU MARCHE", "NATIONALE", "DE LA LIBERTE",
+]
+# Nombre moyen de lignes par mutation
+MEAN_ROWS_PER_MUTATION = 1.6
+
+
+def _street_names():
+    return np.array([f"{t} {w}" for t in _STREET_TYPES for w in _STREET_WORDS], dtype=object)
+
+
+def _postal_codes(departement):
+    if departement == "75":
+        return [f"750{i:02d}" for i in range(1, POSTAL_CODES_PER_DEPARTEMENT + 1)]
+    return [f"{departement}{i * 10:03d}" for i in range(POSTAL_CODES_PER_DEPARTEMENT)]
+
+
+def _generate_chunk(rng, n_rows, first_mutation, departements, years):
+    """
+    Génère n_rows lignes, numérotées à partir de la mutation first_mutation.
+
+    Returns:
+        tuple: (DataFrame, numéro de la prochaine mutation)
+    """
+    # Nombre de lignes de chaque mutation (au moins une), tronqué à n_rows au total
+    n_mutations = int(n_rows / MEAN_ROWS_PER_MUTATION) + 16
+    rows_per_mutation = rng.geometric(1 / MEAN_ROWS_PER_MUTATION, n_mutations)
+    while rows_per_mutation.sum() < n_rows:
+        rows_per_mutation = np.concatenate([rows_per_mutation, rng.geometric(1 / MEAN_ROWS_PER_MUTATION, n_mutations)])
+    ends = np.cumsum(rows_per_mutation)
+    n_mutations = int(np.searchsorted(ends, n_rows)) + 1
+    rows_per_mutation = rows_per_mutation[:n_mutations]
+    rows_per_mutation[-1] -= ends[n_mutations - 1] - n_rows
+    mutation = np.repeat(np.arange(n_mutations), rows_per_mutation)
+
+    # Attributs de la mutation (répétés sur ses lignes)
+    departements = list(departements)
+    dep_index = rng.integers(0, len(departements), n_mutations)
+    postal_index = rng.integers(0, POSTAL_CODES_PER_DEPARTEMENT, n_mutations)
+    year = np.asarray(years)[rng.integers(0, len(years), n_mutations)]
+    day = rng.integers(0, 365, n_mutations)
+    dates = pd.to_datetime(pd.Series(year).astype(str) + "-01-01") + pd.to_timedelta(day, unit="D")
+    sequence = first_mutation + np.arange(n_mutations)
+
+    # Tables département × code postal, indexées plutôt que construites ligne à ligne
+    postal_table = np.array([_postal_codes(dep) for dep in departements], dtype=object)
+    commune_table = np.array([
+        [f"751{p + 1:02d}" if dep == "75" else f"{dep}{p:03d}" for p in range(POSTAL_CODES_PER_DEPARTEMENT)]
+        for dep in departements
+    ], dtype=object)
+    postal = postal_table[dep_index, postal_index]
+    commune = commune_table[dep_index, postal_index]
+    centers = np.array([DEPARTEMENTS.get(dep, (46.6, 2.4, 3000.0)) for dep in departements])
+    # Centre de chaque code postal : décalage fixe (déterministe) autour du centre du département
+    offsets = np.stack([np.sin(np.arange(POSTAL_CODES_PER_DEPARTEMENT) * 2.4) * 0.04,
+                        np.cos(np.arange(POSTAL_CODES_PER_DEPARTEMENT) * 2.4) * 0.06], axis=1)
+    latitude = centers[dep_index, 0] + offsets[postal_index, 0] + rng.normal(0, 0.008, n_mutations)
+    longitude = centers[dep_index, 1] + offsets[postal_index, 1] + rng.normal(0, 0.012, n_mutations)
+    price_m2 = centers[dep_index, 2] * rng.lognormal(0, 0.3, n_mutations)
+
+    streets = _street_names()
+    street_index = rng.integers(0, len(streets), n_mutations)
+    street_number = rng.integers(1, 200, n_mutations)
+
+    # Attributs de chaque lot (ligne)
+    kinds = rng.choice(len(_LOCAL_TYPES), n_rows, p=[t[2] for t in _LOCAL_TYPES])
+    type_code = np.array([t[0] for t in _LOCAL_TYPES])[kinds]
+    type_label = np.array([t[1] for t in _LOCAL_TYPES], dtype=object)[kinds]
+    median_surface = np.array([t[3] for t in _LOCAL_TYPES])[kinds]
+    surface = np.where(median_surface > 0, np.round(median_surface * rng.lognormal(0, 0.35, n_rows)), np.nan)
+    rooms = np.where(np.isin(type_code, (1, 2)), np.maximum(1, np.round(surface / 22)),
+                     np.where(type_code > 0, 0, np.nan))
+    with_land = (type_code == 1) | (type_code == 0)
+    culture = rng.integers(0, len(_CULTURES), n_rows)
+    land = np.where(with_land, np.round(rng.lognormal(6.2, 0.8, n_rows)), np.nan)
+
+    # Valeur foncière identique sur toutes les lignes d'une mutation
+    built = np.bincount(mutation, weights=np.nan_to_num(surface) * (type_code != 3), minlength=n_mutations)
+    land_total = np.bincount(mutation, weights=np.nan_to_num(land), minlength=n_mutations)
+    value = np.round(np.where(built > 0, built * price_m2, land_total * price_m2 / 60 + 1000), -2)
+
+    dep_codes = np.array(departements, dtype=object)[dep_index]
+
+    df = pd.DataFrame({
+        "id_mutation": np.char.add(np.char.add(year.astype(str), "-"), sequence.astype(str)).astype(object)[mutation],
+        "date_mutation": dates.dt.strftime("%Y-%m-%d").to_numpy()[mutation],
+        "numero_disposition": 1,
+        "nature_mutation": "Vente",
+        "valeur_fonciere": value[mutation],
+        "adresse_numero": street_number[mutation].astype(float),
+        "adresse_suffixe": np.nan,
+        "adresse_nom_voie": streets[street_index][mutation],
+        "adresse_code_voie": np.array([f"{i * 7 % 9999:04d}" for i in range(len(streets))], dtype=object)[street_index][mutation],
+        "code_postal": postal[mutation],
+        "code_commune": commune[mutation],
+        "nom_commune": ("COMMUNE " + commune_table)[dep_index, postal_index][mutation],
+        "code_departement": dep_codes[mutation],
+        "code_type_local": np.where(type_code > 0, type_code, np.nan),
+        "type_local": type_label,
+        "surface_reelle_bati": surface,
+        "nombre_pieces_principales": rooms,
+        "code_nature_culture": np.where(with_land, np.array([c[0] for c in _CULTURES], dtype=object)[culture], None),
+        "nature_culture": np.where(with_land, np.array([c[1] for c in _CULTURES], dtype=object)[culture], None),
+        "code_nature_culture_speciale": None,
+        "nature_culture_speciale": None,
+        "surface_terrain": land,
+        "longitude": np.round(longitude[mutation], 6),
+        "latitude": np.round(latitude[mutation], 6),
+    })
+    return df[SYNTHETIC_COLUMNS], first_mutation + n_mutations
+
+
+def iter_synthetic_dvf(n_rows, chunksize=1_000_000, seed=0, departements=tuple(DEPARTEMENTS), years=DEFAULT_YEARS):
+    """
+    Génère n_rows lignes DVF synthétiques par blocs de chunksize lignes.
+    """
+    rng = np.random.default_rng(seed)
+    next_mutation = 1
+    for start in range(0, n_rows, chunksize):
+        chunk, next_mutation = _generate_chunk(rng, min(chunksize, n_rows - start), next_mutation, departements, years)
+        yield chunk
+
+
+def generate_dvf(n_rows, seed=0, departements=tuple(DEPARTEMENTS), years=DEFAULT_YEARS):
+    """
+    Génère un DataFrame de n_rows lignes DVF synthétiques (valeurs brutes, comme lues
+    dans full.csv avant normalisation).
+    """
+    return pd.concat(list(iter_synthetic_dvf(n_rows, seed=seed, departements=departements, years=years)),
+                     ignore_index=True)
+
+
+def write_synthetic_csv(path, n_rows, sep=",", chunksize=1_000_000, seed=0, departements=tuple(DEPARTEMENTS),
+                        years=DEFAULT_YEARS):
+    """
+    Écrit n_rows lignes synthétiques dans un fichier CSV, bloc par bloc (mémoire bornée).
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for i, chunk in enumerate(iter_synthetic_dvf(n_rows, chunksize, seed, departements, years)):
+            chunk.to_csv(f, sep=sep, index=False, header=i == 0)
+    return path
+
+
+def write_release_pair(old_path, new_path, n_rows, seed=0, cutoff="2024-07-01", removed=0.01, changed=0.03):
+    """
+    Écrit deux publications successives d'un même jeu synthétique, pour vérifier la mise à
+    jour incrémentale (tools/dvf_update.py) : l'ancienne s'arrête avant `cutoff` ; la
+    nouvelle ajoute le semestre suivant, retire une part `removed` des anciennes mutations
+    et en corrige une part `changed` (valeur foncière, ou nombre de pièces des lots).
+
+    Returns:
+        tuple: (old_path, new_path)
+    """
+    rng = np.random.default_rng(seed + 1)
+    new = generate_dvf(n_rows, seed=seed)
+    old = new[new["date_mutation"] < cutoff]
+    ids = old["id_mutation"].unique()
+    picked = rng.permutation(ids)
+    n_removed, n_changed = int(len(ids) * removed), int(len(ids) * changed)
+    gone, corrected = picked[:n_removed], picked[n_removed:n_removed + n_changed]
+    new = new[~new["id_mutation"].isin(gone)].copy()
+    revalued = new["id_mutation"].isin(corrected[: n_changed // 2])
+    new.loc[revalued, "valeur_fonciere"] = np.round(new.loc[revalued, "valeur_fonciere"] * 1.05, -2)
+    recounted = new["id_mutation"].isin(corrected[n_changed // 2:]) & new["nombre_pieces_principales"].notna()
+    new.loc[recounted, "nombre_pieces_principales"] += 1
+    for path, frame in ((old_path, old), (new_path, new)):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        frame.to_csv(path, index=False)
+    return old_path, new_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génère un fichier DVF synthétique (format géolocalisé).")
+    parser.add_argument("path", help="Fichier CSV à écrire")
+    parser.add_argument("--rows", type=int, default=100_000, help="Nombre de lignes")
+    parser.add_argument("--sep", default=",", help="Séparateur (',' comme full.csv, '|' comme data/DVF_XX.csv)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_synthetic_csv(args.path, args.rows, sep=args.sep, seed=args.seed)
+    print(f"{args.rows} lignes écrites dans {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+# tools/dvf_valuation.py
+#
+# Estimation d'un bien par comparables : les k ventes récentes les plus semblables
+# (proximité, surface, nombre de pièces, ancienneté de la vente) et la fourchette de prix
+# au m² qui s'en déduit.
+#
+# Seules les ventes d'un local unique (« Vente », surface et prix renseignés) servent de
+# comparables : leur prix au m² est celui du local. Un index spatial en grille par type
+# de local (tools/spatial_index.py) limite la recherche aux ventes proches : le rayon
+# part de INITIAL_RADIUS et double jusqu'à réunir assez de candidats, puis tous les
+# candidats sont notés en une opération vectorisée. Le coût d'une estimation dépend du
+# nombre de ventes autour du point, pas de la taille des données (nationales comprises).
+#
+# Note d'un comparable (plus elle est basse, plus la vente est semblable) :
+#   sqrt((distance / DISTANCE_SCALE)² + (ln(surface / surface du bien) / SURFACE_SCALE)²
+#        + ((pièces - pièces du bien) / ROOMS_SCALE)² + (ancienneté / AGE_SCALE)²)
+# La fourchette est formée des quantiles (25 %, 50 %, 75 %) des prix au m² des k
+# comparables, pondérés par 1 / (1 + note).
+
+import numpy as np
+import pandas as pd
+
+from tools.dvf_mutations import build_mutations
+from tools.dvf_store import DEFAULT_STORE, available_departements, available_years, load_partition
+from tools.spatial_index import GridIndex, haversine_meters, local_earth_radius
+
+DEFAULT_K = 10
+# Ancienneté maximale des comparables, en années avant la vente la plus récente
+DEFAULT_MAX_AGE_YEARS = 5
+INITIAL_RADIUS = 300
+MAX_RADIUS = 20_000
+# Candidats à réunir (en multiple de k) avant de noter
+CANDIDATES_PER_NEIGHBOR = 5
+MIN_CANDIDATES = 50
+# Biens notés ensemble au plus (taille de la matrice biens × candidats)
+PORTFOLIO_BATCH = 256
+
+DISTANCE_SCALE = 500.0
+SURFACE_SCALE = 0.25
+ROOMS_SCALE = 1.0
+AGE_SCALE = 730.0
+# Écart de pièces supposé quand le nombre de pièces d'un comparable est inconnu
+MISSING_ROOMS_PENALTY = 1.0
+
+# Prix au m² plausibles (exclut ventes symboliques et erreurs de saisie)
+MIN_PRICE_M2 = 300
+MAX_PRICE_M2 = 50_000
+QUANTILES = (0.25, 0.5, 0.75)
+
+STORE_COLUMNS = [
+    "id_mutation", "date_mutation", "nature_mutation", "valeur_fonciere", "adresse_numero", "adresse_suffixe",
+    "adresse_nom_voie", "code_postal", "code_commune", "nom_commune", "type_local", "surface_reelle_bati",
+    "nombre_pieces_principales", "longitude", "latitude",
+]
+# Colonnes sans lesquelles aucune vente ne peut servir de comparable (fichiers bruts non
+# géocodés : pas de coordonnées)
+REQUIRED_COLUMNS = [
+    "date_mutation", "nature_mutation", "valeur_fonciere", "type_local", "surface_reelle_bati", "nb_locaux",
+    "latitude", "longitude",
+]
+COMPARABLE_COLUMNS = [
+    "id_mutation", "date_mutation", "valeur_fonciere", "adresse_numero", "adresse_nom_voie", "code_postal",
+    "nom_commune", "type_local", "surface_reelle_bati", "nombre_pieces_principales", "latitude", "longitude",
+]
+
+
+def comparable_sales(mutations):
+    """
+    Ventes utilisables comme comparables, avec leur prix au m².
+
+    Args:
+        mutations (DataFrame): une ligne par vente (voir tools/dvf_mutations.build_mutations).
+
+    Returns:
+        DataFrame: ventes d'un local unique, géolocalisées, au prix au m² plausible,
+        avec la colonne prix_m2 (vide si les mutations n'ont pas les colonnes nécessaires).
+    """
+    if mutations.empty or not set(REQUIRED_COLUMNS) <= set(mutations.columns):
+        return pd.DataFrame(columns=COMPARABLE_COLUMNS + ["prix_m2"])
+    surface = pd.to_numeric(mutations["surface_reelle_bati"], errors="coerce").astype(float)
+    keep = (
+        (mutations["nature_mutation"] == "Vente").fillna(False).to_numpy()
+        & (mutations["nb_locaux"] == 1).to_numpy()
+        & mutations["type_local"].notna().to_numpy()
+        & mutations["latitude"].notna().to_numpy()
+        & mutations["longitude"].notna().to_numpy()
+        & (surface > 0).fillna(False).to_numpy()
+    )
+    sales = mutations.loc[keep, [c for c in COMPARABLE_COLUMNS if c in mutations.columns]].copy()
+    sales["prix_m2"] = sales["valeur_fonciere"].astype(float) / surface[keep]
+    return sales[sales["prix_m2"].between(MIN_PRICE_M2, MAX_PRICE_M2)].reset_index(drop=True)
+
+
+def recent_sales(sales, max_age_years=DEFAULT_MAX_AGE_YEARS):
+    """
+    Ventes de moins de max_age_years ans avant la vente la plus récente.
+    """
+    if max_age_years is None or sales.empty:
+        return sales
+    oldest = sales["date_mutation"].max() - pd.DateOffset(years=max_age_years)
+    return sales[sales["date_mutation"] >= oldest].reset_index(drop=True)
+
+
+def weighted_quantiles(values, weights, quantiles=QUANTILES):
+    """
+    Quantiles pondérés (interpolation sur les poids cumulés, centrés sur chaque valeur).
+    """
+    order = np.argsort(values)
+    values = np.asarray(values, dtype=float)[order]
+    weights = np.asarray(weights, dtype=float)[order]
+    cumulative = (np.cumsum(weights) - weights / 2) / weights.sum()
+    return np.interp(quantiles, cumulative, values)
+
+
+class ComparablesIndex:
+    """
+    Index des ventes comparables : recherche des k ventes les plus semblables à un bien.
+
+    Args:
+        sales (DataFrame): ventes comparables (voir comparable_sales et recent_sales).
+        cell_size_deg (float): Taille des cellules de l'index spatial.
+    """
+
+    def __init__(self, sales, cell_size_deg=0.005):
+        self.sales = sales
+        self.cell_size_deg = cell_size_deg
+        self.reference_date = sales["date_mutation"].max() if not sales.empty else pd.NaT
+        self._surface = sales["surface_reelle_bati"].to_numpy(dtype=float) if not sales.empty else np.empty(0)
+        self._log_surface = np.log(self._surface)
+        self._latitudes = sales["latitude"].to_numpy(dtype=float)
+        self._longitudes = sales["longitude"].to_numpy(dtype=float)
+        self._price_m2 = sales["prix_m2"].to_numpy(dtype=float)
+        self._rooms = sales["nombre_pieces_principales"].to_numpy(dtype=float, na_value=np.nan)
+        self._age_days = ((self.reference_date - sales["date_mutation"]).dt.days.to_numpy(dtype=float)
+                          if not sales.empty else np.empty(0))
+
+        # Un index spatial par type de local : les candidats sont toujours du bon type
+        self._by_type = {}
+        types = sales["type_local"].astype("string")
+        for type_local in types.dropna().unique():
+            positions = np.flatnonzero((types == type_local).to_numpy())
+            grid = GridIndex(sales["latitude"].to_numpy()[positions], sales["longitude"].to_numpy()[positions],
+                             cell_size_deg)
+            self._by_type[type_local] = (grid, positions)
+
+    def __len__(self):
+        return len(self.sales)
+
+    @property
+    def types(self):
+        return sorted(self._by_type)
+
+    @classmethod
+    def from_mutations(cls, mutations, max_age_years=DEFAULT_MAX_AGE_YEARS, **kwargs):
+        """
+        Index des ventes comparables d'une table de mutations.
+
+        Args:
+            max_age_years (int, optional): Ancienneté maximale des comparables (toutes si None).
+        """
+        return cls(recent_sales(comparable_sales(mutations), max_age_years), **kwargs)
+
+    @classmethod
+    def from_store(cls, store_dir=DEFAULT_STORE, departements=None, max_age_years=DEFAULT_MAX_AGE_YEARS, **kwargs):
+        """
+        Index construit à partir du stockage Parquet, un département à la fois (seules les
+        années récentes et les colonnes utiles sont lues).
+        """
+        frames = []
+        for departement in departements or available_departements(store_dir):
+            years = available_years(store_dir, departement)
+            if max_age_years is not None and years:
+                years = [y for y in years if y >= max(years) - max_age_years]
+            mutations = build_mutations(load_partition(store_dir, departement, years, STORE_COLUMNS))[0]
+            frames.append(comparable_sales(mutations))
+        if not frames:
+            return cls(pd.DataFrame(columns=COMPARABLE_COLUMNS + ["prix_m2"]), **kwargs)
+        return cls(recent_sales(pd.concat(frames, ignore_index=True), max_age_years), **kwargs)
+
+    def _candidates(self, grid, lat, lon, k, max_radius):
+        wanted = max(MIN_CANDIDATES, CANDIDATES_PER_NEIGHBOR * k)
+        radius = INITIAL_RADIUS
+        while True:
+            slots, distances = grid.query_radius(lat, lon, radius, return_distance=True)
+            if len(slots) >= wanted or radius >= max_radius:
+                return slots, distances, radius
+            radius = min(max_radius, radius * 2)
+
+    def scores(self, positions, distances, surface, pieces=None):
+        """
+        Note de chaque candidat (positions dans self.sales) pour un bien donné.
+        """
+        terms = (distances / DISTANCE_SCALE) ** 2
+        terms += ((self._log_surface[positions] - np.log(surface)) / SURFACE_SCALE) ** 2
+        if pieces is not None and not pd.isna(pieces):
+            rooms = (self._rooms[positions] - pieces) / ROOMS_SCALE
+            terms += np.where(np.isnan(rooms), MISSING_ROOMS_PENALTY, rooms) ** 2
+        terms += (self._age_days[positions] / AGE_SCALE) ** 2
+        return np.sqrt(terms)
+
+    def nearest(self, lat, lon, type_local, surface, pieces=None, k=DEFAULT_K, max_radius=MAX_RADIUS):
+        """
+        Les k ventes les plus semblables à un bien.
+
+        Args:
+            lat (float): Latitude du bien.
+            lon (float): Longitude du bien.
+            type_local (str): Type de local (« Appartement », « Maison »...).
+            surface (float): Surface bâtie en m².
+            pieces (int, optional): Nombre de pièces principales (ignoré si None).
+            k (int): Nombre de comparables.
+            max_radius (float): Rayon de recherche maximal, en mètres.
+
+        Returns:
+            tuple: (comparables, rayon) — comparables : lignes de self.sales triées par note,
+            avec distance_m, note et poids ; rayon : rayon de recherche atteint, en mètres.
+        """
+        if type_local not in self._by_type or not surface or surface <= 0:
+            return self.sales.iloc[:0].assign(distance_m=[], note=[], poids=[]), 0
+        grid, type_positions = self._by_type[type_local]
+        slots, distances, radius = self._candidates(grid, lat, lon, k, max_radius)
+        positions = type_positions[slots]
+        scores = self.scores(positions, distances, surface, pieces)
+        if len(scores) > k:
+            best = np.argpartition(scores, k - 1)[:k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.argsort(scores[best], kind="stable")]
+        comparables = self.sales.iloc[positions[best]].copy()
+        comparables["distance_m"] = distances[best].round(0)
+        comparables["note"] = scores[best]
+        comparables["poids"] = 1 / (1 + scores[best])
+        return comparables, radius
+
+    def estimate(self, lat, lon, type_local, surface, pieces=None, k=DEFAULT_K, max_radius=MAX_RADIUS):
+        """
+        Estimation d'un bien à partir de ses k comparables.
+
+        Returns:
+            tuple: (estimation, comparables) — estimation : dict avec prix_m2_bas,
+            prix_m2_median, prix_m2_haut, valeur_basse, valeur_estimee, valeur_haute
+            (None sans comparable), comparables et rayon_m.
+        """
+        comparables, radius = self.nearest(lat, lon, type_local, surface, pieces, k, max_radius)
+        estimation = {"comparables": len(comparables), "rayon_m": radius}
+        if comparables.empty:
+            estimation.update(dict.fromkeys(
+                ["prix_m2_bas", "prix_m2_median", "prix_m2_haut", "valeur_basse", "valeur_estimee", "valeur_haute"]
+            ))
+            return estimation, comparables
+        low, median, high = weighted_quantiles(comparables["prix_m2"], comparables["poids"])
+        estimation.update({
+            "prix_m2_bas": round(low),
+            "prix_m2_median": round(median),
+            "prix_m2_haut": round(high),
+            "valeur_basse": round(low * surface, -3),
+            "valeur_estimee": round(median * surface, -3),
+            "valeur_haute": round(high * surface, -3),
+        })
+        return estimation, comparables
+
+    def _radius_steps(self, max_radius):
+        """
+        Rayons successifs de la recherche (INITIAL_RADIUS, doublé jusqu'à max_radius).
+        """
+        steps = [INITIAL_RADIUS]
+        while steps[-1] < max_radius:
+            steps.append(min(max_radius, steps[-1] * 2))
+        return np.array(steps, dtype=float)
+
+    def _estimate_group(self, type_local, lat, lon, surface, pieces, k, max_radius):
+        """
+        Estime en une fois des biens d'un même type, proches les uns des autres.
+
+        Les candidats sont réunis une seule fois, autour du centre du groupe, dans un rayon
+        qui couvre le rayon de recherche de chaque bien. Chaque bien garde ensuite les
+        candidats de son propre rayon (le premier palier qui en contient assez, comme
+        nearest), et tous sont notés sur une matrice biens × candidats.
+
+        Returns:
+            tuple: (rayons, nombres de comparables, quantiles des prix au m² (biens × 3))
+        """
+        grid, type_positions = self._by_type[type_local]
+        wanted = max(MIN_CANDIDATES, CANDIDATES_PER_NEIGHBOR * k)
+        steps = self._radius_steps(max_radius)
+        center_lat, center_lon = lat.mean(), lon.mean()
+        # Écart maximal d'un bien au centre (marge de 1 % pour l'approximation sphérique)
+        spread = haversine_meters(center_lat, center_lon, lat, lon, radius=local_earth_radius(center_lat)).max() * 1.01
+        _, _, center_radius = self._candidates(grid, center_lat, center_lon, k, max_radius)
+        # Un bien à d du centre trouve assez de candidats avant center_radius + d
+        reach = steps[min(np.searchsorted(steps, center_radius + spread), len(steps) - 1)]
+        slots = grid.query_radius(center_lat, center_lon, (reach + spread) * 1.01)
+        positions = type_positions[slots]
+
+        distances = haversine_meters(
+            lat[:, None], lon[:, None], self._latitudes[positions][None, :], self._longitudes[positions][None, :],
+            radius=local_earth_radius(lat)[:, None],
+        )
+        if len(positions) >= wanted:
+            reached = np.partition(distances, wanted - 1, axis=1)[:, wanted - 1]
+        else:
+            reached = np.full(len(lat), np.inf)
+        radius = steps[np.minimum(np.searchsorted(steps, reached), len(steps) - 1)]
+
+        terms = (distances / DISTANCE_SCALE) ** 2
+        terms += ((self._log_surface[positions][None, :] - np.log(surface)[:, None]) / SURFACE_SCALE) ** 2
+        rooms = (self._rooms[positions][None, :] - pieces[:, None]) / ROOMS_SCALE
+        rooms = np.where(np.isnan(rooms), MISSING_ROOMS_PENALTY, rooms) ** 2
+        terms += np.where(np.isnan(pieces)[:, None], 0.0, rooms)
+        terms += (self._age_days[positions][None, :] / AGE_SCALE) ** 2
+        scores = np.where(distances <= radius[:, None], np.sqrt(terms), np.inf)
+
+        kept = min(k, len(positions))
+        if kept == 0:
+            return radius, np.zeros(len(lat), dtype=int), np.full((len(lat), len(QUANTILES)), np.nan)
+        best = np.argpartition(scores, kept - 1, axis=1)[:, :kept] if len(positions) > kept else (
+            np.broadcast_to(np.arange(kept), (len(lat), kept))
+        )
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        found = np.isfinite(best_scores)
+        prices = np.where(found, self._price_m2[positions][best], np.inf)
+        weights = np.where(found, 1 / (1 + best_scores), 0.0)
+        return radius, found.sum(axis=1), _row_weighted_quantiles(prices, weights, found.sum(axis=1))
+
+    def estimate_portfolio(self, portfolio, k=DEFAULT_K, max_radius=MAX_RADIUS):
+        """
+        Estime un portefeuille de biens, par groupes de biens du même type situés dans la
+        même cellule de la grille : les candidats d'un groupe sont réunis une fois et notés
+        ensemble (mêmes comparables et même fourchette que estimate, bien par bien).
+
+        Args:
+            portfolio (DataFrame): une ligne par bien, colonnes latitude, longitude,
+                type_local, surface et, facultativement, pieces.
+
+        Returns:
+            DataFrame: portfolio complété des colonnes de l'estimation (même index).
+
+        Raises:
+            ValueError: si une surface est manquante ou négative, ou des coordonnées manquantes.
+        """
+        lat = pd.to_numeric(portfolio["latitude"], errors="coerce").to_numpy(dtype=float)
+        lon = pd.to_numeric(portfolio["longitude"], errors="coerce").to_numpy(dtype=float)
+        surface = pd.to_numeric(portfolio["surface"], errors="coerce").to_numpy(dtype=float)
+        invalid = np.isnan(lat) | np.isnan(lon) | ~(surface > 0)
+        if invalid.any():
+            rows = ", ".join(str(i) for i in portfolio.index[invalid][:10])
+            raise ValueError(f"Surface manquante ou négative, ou coordonnées manquantes (lignes {rows})")
+        pieces = (pd.to_numeric(portfolio["pieces"], errors="coerce").to_numpy(dtype=float)
+                  if "pieces" in portfolio.columns else np.full(len(portfolio), np.nan))
+
+        n = len(portfolio)
+        radius = np.zeros(n)
+        counts = np.zeros(n, dtype=int)
+        prices = np.full((n, len(QUANTILES)), np.nan)
+        groups = pd.DataFrame({
+            "type_local": portfolio["type_local"].astype("string").to_numpy(),
+            "lat_cell": np.floor(lat / self.cell_size_deg),
+            "lon_cell": np.floor(lon / self.cell_size_deg),
+        }).groupby(["type_local", "lat_cell", "lon_cell"], sort=False).indices
+        for (type_local, _, _), members in groups.items():
+            if type_local not in self._by_type:
+                continue
+            for start in range(0, len(members), PORTFOLIO_BATCH):
+                batch = members[start:start + PORTFOLIO_BATCH]
+                radius[batch], counts[batch], prices[batch] = self._estimate_group(
+                    type_local, lat[batch], lon[batch], surface[batch], pieces[batch], k, max_radius
+                )
+
+        low, median, high = prices.T
+        estimations = pd.DataFrame({
+            "comparables": counts,
+            "rayon_m": radius.astype(int),
+            "prix_m2_bas": np.round(low),
+            "prix_m2_median": np.round(median),
+            "prix_m2_haut": np.round(high),
+            "valeur_basse": np.round(low * surface, -3),
+            "valeur_estimee": np.round(median * surface, -3),
+            "valeur_haute": np.round(high * surface, -3),
+        }, index=portfolio.index)
+        return portfolio.join(estimations)
+
+
+def _row_weighted_quantiles(values, weights, counts, quantiles=QUANTILES):
+    """
+    weighted_quantiles ligne par ligne, sur une matrice : chaque ligne a counts[i] valeurs
+    utiles, les autres (valeur infinie, poids nul) sont ignorées.
+
+    Returns:
+        ndarray: une ligne de quantiles par ligne de values (NaN sans valeur utile).
+    """
+    order = np.argsort(values, axis=1, kind="stable")
+    values = np.take_along_axis(values, order, axis=1)
+    weights = np.take_along_axis(weights, order, axis=1)
+    rows = np.arange(len(values))
+    totals = weights.sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cumulative = (np.cumsum(weights, axis=1) - weights / 2) / totals
+    useful = np.arange(values.shape[1])[None, :] < counts[:, None]
+    cumulative = np.where(useful, cumulative, np.inf)
+
+    result = np.full((len(values), len(quantiles)), np.nan)
+    last = np.maximum(counts - 1, 0)
+    for column, q in enumerate(quantiles):
+        # Comme np.interp : valeurs extrêmes hors des poids cumulés, interpolation entre
+        above = (cumulative < q).sum(axis=1)
+        upper = np.minimum(above, last)
+        lower = np.maximum(above - 1, 0)
+        c0, c1 = cumulative[rows, lower], cumulative[rows, upper]
+        v0, v1 = values[rows, lower], values[rows, upper]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            interpolated = v0 + (q - c0) / (c1 - c0) * (v1 - v0)
+        result[:, column] = np.where(above == 0, values[:, 0], np.where(above >= counts, values[rows, last],
+                                                                        interpolated))
+    result[counts == 0] = np.nan
+    return result
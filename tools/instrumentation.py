@@ -0,0 +1,322 @@
+# tools/instrumentation.py
+#
+# Mesure des étapes coûteuses de l'application (chargement DVF, simulation, figures,
+# récupération des taux, filtrage de la carte).
+#
+# Chaque étape, mesurée par le décorateur `timed` ou le gestionnaire de contexte `stage`,
+# produit un enregistrement : durée, nombre de lignes traitées et variation de la mémoire
+# résidente du processus. Les enregistrements sont :
+#   - conservés pour l'exécution en cours du script Streamlit (begin_run / current_run),
+#     et affichés dans un panneau de la barre latérale réservé aux développeurs
+#     (variable d'environnement SIMIMMO_DEV=1 ou paramètre d'URL ?dev=1) ;
+#   - écrits en JSON, une ligne par étape, dans un journal (logs/perf.jsonl), agrégeable
+#     hors ligne :
+#       python -m tools.instrumentation logs/perf.jsonl
+#
+# Le journal n'est écrit que par l'application Streamlit (dès qu'une page appelle
+# begin_run) ou en mode développeur, pas par les outils en ligne de commande ni les
+# tests. SIMIMMO_PERF_LOG choisit un autre fichier (vide : aucun journal). Plusieurs
+# processus l'écrivent (sessions Streamlit, ingestion en parallèle) : chaque ligne y est
+# ajoutée par un seul appel système en mode O_APPEND, sans rotation, qui ne serait pas
+# sûre entre processus ; sa taille se gère de l'extérieur (logrotate, copytruncate).
+#
+# La variation de mémoire est celle du processus entier : avec plusieurs sessions
+# simultanées, elle n'est qu'indicative.
+
+import argparse
+import functools
+import glob
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+DEFAULT_LOG = os.path.join("logs", "perf.jsonl")
+LOG_ENV = "SIMIMMO_PERF_LOG"
+# Nombre d'enregistrements récents gardés en mémoire (toutes sessions confondues)
+DEFAULT_HISTORY = 1000
+DEV_ENV = "SIMIMMO_DEV"
+
+try:
+    import psutil
+    _PROCESS = psutil.Process()
+except ImportError:
+    _PROCESS = None
+
+
+def rss_bytes():
+    """
+    Mémoire résidente du processus en octets (None si elle n'est pas mesurable).
+    """
+    if _PROCESS is not None:
+        return _PROCESS.memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def count_rows(result):
+    """
+    Nombre de lignes d'un résultat : DataFrame, tableau, ou premier DataFrame d'un tuple.
+    """
+    if isinstance(result, tuple):
+        for item in result:
+            if isinstance(item, (pd.DataFrame, pd.Series)):
+                return len(item)
+        return None
+    if isinstance(result, (pd.DataFrame, pd.Series)) or hasattr(result, "shape"):
+        return len(result)
+    return None
+
+
+class StageRecord:
+    """
+    Mesure d'une étape. `rows` peut être renseigné dans le bloc `with stage(...)`.
+    """
+
+    __slots__ = ("stage", "started_at", "seconds", "rows", "memory_delta", "error", "thread")
+
+    def __init__(self, stage, rows=None):
+        self.stage = stage
+        self.started_at = time.time()
+        self.seconds = None
+        self.rows = rows
+        self.memory_delta = None
+        self.error = None
+        self.thread = threading.current_thread().name
+
+    def as_dict(self):
+        return {
+            "stage": self.stage,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(timespec="milliseconds"),
+            "seconds": self.seconds,
+            "rows": self.rows,
+            "memory_delta": self.memory_delta,
+            "error": self.error,
+            "thread": self.thread,
+        }
+
+
+class PerfRecorder:
+    """
+    Collecte les mesures d'étapes : exécution en cours (par thread), historique récent
+    et journal JSON.
+
+    Args:
+        log_path (str, optional): Journal des mesures (None : pas de journal).
+        write_log (bool): Écrit le journal dès le départ ; sinon seulement après enable_log().
+        history (int): Nombre d'enregistrements récents gardés en mémoire.
+    """
+
+    def __init__(self, log_path=DEFAULT_LOG, write_log=True, history=DEFAULT_HISTORY):
+        self.log_path = log_path
+        self.write_log = write_log
+        self.recent = deque(maxlen=history)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._fd = None
+
+    def enable_log(self):
+        self.write_log = True
+
+    def _append(self, line):
+        # Ouvert au premier enregistrement : importer le module n'écrit rien sur le disque.
+        # O_APPEND : chaque os.write ajoute la ligne entière en fin de fichier, même si
+        # d'autres processus écrivent le même journal (descripteur hérité au fork compris)
+        if self._fd is None:
+            with self._lock:
+                if self._fd is None:
+                    directory = os.path.dirname(self.log_path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                    self._fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        os.write(self._fd, (line + "\n").encode("utf-8"))
+
+    def begin_run(self):
+        """
+        Démarre une nouvelle exécution du script pour le thread courant (à appeler en tête de page).
+        """
+        self._local.records = []
+
+    def current_run(self):
+        """
+        Mesures de l'exécution en cours du thread courant.
+        """
+        return list(getattr(self._local, "records", []))
+
+    def record(self, record):
+        run = getattr(self._local, "records", None)
+        if run is not None:
+            run.append(record)
+        with self._lock:
+            self.recent.append(record)
+        if self.write_log and self.log_path:
+            try:
+                self._append(json.dumps(record.as_dict(), ensure_ascii=False))
+            except Exception:
+                pass
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """
+        Mesure le bloc `with` ; l'enregistrement est renvoyé pour pouvoir y indiquer `rows`.
+        """
+        record = StageRecord(name, rows)
+        memory_before = rss_bytes()
+        started = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record.error = type(e).__name__
+            raise
+        finally:
+            record.seconds = time.perf_counter() - started
+            memory_after = rss_bytes()
+            if memory_before is not None and memory_after is not None:
+                record.memory_delta = memory_after - memory_before
+            self.record(record)
+
+    def timed(self, name=None, rows=count_rows):
+        """
+        Décorateur mesurant chaque appel de la fonction.
+
+        Args:
+            name (str, optional): Nom de l'étape (nom qualifié de la fonction par défaut).
+            rows (callable, optional): Calcule le nombre de lignes à partir du résultat.
+        """
+        def decorator(func):
+            stage_name = name or f"{func.__module__}.{func.__qualname__}"
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(stage_name) as record:
+                    result = func(*args, **kwargs)
+                    if rows is not None:
+                        record.rows = rows(result)
+                    return result
+            return wrapper
+        return decorator
+
+    def recent_frame(self):
+        with self._lock:
+            return records_frame(list(self.recent))
+
+
+def records_frame(records):
+    """
+    DataFrame des mesures (une ligne par étape).
+    """
+    columns = ["stage", "started_at", "seconds", "rows", "memory_delta", "error", "thread"]
+    return pd.DataFrame([r.as_dict() for r in records], columns=columns)
+
+
+# Collecteur partagé par tout le processus : le journal est écrit d'emblée si un fichier
+# est choisi (SIMIMMO_PERF_LOG) ou en mode développeur, sinon à la première page affichée
+RECORDER = PerfRecorder(
+    os.environ.get(LOG_ENV, DEFAULT_LOG) or None,
+    write_log=bool(os.environ.get(LOG_ENV)) or os.environ.get(DEV_ENV) == "1",
+)
+stage = RECORDER.stage
+timed = RECORDER.timed
+current_run = RECORDER.current_run
+
+
+def begin_run():
+    """
+    Démarre une exécution de page Streamlit (à appeler en tête de page) : ses mesures
+    sont gardées pour le panneau développeur, et le journal est activé.
+    """
+    RECORDER.enable_log()
+    RECORDER.begin_run()
+
+
+def load_log(path=DEFAULT_LOG):
+    """
+    Charge un journal de mesures et ses éventuels fichiers tournés (path.1, path.2...).
+    """
+    frames = []
+    for file in sorted(glob.glob(f"{glob.escape(path)}.*")) + [path]:
+        if os.path.exists(file) and os.path.getsize(file):
+            frames.append(pd.read_json(file, lines=True, convert_dates=["started_at"]))
+    if not frames:
+        return records_frame([])
+    return pd.concat(frames, ignore_index=True).sort_values("started_at", ignore_index=True)
+
+
+def summarize(df):
+    """
+    Agrège les mesures par étape : nombre d'appels, durées (totale, médiane, 95e centile,
+    maximale), lignes et variation de mémoire médianes, nombre d'erreurs.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=["calls", "total_s", "median_s", "p95_s", "max_s", "rows_median",
+                                     "memory_delta_median", "errors"])
+    grouped = df.groupby("stage")
+    summary = pd.DataFrame({
+        "calls": grouped.size(),
+        "total_s": grouped["seconds"].sum(),
+        "median_s": grouped["seconds"].median(),
+        "p95_s": grouped["seconds"].quantile(0.95),
+        "max_s": grouped["seconds"].max(),
+        "rows_median": grouped["rows"].median(),
+        "memory_delta_median": grouped["memory_delta"].median(),
+        "errors": grouped["error"].count(),
+    })
+    return summary.sort_values("total_s", ascending=False)
+
+
+def dev_mode():
+    """
+    Panneau des mesures visible ? (SIMIMMO_DEV=1 ou paramètre d'URL ?dev=1)
+    """
+    if os.environ.get(DEV_ENV) == "1":
+        return True
+    import streamlit as st
+    return st.query_params.get("dev") == "1"
+
+
+def sidebar_panel():
+    """
+    Affiche dans la barre latérale les mesures de l'exécution en cours et la synthèse des
+    mesures récentes du processus (mode développeur uniquement).
+    """
+    if not dev_mode():
+        return
+    import streamlit as st
+    run = records_frame(current_run())
+    with st.sidebar.expander("⏱️ Mesures (développeur)", expanded=False):
+        if run.empty:
+            st.caption("Aucune étape mesurée pendant cette exécution (résultats en cache).")
+        else:
+            st.caption(f"Exécution en cours : {run['seconds'].sum() * 1000:,.0f} ms mesurées")
+            st.dataframe(
+                run.assign(ms=run["seconds"] * 1000, memoire_mo=run["memory_delta"] / 2 ** 20)
+                [["stage", "ms", "rows", "memoire_mo", "error"]]
+                .style.format({"ms": "{:,.1f}", "memoire_mo": "{:+,.1f}"}, na_rep=""),
+                hide_index=True,
+            )
+        st.caption("Étapes récentes (toutes sessions)")
+        st.dataframe(summarize(RECORDER.recent_frame())[["calls", "median_s", "p95_s", "max_s"]])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthèse du journal des mesures de performance.")
+    parser.add_argument("path", nargs="?", default=DEFAULT_LOG, help="Journal (fichiers tournés inclus)")
+    parser.add_argument("--since", default=None, help="Date de début (AAAA-MM-JJ)")
+    args = parser.parse_args()
+    df = load_log(args.path)
+    if args.since and not df.empty:
+        df = df[df["started_at"] >= pd.Timestamp(args.since)]
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(summarize(df))
+
+
+if __name__ == "__main__":
+    main()
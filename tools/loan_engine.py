@@ -0,0 +1,418 @@
+# tools/loan_engine.py
+
+import numpy as np
+import pandas as pd
+
+# Colonnes du tableau d'amortissement, dans l'ordre affiché par app.py
+AMORTIZATION_COLUMNS = [
+    'Mois',
+    'Capital restant dû',
+    'Capital remboursé (cumulé)',
+    'Intérêts payés (cumulés)',
+    'Capital remboursé du mois',
+    'Intérêts du mois',
+]
+
+
+def monthly_payment(principal, annual_interest_rate, duration_years):
+    """
+    Calcule la mensualité constante d'un prêt amortissable.
+
+    Les arguments peuvent être des scalaires ou des tableaux NumPy (diffusion
+    / broadcasting appliquée).
+
+    Args:
+        principal (float | array): Capital emprunté.
+        annual_interest_rate (float | array): Taux d'intérêt annuel en pourcentage.
+        duration_years (int | array): Durée du remboursement en années.
+
+    Returns:
+        float | ndarray: Montant de la mensualité.
+    """
+    principal = np.asarray(principal, dtype=float)
+    monthly_rate = np.asarray(annual_interest_rate, dtype=float) / 100 / 12
+    duration_months = np.asarray(duration_years) * 12
+    payment = _annuity(principal, monthly_rate, duration_months)
+    return payment[()] if payment.ndim == 0 else payment
+
+
+def _annuity(principal, monthly_rate, duration_months):
+    """
+    Mensualité constante à partir du taux mensuel et de la durée en mois (diffusable).
+    """
+    monthly_rate = np.asarray(monthly_rate, dtype=float)
+    # Taux nul : on évite la division par zéro en remplaçant le taux par 1
+    # dans la formule, puis on sélectionne le remboursement linéaire.
+    safe_rate = np.where(monthly_rate == 0, 1.0, monthly_rate)
+    annuity = (principal * safe_rate) / (1 - (1 + safe_rate) ** (-duration_months))
+    return np.where(monthly_rate == 0, principal / duration_months, annuity)
+
+
+def _opening_principal(principal, monthly_rate, payment, elapsed):
+    """
+    Capital restant dû après `elapsed` mensualités (forme fermée, diffusable).
+    """
+    monthly_rate = np.asarray(monthly_rate, dtype=float)
+    safe_rate = np.where(monthly_rate == 0, 1.0, monthly_rate)
+    growth = (1 + monthly_rate) ** elapsed
+    annuity_balance = principal * growth - payment * (growth - 1) / safe_rate
+    return np.where(monthly_rate == 0, principal - payment * elapsed, annuity_balance)
+
+
+def amortization_arrays(principal, annual_interest_rate, duration_years):
+    """
+    Calcule le tableau d'amortissement en une seule passe vectorisée.
+
+    Le capital restant dû après k mois est obtenu par la forme fermée
+    B_k = P(1+r)^k - M((1+r)^k - 1)/r, d'où se déduisent les intérêts
+    (B_{k-1} * r) et le capital remboursé (M - intérêts) de chaque mois.
+    Le dernier mois solde le capital restant, comme dans la boucle historique.
+
+    Args:
+        principal (float): Capital emprunté.
+        annual_interest_rate (float): Taux d'intérêt annuel en pourcentage.
+        duration_years (int): Durée du remboursement en années.
+
+    Returns:
+        tuple: (montant_mensualite, cout_total_credit, colonnes) où colonnes est
+        un dictionnaire {nom_colonne: ndarray} suivant AMORTIZATION_COLUMNS.
+    """
+    monthly_rate = (annual_interest_rate / 100) / 12
+    duration_months = int(duration_years * 12)
+    payment = float(monthly_payment(principal, annual_interest_rate, duration_years))
+    total_cost_of_credit = 0 if monthly_rate == 0 else (payment * duration_months) - principal
+
+    months = np.arange(1, duration_months + 1)
+
+    # Capital restant dû au début de chaque mois (B_0 ... B_{n-1})
+    opening_principal = _opening_principal(principal, monthly_rate, payment, months - 1)
+
+    interest = opening_principal * monthly_rate
+    principal_paid = payment - interest
+
+    # Ajustement du dernier mois : on rembourse exactement ce qui reste dû
+    if duration_months > 0:
+        principal_paid[-1] = opening_principal[-1]
+        interest[-1] = max(0, payment - principal_paid[-1])
+
+    remaining = np.maximum(0, opening_principal - principal_paid)
+
+    columns = {
+        'Mois': months,
+        'Capital restant dû': remaining,
+        'Capital remboursé (cumulé)': np.cumsum(principal_paid),
+        'Intérêts payés (cumulés)': np.cumsum(interest),
+        'Capital remboursé du mois': principal_paid,
+        'Intérêts du mois': interest,
+    }
+    return payment, total_cost_of_credit, columns
+
+
+def amortization_schedule(principal, annual_interest_rate, duration_years):
+    """
+    Variante de amortization_arrays renvoyant directement un DataFrame.
+
+    Returns:
+        tuple: (montant_mensualite, cout_total_credit, tableau_amortissement)
+    """
+    payment, total_cost_of_credit, columns = amortization_arrays(
+        principal, annual_interest_rate, duration_years
+    )
+    return payment, total_cost_of_credit, pd.DataFrame(columns)
+
+
+# Correspondance entre les clés de simulate_batch et les colonnes du DataFrame long
+BATCH_COLUMNS = {
+    'principal': 'Capital emprunté',
+    'annual_interest_rate': "Taux d'intérêt annuel (%)",
+    'duration_years': 'Durée (années)',
+    'monthly_payment': 'Montant de la mensualité',
+    'total_cost_of_credit': 'Coût total du crédit',
+}
+
+
+def simulate_batch(principals, annual_interest_rates, durations_years, grid=True, schedules=False):
+    """
+    Simule un ensemble de prêts en un seul calcul vectorisé.
+
+    Avec grid=True, on calcule toutes les combinaisons capital × taux × durée
+    (résultats de forme (n_capitaux, n_taux, n_durées)). Avec grid=False, les
+    trois entrées sont simplement diffusées entre elles (scénarios appariés).
+
+    Args:
+        principals (float | array): Capitaux empruntés.
+        annual_interest_rates (float | array): Taux d'intérêt annuels en pourcentage.
+        durations_years (int | array): Durées de remboursement en années (entières).
+        grid (bool): Produit cartésien des entrées plutôt que diffusion simple.
+        schedules (bool): Ajoute les tableaux d'amortissement (axe supplémentaire
+            des mois, complété par NaN au-delà de la durée de chaque scénario).
+
+    Returns:
+        dict: {nom: ndarray} avec 'principal', 'annual_interest_rate',
+        'duration_years', 'monthly_payment', 'total_cost_of_credit' et, si
+        schedules=True, 'months' et une entrée par colonne de AMORTIZATION_COLUMNS.
+
+    Raises:
+        ValueError: si une durée n'est pas un nombre entier d'années strictement positif.
+    """
+    principals = np.atleast_1d(np.asarray(principals, dtype=float))
+    rates = np.atleast_1d(np.asarray(annual_interest_rates, dtype=float))
+    durations = np.atleast_1d(np.asarray(durations_years, dtype=float))
+    # Une conversion directe en entiers tronquerait silencieusement les durées fractionnaires
+    if not np.all((durations == np.round(durations)) & (durations > 0)):
+        raise ValueError(f"Durées invalides (nombre entier d'années attendu) : {durations_years}")
+    durations = durations.astype(int)
+    if grid:
+        principals, rates, durations = np.meshgrid(principals, rates, durations, indexing='ij')
+    else:
+        principals, rates, durations = np.broadcast_arrays(principals, rates, durations)
+
+    monthly_rate = rates / 100 / 12
+    duration_months = durations * 12
+    payment = monthly_payment(principals, rates, durations)
+    total_cost = np.where(monthly_rate == 0, 0.0, payment * duration_months - principals)
+
+    result = {
+        'principal': principals,
+        'annual_interest_rate': rates,
+        'duration_years': durations,
+        'monthly_payment': payment,
+        'total_cost_of_credit': total_cost,
+    }
+    if not schedules:
+        return result
+
+    # Axe des mois ajouté en dernière position : (..., max_mois)
+    months = np.arange(1, int(duration_months.max()) + 1)
+    n = duration_months[..., None]
+    opening = _opening_principal(
+        principals[..., None], monthly_rate[..., None], payment[..., None], months - 1
+    )
+    interest = opening * monthly_rate[..., None]
+    principal_paid = payment[..., None] - interest
+
+    # Dernier mois de chaque scénario : on solde exactement le capital restant
+    last = months == n
+    principal_paid = np.where(last, opening, principal_paid)
+    interest = np.where(last, np.maximum(0, payment[..., None] - opening), interest)
+
+    beyond = months > n
+    principal_paid = np.where(beyond, np.nan, principal_paid)
+    interest = np.where(beyond, np.nan, interest)
+
+    result['months'] = months
+    result['Mois'] = np.where(beyond, np.nan, np.broadcast_to(months, principal_paid.shape))
+    result['Capital restant dû'] = np.maximum(0, opening - principal_paid)
+    result['Capital remboursé (cumulé)'] = np.cumsum(principal_paid, axis=-1)
+    result['Intérêts payés (cumulés)'] = np.cumsum(interest, axis=-1)
+    result['Capital remboursé du mois'] = principal_paid
+    result['Intérêts du mois'] = interest
+    return result
+
+
+def simulate_batch_frame(principals, annual_interest_rates, durations_years, grid=True, schedules=False):
+    """
+    Variante de simulate_batch renvoyant un DataFrame au format long.
+
+    Une ligne par scénario ou, si schedules=True, une ligne par scénario et
+    par mois (colonnes de AMORTIZATION_COLUMNS ajoutées). Pratique pour les
+    cartes de chaleur « et si » (pivot sur taux × durée).
+    """
+    result = simulate_batch(principals, annual_interest_rates, durations_years, grid, schedules)
+    scenario = {BATCH_COLUMNS[key]: result[key].ravel() for key in BATCH_COLUMNS}
+    if not schedules:
+        return pd.DataFrame(scenario)
+
+    n_months = result['months'].size
+    frame = {name: np.repeat(values, n_months) for name, values in scenario.items()}
+    for name in AMORTIZATION_COLUMNS:
+        frame[name] = result[name].reshape(-1)
+    frame = pd.DataFrame(frame)
+    # On retire le remplissage des scénarios plus courts que la durée maximale
+    frame = frame[frame['Mois'].notna()].reset_index(drop=True)
+    frame['Mois'] = frame['Mois'].astype(int)
+    return frame
+
+
+# Colonnes ajoutées par les tableaux « variantes », après AMORTIZATION_COLUMNS
+VARIANT_COLUMNS = [
+    'Taux annuel (%)',
+    'Mensualité hors assurance',
+    'Assurance du mois',
+    'Remboursement anticipé',
+]
+
+
+def _rate_path(annual_interest_rate, duration_months, rate_changes=None, rate_cap=None):
+    """
+    Taux annuel de chaque mois (1..n) : taux initial, puis révisions [(mois, taux), ...]
+    applicables à partir du mois indiqué, bornées à ± rate_cap points du taux initial.
+    """
+    rates = np.full(duration_months, float(annual_interest_rate))
+    for month, rate in sorted(rate_changes or []):
+        if rate_cap is not None:
+            rate = min(max(rate, annual_interest_rate - rate_cap), annual_interest_rate + rate_cap)
+        rates[max(int(month), 1) - 1:] = max(float(rate), 0.0)
+    return rates
+
+
+def _remaining_months(balance, monthly_rate, payment):
+    """
+    Nombre de mensualités `payment` nécessaires pour solder `balance` (arrondi au mois supérieur).
+    """
+    if monthly_rate == 0:
+        months = balance / payment
+    else:
+        months = -np.log(1 - balance * monthly_rate / payment) / np.log(1 + monthly_rate)
+    # L'arrondi évite qu'une erreur d'arrondi flottant n'ajoute un mois presque vide
+    return int(np.ceil(round(months, 9)))
+
+
+def variant_arrays(principal, annual_interest_rate, duration_years, rate_changes=None, rate_cap=None,
+                   insurance_rate=0.0, insurance_basis='initial', deferral_months=0, deferral_type='partial',
+                   early_repayments=None, early_repayment_mode='duration'):
+    """
+    Tableau d'amortissement d'un prêt avec options : taux variable (capé), assurance
+    emprunteur, différé d'amortissement et remboursements anticipés.
+
+    Le prêt est découpé en segments aux dates d'événement (fin du différé, révision de
+    taux, remboursement anticipé). Taux et mensualité sont constants dans un segment :
+    chaque segment est calculé d'un bloc par la forme fermée de _opening_principal, la
+    boucle Python ne porte que sur les quelques segments.
+
+    Args:
+        principal (float): Capital emprunté.
+        annual_interest_rate (float): Taux d'intérêt annuel initial en pourcentage.
+        duration_years (int): Durée totale du prêt en années (différé compris).
+        rate_changes (list, optional): Révisions [(mois, taux annuel %)], le nouveau taux
+            s'appliquant à partir du mois indiqué ; la mensualité est alors recalculée sur
+            la durée restante.
+        rate_cap (float, optional): Variation maximale du taux, en points, autour du taux initial.
+        insurance_rate (float): Taux annuel de l'assurance emprunteur en pourcentage.
+        insurance_basis (str): 'initial' (cotisation fixe sur le capital emprunté) ou
+            'remaining' (cotisation sur le capital restant dû).
+        deferral_months (int): Durée du différé en début de prêt, en mois.
+        deferral_type (str): 'partial' (seuls les intérêts sont payés) ou 'total' (aucune
+            échéance, les intérêts sont capitalisés).
+        early_repayments (list, optional): Remboursements anticipés [(mois, montant)],
+            versés après l'échéance du mois indiqué ; un montant supérieur au capital
+            restant dû solde le prêt.
+        early_repayment_mode (str): 'duration' (mensualité conservée, durée réduite) ou
+            'payment' (durée conservée, mensualité réduite).
+
+    Returns:
+        tuple: (premiere_mensualite, cout_total_credit, colonnes) — la première
+        mensualité hors différé, assurance comprise ; le coût total (intérêts et
+        assurance) ; colonnes suit AMORTIZATION_COLUMNS puis VARIANT_COLUMNS.
+    """
+    duration_months = int(duration_years * 12)
+    deferral_months = int(min(max(deferral_months, 0), duration_months - 1))
+    annual_rates = _rate_path(annual_interest_rate, duration_months, rate_changes, rate_cap)
+    monthly_rates = annual_rates / 100 / 12
+
+    lump_sums = {}
+    for month, amount in early_repayments or []:
+        if 0 < int(month) < duration_months and amount > 0:
+            lump_sums[int(month)] = lump_sums.get(int(month), 0.0) + float(amount)
+
+    # Début de chaque segment (index de mois, 0 = premier mois)
+    boundaries = {0, deferral_months, duration_months}
+    boundaries |= {max(int(month), 1) - 1 for month, _ in rate_changes or [] if int(month) <= duration_months}
+    boundaries |= set(lump_sums)
+    boundaries = sorted(b for b in boundaries if b <= duration_months)
+
+    opening = np.zeros(duration_months)
+    interest = np.zeros(duration_months)
+    principal_paid = np.zeros(duration_months)
+    installment = np.zeros(duration_months)
+    lump_paid = np.zeros(duration_months)
+
+    balance = float(principal)
+    end = duration_months
+    payment = None
+    for start, stop in zip(boundaries[:-1], boundaries[1:]):
+        if start >= end or balance <= 0:
+            break
+        stop = min(stop, end)
+        rate = monthly_rates[start]
+        elapsed = np.arange(stop - start)
+
+        if start < deferral_months:
+            if deferral_type == 'total':
+                # Différé total : les intérêts s'ajoutent au capital (amortissement négatif)
+                segment_opening = balance * (1 + rate) ** elapsed
+                segment_interest = segment_opening * rate
+                segment_principal = -segment_interest
+                segment_installment = np.zeros(stop - start)
+            else:
+                segment_opening = np.full(stop - start, balance)
+                segment_interest = segment_opening * rate
+                segment_principal = np.zeros(stop - start)
+                segment_installment = segment_interest
+        else:
+            # Mensualité recalculée au début de l'amortissement et à chaque révision de taux
+            if payment is None or rate != monthly_rates[start - 1]:
+                payment = float(_annuity(balance, rate, end - start))
+            segment_opening = np.maximum(0, _opening_principal(balance, rate, payment, elapsed))
+            segment_interest = segment_opening * rate
+            segment_principal = payment - segment_interest
+            segment_installment = np.full(stop - start, payment)
+            if stop == end:
+                # Dernier mois : on solde exactement le capital restant
+                segment_principal[-1] = segment_opening[-1]
+                segment_installment[-1] = segment_opening[-1] + segment_interest[-1]
+
+        months = slice(start, stop)
+        opening[months] = segment_opening
+        interest[months] = segment_interest
+        principal_paid[months] = segment_principal
+        installment[months] = segment_installment
+        balance = segment_opening[-1] - segment_principal[-1]
+
+        if stop in lump_sums and stop < end:
+            amount = min(lump_sums[stop], balance)
+            lump_paid[stop - 1] = amount
+            principal_paid[stop - 1] += amount
+            balance -= amount
+            if balance <= 1e-9:
+                balance, end = 0.0, stop
+            elif stop >= deferral_months and payment is not None:
+                if early_repayment_mode == 'payment':
+                    payment = float(_annuity(balance, monthly_rates[stop], end - stop))
+                else:
+                    end = stop + _remaining_months(balance, monthly_rates[stop], payment)
+
+    insurance_base = opening[:end] if insurance_basis == 'remaining' else np.full(end, float(principal))
+    insurance = insurance_base * insurance_rate / 100 / 12
+    interest, principal_paid = interest[:end], principal_paid[:end]
+
+    columns = {
+        'Mois': np.arange(1, end + 1),
+        'Capital restant dû': np.maximum(0, opening[:end] - principal_paid),
+        'Capital remboursé (cumulé)': np.cumsum(principal_paid),
+        'Intérêts payés (cumulés)': np.cumsum(interest),
+        'Capital remboursé du mois': principal_paid,
+        'Intérêts du mois': interest,
+        'Taux annuel (%)': annual_rates[:end],
+        'Mensualité hors assurance': installment[:end],
+        'Assurance du mois': insurance,
+        'Remboursement anticipé': lump_paid[:end],
+    }
+    first = min(deferral_months, end - 1)
+    first_payment = installment[first] + insurance[first]
+    total_cost_of_credit = interest.sum() + insurance.sum()
+    return first_payment, total_cost_of_credit, columns
+
+
+def variant_schedule(principal, annual_interest_rate, duration_years, **options):
+    """
+    Variante de variant_arrays renvoyant directement un DataFrame (mêmes colonnes que
+    amortization_schedule, suivies de VARIANT_COLUMNS).
+
+    Returns:
+        tuple: (premiere_mensualite, cout_total_credit, tableau_amortissement)
+    """
+    payment, total_cost_of_credit, columns = variant_arrays(
+        principal, annual_interest_rate, duration_years, **options
+    )
+    return payment, total_cost_of_credit, pd.DataFrame(columns)
@@ -0,0 +1,155 @@
+# tools/map_clusters.py
+#
+# Regroupement des ventes côté serveur pour l'affichage cartographique.
+#
+# Plutôt que d'envoyer un marqueur HTML par vente au navigateur, on projette les points
+# en pixels Web Mercator au niveau de zoom courant et on les regroupe sur une grille de
+# `cell_pixels` pixels, en ne gardant que les cellules qui touchent la zone visible. Chaque cellule occupée devient un seul point (barycentre) portant
+# le nombre de ventes qu'elle contient.
+#
+# Le résultat est envoyé sous forme de GeoJSON compact : coordonnées arrondies, et pour
+# propriétés seulement le nombre de ventes et la position d'une vente du groupe dans la
+# table des mutations. Le détail d'une vente ou d'un groupe n'est construit qu'au clic
+# (cluster_members retrouve les ventes d'un groupe).
+
+import numpy as np
+import pandas as pd
+
+TILE_SIZE = 256
+DEFAULT_CELL_PIXELS = 60
+# Au-delà de ce zoom, seules les ventes quasi confondues (même immeuble) sont regroupées
+MAX_CLUSTER_ZOOM = 17
+MIN_CELL_PIXELS = 2
+# Latitude maximale de la projection Web Mercator
+_MAX_LATITUDE = 85.05112878
+
+
+def mercator_pixels(latitudes, longitudes, zoom):
+    """
+    Coordonnées en pixels Web Mercator (x, y) au niveau de zoom donné.
+    """
+    scale = TILE_SIZE * 2.0 ** zoom
+    lat = np.radians(np.clip(np.asarray(latitudes, dtype=float), -_MAX_LATITUDE, _MAX_LATITUDE))
+    x = (np.asarray(longitudes, dtype=float) + 180.0) / 360.0 * scale
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0 * scale
+    return x, y
+
+
+def viewport_mask(latitudes, longitudes, bounds, margin_deg=(0.0, 0.0)):
+    """
+    Points situés dans la zone visible (south, west, north, east), élargie de la marge
+    (en degrés de latitude, de longitude).
+    """
+    south, west, north, east = bounds
+    dlat, dlon = margin_deg
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    return (
+        (latitudes >= south - dlat) & (latitudes <= north + dlat)
+        & (longitudes >= west - dlon) & (longitudes <= east + dlon)
+    )
+
+
+def cluster_points(latitudes, longitudes, zoom, bounds=None, cell_pixels=DEFAULT_CELL_PIXELS,
+                   max_cluster_zoom=MAX_CLUSTER_ZOOM):
+    """
+    Regroupe les points visibles sur une grille de pixels au niveau de zoom donné (vectorisé).
+
+    Args:
+        latitudes, longitudes (array): Coordonnées des points (les NaN sont ignorés).
+        zoom (int): Niveau de zoom de la carte.
+        bounds (tuple, optional): Zone visible (south, west, north, east) ; tous les points sinon.
+        cell_pixels (int): Taille d'une cellule de regroupement, en pixels à l'écran.
+        max_cluster_zoom (int): Zoom à partir duquel seuls les points quasi confondus sont regroupés.
+
+    Returns:
+        DataFrame: une ligne par groupe — latitude, longitude (barycentre), n (nombre de
+        points) et position (position du premier point du groupe dans les tableaux
+        d'origine, utilisable avec iloc et cluster_members).
+    """
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    size = _cell_pixels(zoom, cell_pixels, max_cluster_zoom)
+    keep = ~(np.isnan(latitudes) | np.isnan(longitudes))
+    if bounds is not None:
+        # Préfiltre grossier en degrés (marge de deux cellules), puis filtre exact par cellule :
+        # une cellule qui touche la zone visible est conservée en entier
+        margin_lon = 2 * size * 360.0 / (TILE_SIZE * 2.0 ** zoom)
+        keep &= viewport_mask(latitudes, longitudes, bounds, (margin_lon, margin_lon))
+    positions = np.flatnonzero(keep)
+    lat, lon = latitudes[positions], longitudes[positions]
+
+    cell_x, cell_y = _cell_coordinates(lat, lon, zoom, size)
+    if bounds is not None:
+        south, west, north, east = bounds
+        (x_min, x_max), (y_max, y_min) = _cell_coordinates([south, north], [west, east], zoom, size)
+        visible = (cell_x >= x_min) & (cell_x <= x_max) & (cell_y >= y_min) & (cell_y <= y_max)
+        positions, lat, lon = positions[visible], lat[visible], lon[visible]
+        cell_x, cell_y = cell_x[visible], cell_y[visible]
+
+    cells = _cell_ids(cell_x, cell_y, zoom, size)
+    _, first, inverse, counts = np.unique(cells, return_index=True, return_inverse=True, return_counts=True)
+    return pd.DataFrame({
+        "latitude": np.bincount(inverse, weights=lat) / counts,
+        "longitude": np.bincount(inverse, weights=lon) / counts,
+        "n": counts,
+        "position": positions[first],
+    })
+
+
+def cluster_members(latitudes, longitudes, zoom, position, cell_pixels=DEFAULT_CELL_PIXELS,
+                    max_cluster_zoom=MAX_CLUSTER_ZOOM):
+    """
+    Positions des points du groupe dont fait partie le point `position`, au niveau de zoom
+    donné (même cellule de la grille).
+    """
+    size = _cell_pixels(zoom, cell_pixels, max_cluster_zoom)
+    cells = _cell_ids(*_cell_coordinates(latitudes, longitudes, zoom, size), zoom, size)
+    return np.flatnonzero(cells == cells[position])
+
+
+def _cell_pixels(zoom, cell_pixels, max_cluster_zoom):
+    return MIN_CELL_PIXELS if zoom >= max_cluster_zoom else cell_pixels
+
+
+def _cell_coordinates(latitudes, longitudes, zoom, cell_pixels):
+    x, y = mercator_pixels(latitudes, longitudes, zoom)
+    with np.errstate(invalid="ignore"):
+        return np.floor(x / cell_pixels).astype(np.int64), np.floor(y / cell_pixels).astype(np.int64)
+
+
+def _cell_ids(cell_x, cell_y, zoom, cell_pixels):
+    cells_per_row = int(np.ceil(TILE_SIZE * 2.0 ** zoom / cell_pixels)) + 1
+    return cell_y * cells_per_row + cell_x
+
+
+def clusters_geojson(clusters, precision=5):
+    """
+    GeoJSON compact des groupes : un Point par groupe, propriétés « n » (nombre de ventes)
+    et « i » (position d'une vente du groupe, qui permet de retrouver le groupe au clic).
+    """
+    lon = np.round(clusters["longitude"].to_numpy(), precision).tolist()
+    lat = np.round(clusters["latitude"].to_numpy(), precision).tolist()
+    counts = clusters["n"].to_numpy().tolist()
+    positions = clusters["position"].to_numpy().tolist()
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [x, y]},
+            "properties": {"n": n, "i": i},
+        }
+        for x, y, n, i in zip(lon, lat, counts, positions)
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+
+def bounds_from_map_state(state):
+    """
+    Zone visible (south, west, north, east) à partir de l'état renvoyé par st_folium, ou None.
+    """
+    bounds = (state or {}).get("bounds") or {}
+    south_west, north_east = bounds.get("_southWest") or {}, bounds.get("_northEast") or {}
+    values = (south_west.get("lat"), south_west.get("lng"), north_east.get("lat"), north_east.get("lng"))
+    if any(v is None for v in values):
+        return None
+    return tuple(float(v) for v in values)
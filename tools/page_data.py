@@ -0,0 +1,258 @@
+# tools/page_data.py
+#
+# Chargements et services mis en cache, partagés entre les pages et le préchauffage au
+# démarrage (tools/startup.py) : une fonction en cache appelée par le préchauffage
+# remplit le cache que la page lira ensuite, à condition d'être la même fonction.
+# Les fichiers DVF partagés sont mis en cache par version (inode et date de
+# modification du fichier) : réécrits par une ingestion ou une mise à jour, ils sont
+# rechargés et seule la nouvelle version reste en mémoire.
+#
+# Les modules lourds (pyarrow, requests, BeautifulSoup) ne sont importés qu'au premier
+# appel, et la durée de leur import est mesurée : importer ce module depuis le simulateur
+# ne coûte rien.
+
+import os
+import threading
+
+import pandas as pd
+import streamlit as st
+
+from tools.instrumentation import stage, timed
+from tools.startup import timed_import
+
+# ----------- Taux ----------- #
+
+
+@st.cache_resource
+def get_rate_service():
+    """
+    Service partagé par toutes les sessions : cache des taux (30 min), session HTTP
+    réutilisée et interrogation des sources en parallèle.
+    """
+    return timed_import("tools.rate_fetcher").RateService()
+
+
+@st.cache_resource
+def get_rate_history():
+    from tools.rate_history import RateHistory
+    return RateHistory()
+
+
+@st.cache_resource
+def get_rate_recorder():
+    """
+    Historique des taux, alimenté par un thread de fond démarré une seule fois par processus.
+    """
+    from tools.rate_history import RateRecorder
+    return RateRecorder(get_rate_service(), get_rate_history()).start()
+
+
+def prechauffer_taux():
+    """
+    Récupère les taux (cache du service) et les enregistre avant de démarrer le relevé
+    périodique : le simulateur et la page des taux les trouvent déjà chargés.
+    """
+    get_rate_history().record(get_rate_service().get_rates())
+    get_rate_recorder()
+
+
+# ----------- DVF : stockage Parquet (voir tools/dvf_store.py) ----------- #
+DVF_STORE = os.path.join("data", "dvf_store")
+# Département affiché par défaut sur la page DVF (préchauffé au démarrage)
+DEPARTEMENT_PAR_DEFAUT = "75"
+
+# Seules ces colonnes sont lues depuis le stockage
+COLONNES_PAGE = [
+    "id_mutation", "date_mutation", "nature_mutation", "valeur_fonciere", "adresse_numero", "adresse_nom_voie",
+    "code_postal", "nom_commune", "type_local", "surface_reelle_bati", "nombre_pieces_principales",
+    "surface_terrain", "longitude", "latitude", "annee",
+]
+
+
+def annees_disponibles(departement):
+    """
+    Années stockées pour un département (lues dans les noms de partitions, sans charger de données).
+    """
+    return timed_import("tools.dvf_store").available_years(DVF_STORE, departement)
+
+
+@st.cache_data
+@timed("dvf.charger_donnees")
+def charger_donnees(departement, annee=None):
+    """
+    Charge les transactions DVF d'un département (et d'une année si précisée).
+
+    Lit uniquement la partition et les colonnes utiles dans le stockage Parquet. Si le
+    département n'a pas encore été converti, on retombe sur l'ancien fichier CSV
+    'data/DVF_{departement}.csv', normalisé à la volée.
+    """
+    from tools.dvf_store import available_years, load_partition, normalize_dvf
+    if available_years(DVF_STORE, departement):
+        with stage("dvf.load_partition") as mesure:
+            df = load_partition(DVF_STORE, departement, None if annee is None else [annee], COLONNES_PAGE)
+            mesure.rows = len(df)
+        return df
+    try:
+        with stage("dvf.read_csv") as mesure:
+            df = pd.read_csv(f"data/DVF_{departement}.csv", delimiter='|', dtype=str)
+            mesure.rows = len(df)
+        with stage("dvf.normalize", rows=len(df)):
+            df = normalize_dvf(df, departement=departement)
+        return df[[c for c in COLONNES_PAGE if c in df.columns]]
+    except FileNotFoundError:
+        st.error(f"Fichier DVF pour le département {departement} introuvable dans le dossier 'data/'.")
+        return pd.DataFrame()
+
+
+@st.cache_data
+@timed("dvf.charger_mutations")
+def charger_mutations(departement, annee=None):
+    """
+    Regroupe les lignes DVF en une ligne par vente (voir tools/dvf_mutations.py).
+
+    Returns:
+        tuple: (mutations, lots)
+    """
+    from tools.dvf_mutations import build_mutations
+    return build_mutations(charger_donnees(departement, annee))
+
+
+def _version(path):
+    """
+    Version d'un fichier du stockage : (inode, date de modification), None s'il n'existe
+    pas. Les fichiers étant réécrits par remplacement atomique (os.replace), chaque
+    réécriture par une ingestion ou une mise à jour change l'inode.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+class VersionedCache:
+    """
+    Une valeur par clé, pour la seule version courante du fichier dont elle est tirée :
+    une nouvelle version remplace l'ancienne, qui n'est plus référencée par le cache.
+
+    Un verrou par clé évite que deux sessions chargent la même valeur en même temps.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, version, load):
+        """
+        Valeur de key pour cette version ; load() la (re)charge si la version a changé.
+        """
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+            # L'ancienne version est libérée avant de charger la nouvelle
+            self._entries.pop(key, None)
+            value = load()
+            self._entries[key] = (version, value)
+            return value
+
+
+@st.cache_resource
+def fichiers_partages():
+    """
+    Cache des fichiers DVF partagés par toutes les sessions (un par processus).
+    """
+    return VersionedCache()
+
+
+def version_mutations(departement):
+    return _version(timed_import("tools.dvf_mapped").mapped_path(DVF_STORE, departement))
+
+
+def ouvrir_mutations_partagees(departement):
+    """
+    Mutations du département projetées en mémoire (voir tools/dvf_mapped.py), ouvertes
+    une fois par processus et par version du fichier, et partagées sans copie par toutes
+    les sessions ; None si le fichier n'a pas été construit.
+    """
+    return fichiers_partages().get(
+        ("mutations", departement), version_mutations(departement),
+        lambda: timed_import("tools.dvf_mapped").MappedDataset.open(DVF_STORE, departement),
+    )
+
+
+def mutations_departement(departement):
+    """
+    Toutes les mutations du département : vue du jeu projeté si possible, sinon
+    regroupement des lignes chargées.
+    """
+    jeu = ouvrir_mutations_partagees(departement)
+    return jeu.frame() if jeu is not None else charger_mutations(departement)[0]
+
+
+def _construire_index_adresses(departement):
+    from tools.dvf_address_index import AddressIndex
+    index = AddressIndex.load(DVF_STORE, departement)
+    if index is None:
+        index = AddressIndex.from_mutations(mutations_departement(departement))
+    return index
+
+
+def charger_index_adresses(departement):
+    """
+    Index des ventes par adresse du département (voir tools/dvf_address_index.py),
+    construit à l'ingestion ; à défaut, construit à partir des mutations chargées.
+    """
+    from tools.dvf_address_index import INDEX_NAME, address_dir
+    version = _version(os.path.join(address_dir(DVF_STORE, departement), INDEX_NAME))
+    return fichiers_partages().get(
+        ("adresses", departement), version if version is not None else version_mutations(departement),
+        lambda: _construire_index_adresses(departement),
+    )
+
+
+def charger_comparables(departement):
+    """
+    Index des ventes comparables récentes du département (voir tools/dvf_valuation.py),
+    reconstruit quand le fichier projeté du département change.
+    """
+    from tools.dvf_valuation import ComparablesIndex
+    return fichiers_partages().get(
+        ("comparables", departement), version_mutations(departement),
+        lambda: ComparablesIndex.from_mutations(mutations_departement(departement)),
+    )
+
+
+# Une seule synthèse (celle du stockage) : seule sa dernière version est gardée
+@st.cache_data(max_entries=1)
+def _charger_synthese(version):
+    from tools.dvf_aggregates import load_summary
+    return load_summary(DVF_STORE)
+
+
+def charger_synthese():
+    """
+    Charge la synthèse des prix précalculée à l'ingestion (voir tools/dvf_aggregates.py),
+    relue quand elle est réécrite.
+    """
+    from tools.dvf_aggregates import SUMMARY_NAME, aggregates_dir
+    return _charger_synthese(_version(os.path.join(aggregates_dir(DVF_STORE), SUMMARY_NAME)))
+
+
+def prechauffer_dvf(departement=DEPARTEMENT_PAR_DEFAUT):
+    """
+    Charge ce qu'affiche la page DVF à l'ouverture : les mutations du département par
+    défaut (jeu projeté, ou à défaut sa dernière année), la synthèse des prix et l'index
+    des ventes comparables.
+    """
+    if ouvrir_mutations_partagees(departement) is None:
+        annees = annees_disponibles(departement)
+        charger_mutations(departement, annees[0] if annees else None)
+    charger_synthese()
+    charger_comparables(departement)
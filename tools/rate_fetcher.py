@@ -0,0 +1,249 @@
+# tools/rate_fetcher.py
+#
+# Service de récupération des taux immobiliers (Meilleurtaux, Empruntis).
+#
+# - toutes les sources sont interrogées en parallèle, via une session HTTP réutilisée
+#   (pool de connexions) et des délais d'attente stricts ;
+# - les résultats sont mis en cache pendant `ttl` secondes, pour tous les utilisateurs
+#   du processus ;
+# - si une source échoue, la dernière valeur valide est servie (marquée « stale ») et la
+#   source n'est pas réinterrogée avant `retry_after` secondes ;
+# - le temps de téléchargement et d'analyse de chaque source est mesuré (et journalisé,
+#   voir tools/instrumentation.py).
+#
+# Les URL des sources sont configurables, ce qui permet de tester le service contre des
+# pages HTML locales servies par un petit serveur HTTP.
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+
+from tools.instrumentation import stage
+
+DEFAULT_TTL = 30 * 60
+# Délai minimal avant de réinterroger une source en échec
+DEFAULT_RETRY_AFTER = 60
+# (connexion, lecture) en secondes
+DEFAULT_TIMEOUT = (3.05, 5)
+USER_AGENT = "Mozilla/5.0 (compatible; SimImmo/1.0)"
+
+
+def parse_meilleurtaux(html):
+    """
+    Extrait le taux moyen sur 15 ans de la page d'accueil Meilleurtaux.
+
+    Returns:
+        dict: {"15 ans": taux}
+
+    Raises:
+        ValueError: si la structure de la page a changé.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    credit_immobilier_card = soup.find('a', class_='cards fc', href='/demande-simulation/credit-immobilier/')
+    if not credit_immobilier_card:
+        raise ValueError("Impossible de trouver la carte 'Crédit immobilier'.")
+    foot_div = credit_immobilier_card.find('div', class_='foot')
+    if not foot_div:
+        raise ValueError("Impossible de trouver le div 'foot' pour le crédit immobilier.")
+    rate_tag = foot_div.find('b')
+    if not rate_tag:
+        raise ValueError("Impossible de trouver la balise <b> contenant le taux.")
+    rate_text = rate_tag.get_text(strip=True)
+    cleaned_rate = rate_text.replace(',', '.').replace('%', '').strip()
+    try:
+        return {"15 ans": float(cleaned_rate)}
+    except ValueError:
+        raise ValueError(f"Taux non convertible en float : {cleaned_rate}")
+
+
+def parse_empruntis(html):
+    """
+    Extrait les meilleurs taux (15, 20, 25 ans) de la page des baromètres Empruntis.
+
+    Returns:
+        dict: {"15 ans": taux, "20 ans": taux, ...}
+
+    Raises:
+        ValueError: si la structure de la page a changé ou qu'aucun taux n'est lisible.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    bloc_taux = soup.find("div", class_="blocs_meilleur_taux")
+    if not bloc_taux:
+        raise ValueError("Bloc des meilleurs taux non trouvé sur Empruntis.")
+
+    taux_dict = {}
+    for taux_div in bloc_taux.find_all("div", class_="body_taux"):
+        duree = taux_div.find("span", class_="txt_taux")
+        taux = taux_div.find("span", class_="taux")
+        if duree and taux:
+            # Ex: "sur 15 ans(1)" → extraire juste "15 ans"
+            duree_text = duree.get_text(strip=True).split('(')[0].replace("sur ", "")
+            taux_text = taux.get_text(strip=True).replace('%', '').replace(',', '.')
+            try:
+                taux_dict[duree_text] = float(taux_text)
+            except ValueError:
+                continue
+    if not taux_dict:
+        raise ValueError("Aucun taux lisible dans le bloc Empruntis.")
+    return taux_dict
+
+
+# Sources connues : nom -> (url, fonction d'analyse)
+SOURCES = {
+    "meilleurtaux": ("https://www.meilleurtaux.com/", parse_meilleurtaux),
+    "empruntis": ("https://www.empruntis.com/financement/actualites/barometres_regionaux.php", parse_empruntis),
+}
+
+
+class RateResult:
+    """
+    Résultat de la récupération d'une source.
+
+    Attributes:
+        source (str): Nom de la source.
+        rates (dict | None): {durée: taux en %}, None si jamais récupéré.
+        fetched_at (float | None): Horodatage (time.time()) de la dernière valeur valide.
+        fetch_seconds (float): Durée du dernier téléchargement.
+        parse_seconds (float): Durée de la dernière analyse HTML.
+        error (str | None): Erreur de la dernière tentative.
+        stale (bool): True si `rates` provient d'une tentative antérieure réussie.
+    """
+
+    def __init__(self, source, rates=None, fetched_at=None, fetch_seconds=0.0, parse_seconds=0.0,
+                 error=None, stale=False):
+        self.source = source
+        self.rates = rates
+        self.fetched_at = fetched_at
+        self.fetch_seconds = fetch_seconds
+        self.parse_seconds = parse_seconds
+        self.error = error
+        self.stale = stale
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+    def __repr__(self):
+        return f"RateResult({self.as_dict()!r})"
+
+
+class RateService:
+    """
+    Récupère et met en cache les taux de plusieurs sources.
+
+    Une instance est destinée à être partagée par toutes les sessions (st.cache_resource) ;
+    elle est sûre vis-à-vis des accès concurrents.
+
+    Args:
+        sources (dict, optional): {nom: (url, fonction_analyse)} ; SOURCES par défaut.
+        ttl (float): Durée de validité du cache, en secondes.
+        retry_after (float): Délai minimal entre deux tentatives sur une source en échec.
+        timeout (float | tuple): Délai d'attente (connexion, lecture) des requêtes.
+        max_workers (int, optional): Nombre de téléchargements simultanés.
+    """
+
+    def __init__(self, sources=None, ttl=DEFAULT_TTL, retry_after=DEFAULT_RETRY_AFTER, timeout=DEFAULT_TIMEOUT,
+                 max_workers=None):
+        self.sources = dict(SOURCES if sources is None else sources)
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self.timeout = timeout
+        self._results = {}
+        self._attempted_at = {}
+        self._lock = threading.Lock()
+        self._source_locks = {name: threading.Lock() for name in self.sources}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or len(self.sources) or 1)
+
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=len(self.sources) or 1, pool_maxsize=4, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _is_fresh(self, name):
+        result = self._results.get(name)
+        if result is None:
+            return False
+        if result.error is not None:
+            return time.time() - self._attempted_at[name] < self.retry_after
+        return time.time() - result.fetched_at < self.ttl
+
+    def _fetch(self, name, force=False):
+        # Un seul téléchargement à la fois par source : les autres appels attendent puis
+        # relisent le cache au lieu de relancer la même requête.
+        with self._source_locks[name]:
+            if not force and self._is_fresh(name):
+                return self._results[name]
+
+            url, parser = self.sources[name]
+            previous = self._results.get(name)
+            self._attempted_at[name] = time.time()
+            fetch_seconds = parse_seconds = 0.0
+            try:
+                started = time.perf_counter()
+                with stage(f"taux.{name}.telechargement"):
+                    response = self.session.get(url, timeout=self.timeout)
+                    response.raise_for_status()
+                fetch_seconds = time.perf_counter() - started
+
+                started = time.perf_counter()
+                with stage(f"taux.{name}.analyse") as mesure:
+                    rates = parser(response.text)
+                    mesure.rows = len(rates)
+                parse_seconds = time.perf_counter() - started
+                result = RateResult(name, rates, time.time(), fetch_seconds, parse_seconds)
+            except Exception as e:
+                if not fetch_seconds:
+                    fetch_seconds = time.perf_counter() - started
+                # On conserve la dernière valeur valide, signalée comme périmée
+                result = RateResult(
+                    name,
+                    rates=previous.rates if previous else None,
+                    fetched_at=previous.fetched_at if previous else None,
+                    fetch_seconds=fetch_seconds,
+                    parse_seconds=parse_seconds,
+                    error=f"{type(e).__name__}: {e}",
+                    stale=bool(previous and previous.rates),
+                )
+
+            with self._lock:
+                self._results[name] = result
+            return result
+
+    def get_rates(self, names=None, force=False):
+        """
+        Renvoie les taux des sources demandées (toutes par défaut).
+
+        Les sources dont le cache est encore valide ne sont pas interrogées ; les autres
+        le sont en parallèle.
+
+        Args:
+            names (list[str], optional): Sources à récupérer.
+            force (bool): Ignore le cache (et le délai entre tentatives) et interroge toutes les sources.
+
+        Returns:
+            dict: {nom_source: RateResult}
+        """
+        names = list(self.sources) if names is None else list(names)
+        futures = {name: self._executor.submit(self._fetch, name, force) for name in names}
+        return {name: future.result() for name, future in futures.items()}
+
+    def get_rate(self, name, force=False):
+        return self.get_rates([name], force)[name]
+
+    def latencies(self):
+        """
+        Temps de téléchargement et d'analyse de la dernière tentative de chaque source.
+        """
+        with self._lock:
+            return {
+                name: {"fetch_seconds": r.fetch_seconds, "parse_seconds": r.parse_seconds, "error": r.error}
+                for name, r in self._results.items()
+            }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
@@ -0,0 +1,228 @@
+# tools/rate_history.py
+#
+# Historique des taux immobiliers relevés par tools/rate_fetcher.py.
+#
+# Les relevés sont ajoutés (jamais modifiés) dans une base SQLite locale :
+#
+#   rates(source, duree, observed_at, taux)   clé primaire (source, duree, observed_at)
+#
+# La clé primaire sert d'index aux requêtes « dernier taux » et « taux sur une période »,
+# et rend l'enregistrement idempotent : un même relevé (même horodatage de récupération)
+# servi plusieurs fois par le cache n'est stocké qu'une fois.
+#
+# Un RateRecorder alimente la base à intervalle régulier dans un thread de fond, de sorte
+# que les pages ne lisent que la base et ne déclenchent aucun téléchargement.
+#
+# Utilisation en ligne de commande (tâche planifiée) :
+#   python -m tools.rate_history              un relevé puis sortie
+#   python -m tools.rate_history --interval 3600
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+DEFAULT_DB = os.path.join("data", "rates.sqlite")
+DEFAULT_INTERVAL = 60 * 60
+
+# Source privilégiée pour pré-remplir le simulateur : Empruntis publie un taux par durée
+PREFERRED_SOURCES = ["empruntis", "meilleurtaux"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rates (
+    source TEXT NOT NULL,
+    duree TEXT NOT NULL,
+    observed_at REAL NOT NULL,
+    taux REAL NOT NULL,
+    PRIMARY KEY (source, duree, observed_at)
+) WITHOUT ROWID
+"""
+
+
+class RateHistory:
+    """
+    Série temporelle des taux, stockée dans une base SQLite.
+
+    Chaque opération ouvre sa propre connexion : l'objet peut être partagé entre les
+    sessions et le thread d'enregistrement.
+
+    Args:
+        path (str): Chemin de la base (créée au besoin).
+    """
+
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def record(self, results):
+        """
+        Enregistre les taux valides d'un relevé (résultat de RateService.get_rates).
+
+        Les résultats en erreur ou périmés sont ignorés, ainsi que les relevés déjà présents.
+
+        Returns:
+            int: nombre de taux ajoutés.
+        """
+        rows = [
+            (result.source, duree, result.fetched_at, float(taux))
+            for result in results.values()
+            if result.rates and not result.error
+            for duree, taux in result.rates.items()
+        ]
+        if not rows:
+            return 0
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO rates (source, duree, observed_at, taux) VALUES (?, ?, ?, ?)", rows)
+            return conn.total_changes - before
+
+    def latest(self, source=None, duree=None):
+        """
+        Dernier taux connu de chaque (source, durée), éventuellement filtré.
+
+        Returns:
+            DataFrame: colonnes source, duree, taux, date.
+        """
+        clauses, params = _filters(source=source, duree=duree)
+        query = (
+            "SELECT source, duree, taux, MAX(observed_at) AS observed_at FROM rates"
+            f"{clauses} GROUP BY source, duree ORDER BY source, duree"
+        )
+        return _to_frame(self._query(query, params))
+
+    def range(self, source=None, duree=None, start=None, end=None):
+        """
+        Taux relevés sur une période (bornes incluses), triés par date.
+
+        Args:
+            source (str, optional): Source (ex : "empruntis").
+            duree (str, optional): Durée (ex : "20 ans").
+            start, end (datetime-like, optional): Bornes de la période.
+
+        Returns:
+            DataFrame: colonnes source, duree, taux, date.
+        """
+        clauses, params = _filters(source=source, duree=duree, start=start, end=end)
+        query = f"SELECT source, duree, taux, observed_at FROM rates{clauses} ORDER BY source, duree, observed_at"
+        return _to_frame(self._query(query, params))
+
+    def latest_rate(self, duration_years, sources=PREFERRED_SOURCES):
+        """
+        Dernier taux pour une durée de prêt, en suivant l'ordre de préférence des sources
+        (à défaut, le plus récent toutes durées confondues). None si l'historique est vide.
+        """
+        latest = self.latest()
+        if latest.empty:
+            return None
+        same_duration = latest[latest["duree"] == f"{int(duration_years)} ans"]
+        for source in sources:
+            match = same_duration[same_duration["source"] == source]
+            if not match.empty:
+                return float(match["taux"].iloc[0])
+        return float(latest.sort_values("date")["taux"].iloc[-1])
+
+    def _query(self, query, params):
+        with self._connect() as conn:
+            return conn.execute(query, params).fetchall()
+
+
+def _filters(source=None, duree=None, start=None, end=None):
+    clauses, params = [], []
+    if source is not None:
+        clauses.append("source = ?")
+        params.append(source)
+    if duree is not None:
+        clauses.append("duree = ?")
+        params.append(duree)
+    if start is not None:
+        clauses.append("observed_at >= ?")
+        params.append(pd.Timestamp(start).timestamp())
+    if end is not None:
+        clauses.append("observed_at <= ?")
+        params.append(pd.Timestamp(end).timestamp())
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def _to_frame(rows):
+    frame = pd.DataFrame(rows, columns=["source", "duree", "taux", "observed_at"])
+    frame["date"] = pd.to_datetime(frame["observed_at"], unit="s")
+    return frame.drop(columns="observed_at")
+
+
+class RateRecorder:
+    """
+    Relève périodiquement les taux dans un thread de fond et les enregistre.
+
+    Args:
+        service (RateService): Service de récupération (son cache limite les téléchargements).
+        history (RateHistory): Historique à alimenter.
+        interval (float): Intervalle entre deux relevés, en secondes.
+    """
+
+    def __init__(self, service, history, interval=DEFAULT_INTERVAL):
+        self.service = service
+        self.history = history
+        self.interval = interval
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record_once(self):
+        try:
+            added = self.history.record(self.service.get_rates())
+            self.last_error = None
+            return added
+        except Exception as e:
+            # Un relevé manqué ne doit pas arrêter le thread
+            self.last_error = f"{type(e).__name__}: {e}"
+            return 0
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.record_once()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="rate-recorder", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+def main():
+    from tools.rate_fetcher import RateService
+
+    parser = argparse.ArgumentParser(description="Relève les taux immobiliers et les ajoute à l'historique.")
+    parser.add_argument("--db", default=DEFAULT_DB, help="Base SQLite de l'historique")
+    parser.add_argument("--interval", type=float, default=None,
+                        help="Relève en continu toutes les N secondes (un seul relevé par défaut)")
+    args = parser.parse_args()
+
+    history = RateHistory(args.db)
+    recorder = RateRecorder(RateService(ttl=0), history)
+    while True:
+        added = recorder.record_once()
+        print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} : {added} taux ajoutés"
+              + (f" ({recorder.last_error})" if recorder.last_error else ""))
+        if args.interval is None:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
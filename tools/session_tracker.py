@@ -1,71 +1,273 @@
-# tracking/session_tracker.py
+# tools/session_tracker.py
+#
+# Suivi de fréquentation : journal d'événements en ajout seul.
+#
+# Chaque visite produit quelques événements (début de session, pages vues, activité) qui
+# sont placés dans une file en mémoire ; un thread de fond les écrit par lots dans des
+# fichiers JSON-lines, un fichier par jour UTC (data/sessions/events-AAAA-MM-JJ.jsonl).
+# Le coût d'un événement pour la page est constant (ajout dans la file), quelle que soit
+# la taille de l'historique. Chaque lot est écrit en un seul appel système sur un fichier
+# ouvert en O_APPEND : plusieurs processus peuvent écrire dans le même fichier sans que
+# leurs lignes se mélangent.
+#
+# Les durées de visite sont approximées par l'écart entre le premier et le dernier
+# événement d'une session (un événement d'activité au plus toutes les
+# ACTIVITY_INTERVAL secondes).
+#
+# Synthèse en ligne de commande :
+#   python -m tools.session_tracker --since 2025-01-01
 
-import streamlit as st
-import streamlit.components.v1 as components
-from datetime import datetime
+import argparse
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import threading
 import time
 import uuid
+from datetime import date, datetime, timedelta, timezone
+
 import pandas as pd
-import os
-import json
+import streamlit as st
+
+DEFAULT_DIR = os.path.join("data", "sessions")
+DEFAULT_FLUSH_INTERVAL = 2.0
+DEFAULT_BATCH_SIZE = 500
+# Événements en attente au-delà desquels les nouveaux sont ignorés (écriture en retard)
+DEFAULT_MAX_PENDING = 10_000
+# Intervalle minimal entre deux événements d'activité d'une même session
+ACTIVITY_INTERVAL = 30
+FILE_PREFIX = "events-"
+
+logger = logging.getLogger(__name__)
+
+
+def utc_day(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).date()
+
+
+def event_file(directory, day):
+    return os.path.join(directory, f"{FILE_PREFIX}{day:%Y-%m-%d}.jsonl")
+
+
+class EventLog:
+    """
+    Journal d'événements en ajout seul, écrit par lots dans un thread de fond.
+
+    Args:
+        directory (str): Dossier des fichiers journaliers (créé au besoin).
+        flush_interval (float): Délai maximal avant l'écriture d'un événement, en secondes.
+        batch_size (int): Nombre maximal d'événements écrits à la fois.
+        max_pending (int): Taille de la file ; au-delà, les événements sont comptés dans
+            `dropped` et ignorés.
+        Un événement non sérialisable en JSON est écarté à l'écriture (compté dans
+        `rejected`), sans interrompre le thread ni bloquer les suivants.
+        retention_days (int, optional): Les fichiers plus anciens sont supprimés.
+    """
+
+    def __init__(self, directory=DEFAULT_DIR, flush_interval=DEFAULT_FLUSH_INTERVAL, batch_size=DEFAULT_BATCH_SIZE,
+                 max_pending=DEFAULT_MAX_PENDING, retention_days=None):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.retention_days = retention_days
+        self.dropped = 0
+        self.rejected = 0
+        self.last_error = None
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._stop = threading.Event()
+        self._current_day = None
+        os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def emit(self, event, **fields):
+        """
+        Ajoute un événement (non bloquant) ; il sera écrit au prochain lot.
+        """
+        fields["event"] = event
+        fields.setdefault("ts", time.time())
+        try:
+            self._queue.put_nowait(fields)
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self, block):
+        batch = []
+        try:
+            if block:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _write(self, batch):
+        # Regroupé par jour : un lot à cheval sur minuit est réparti entre deux fichiers
+        by_day = {}
+        for fields in batch:
+            try:
+                day = utc_day(fields["ts"])
+                line = json.dumps(fields, ensure_ascii=False)
+            except (TypeError, ValueError, OverflowError, OSError) as e:
+                self.rejected += 1
+                logger.warning("Événement %r ignoré : %s: %s", fields.get("event"), type(e).__name__, e)
+                continue
+            by_day.setdefault(day, []).append(line)
+        for day, lines in by_day.items():
+            data = ("\n".join(lines) + "\n").encode("utf-8")
+            fd = os.open(event_file(self.directory, day), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, data)
+            finally:
+                os.close(fd)
+            if day != self._current_day:
+                self._current_day = day
+                self._purge()
+
+    def _purge(self):
+        if self.retention_days is None:
+            return
+        oldest = event_file(self.directory, utc_day(time.time()) - timedelta(days=self.retention_days))
+        for path in glob.glob(os.path.join(self.directory, f"{FILE_PREFIX}*.jsonl")):
+            # Les noms de fichiers datés se comparent comme les dates
+            if path < oldest:
+                os.remove(path)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._flush_once(block=True)
+            except Exception as e:
+                # Le thread d'écriture ne doit pas s'arrêter : les événements suivants
+                # s'accumuleraient dans la file sans jamais être écrits
+                self.last_error = f"{type(e).__name__}: {e}"
+                logger.exception("Écriture du journal d'événements en échec")
+
+    def _flush_once(self, block=False):
+        batch = self._drain(block)
+        while batch:
+            try:
+                self._write(batch)
+                self.last_error = None
+            except OSError as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+            batch = self._drain(False) if len(batch) == self.batch_size else []
+
+    def flush(self):
+        """
+        Écrit immédiatement les événements en attente.
+        """
+        self._flush_once()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+
+
+@st.cache_resource
+def get_event_log():
+    """
+    Journal partagé par toutes les sessions du processus (un seul thread d'écriture).
+    """
+    return EventLog()
+
+
+def track_user(page="accueil", event_log=None):
+    """
+    Enregistre la visite de la session courante : début de session au premier appel,
+    page vue à chaque changement de page, activité au plus toutes les ACTIVITY_INTERVAL
+    secondes.
+
+    Returns:
+        float: Horodatage du début de la session (pour calculer le temps passé).
+    """
+    event_log = event_log or get_event_log()
+    state = st.session_state
+    now = time.time()
+    if "tracking_session_id" not in state:
+        state["tracking_session_id"] = str(uuid.uuid4())
+        state["tracking_started_at"] = now
+        state["tracking_last_event"] = now
+        state["tracking_page"] = page
+        event_log.emit("session_start", session_id=state["tracking_session_id"], page=page, ts=now)
+    elif state["tracking_page"] != page:
+        state["tracking_page"] = page
+        state["tracking_last_event"] = now
+        event_log.emit("page_view", session_id=state["tracking_session_id"], page=page, ts=now)
+    elif now - state["tracking_last_event"] >= ACTIVITY_INTERVAL:
+        state["tracking_last_event"] = now
+        event_log.emit("activity", session_id=state["tracking_session_id"], page=page, ts=now)
+    return state["tracking_started_at"]
+
+
+def load_events(directory=DEFAULT_DIR, start=None, end=None):
+    """
+    Charge les événements entre deux dates UTC (incluses), en ne lisant que les fichiers
+    des jours concernés.
+
+    Returns:
+        DataFrame: colonnes event, session_id, page, ts et time (horodatage UTC).
+    """
+    start = pd.Timestamp(start).date() if start is not None else date.min
+    end = pd.Timestamp(end).date() if end is not None else date.max
+    frames = []
+    for path in sorted(glob.glob(os.path.join(directory, f"{FILE_PREFIX}*.jsonl"))):
+        day = datetime.strptime(os.path.basename(path)[len(FILE_PREFIX):-len(".jsonl")], "%Y-%m-%d").date()
+        if start <= day <= end and os.path.getsize(path):
+            frames.append(pd.read_json(path, lines=True, dtype={"session_id": str, "page": str}))
+    if not frames:
+        return pd.DataFrame(columns=["event", "session_id", "page", "ts", "time"])
+    events = pd.concat(frames, ignore_index=True)
+    events["time"] = pd.to_datetime(events["ts"], unit="s")
+    return events
+
+
+def session_durations(events):
+    """
+    Une ligne par session : début, durée approximative (secondes), pages vues.
+    """
+    grouped = events.groupby("session_id")
+    sessions = pd.DataFrame({
+        "debut": grouped["time"].min(),
+        "duree_s": grouped["ts"].max() - grouped["ts"].min(),
+        "pages_vues": grouped["event"].apply(lambda e: int(e.isin(["session_start", "page_view"]).sum())),
+    })
+    return sessions.reset_index()
+
+
+def visit_stats(directory=DEFAULT_DIR, start=None, end=None, freq="D"):
+    """
+    Fréquentation par période (jour par défaut) : visites, pages vues, durée médiane
+    et moyenne des visites.
+    """
+    events = load_events(directory, start, end)
+    if events.empty:
+        return pd.DataFrame(columns=["visites", "pages_vues", "duree_mediane_s", "duree_moyenne_s"])
+    sessions = session_durations(events)
+    grouped = sessions.groupby(sessions["debut"].dt.to_period(freq))
+    return pd.DataFrame({
+        "visites": grouped.size(),
+        "pages_vues": grouped["pages_vues"].sum(),
+        "duree_mediane_s": grouped["duree_s"].median(),
+        "duree_moyenne_s": grouped["duree_s"].mean(),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthèse de la fréquentation.")
+    parser.add_argument("--dir", default=DEFAULT_DIR, help="Dossier des journaux d'événements")
+    parser.add_argument("--since", default=None, help="Date de début (AAAA-MM-JJ)")
+    parser.add_argument("--until", default=None, help="Date de fin (AAAA-MM-JJ)")
+    parser.add_argument("--freq", default="D", help="Période d'agrégation (D, W, M)")
+    args = parser.parse_args()
+    print(visit_stats(args.dir, args.since, args.until, args.freq))
+
 
-def track_user(log_file="connections_log.csv"):
-    # Génère un ID unique pour la session
-    session_id = str(uuid.uuid4())
-    start_time = datetime.now()
-    start_timestamp = time.time()
-
-    # JS pour récupérer l'IP et renvoyer vers Streamlit
-    ip_json = components.html(f"""
-    <script>
-        const sessionId = "{session_id}";
-        const startTime = Date.now();
-
-        fetch("https://api.ipify.org?format=json")
-        .then(response => response.json())
-        .then(data => {{
-            const ip = data.ip;
-            const event = new CustomEvent("streamlit:ip_event", {{
-                detail: JSON.stringify({{ ip: ip, sessionId: sessionId }})
-            }});
-            document.dispatchEvent(event);
-        }});
-
-        window.addEventListener("beforeunload", function () {{
-            const endTime = Date.now();
-            const duration = Math.round((endTime - startTime) / 1000);
-            navigator.sendBeacon("https://example.com/close?session_id=" + sessionId + "&duration=" + duration);
-        }});
-    </script>
-    """, height=0)
-
-    # Zone d'attente interactive : récupération de l’IP via JS (hack temporaire via événement)
-    ip = st.experimental_get_query_params().get("ip", [None])[0]
-
-    # Ou écoute de l’event injecté ci-dessus (pas encore traité par Streamlit directement sans composant React custom)
-    # Donc on passe par st.experimental_get_query_params ou simulateur via reload
-    # Pour l'instant, demande l’IP manuellement si non transmise
-    if not ip:
-        st.warning("Impossible d'identifier votre IP automatiquement. Entrez-la manuellement si vous le souhaitez.")
-        ip = st.text_input("Adresse IP :", placeholder="123.45.67.89")
-
-    # Affichage et enregistrement
-    if ip:
-        st.success(f"IP détectée : {ip}")
-        # Écriture dans un fichier CSV
-        entry = {
-            "session_id": session_id,
-            "ip": ip,
-            "start_time": start_time.strftime("%Y-%m-%d %H:%M:%S"),
-        }
-
-        if os.path.exists(log_file):
-            df = pd.read_csv(log_file)
-            df = pd.concat([df, pd.DataFrame([entry])], ignore_index=True)
-        else:
-            df = pd.DataFrame([entry])
-
-        df.to_csv(log_file, index=False)
-
-    # Retourne le timestamp de début pour calcul de la durée
-    return start_timestamp
+if __name__ == "__main__":
+    main()
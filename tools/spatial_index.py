@@ -0,0 +1,126 @@
+# tools/spatial_index.py
+#
+# Index spatial par grille (latitude/longitude) pour la recherche de mutations dans un rayon.
+#
+# Les points sont rangés par identifiant de cellule ; une recherche ne parcourt que les
+# cellules qui recouvrent le rayon (une tranche contiguë par rangée de latitude), puis
+# affine les candidats avec une distance de haversine vectorisée.
+#
+# Tolérance : la haversine suppose une Terre sphérique alors que geopy.distance.geodesic
+# utilise l'ellipsoïde WGS-84. On prend pour rayon de la sphère le rayon de courbure moyen
+# (gaussien) de l'ellipsoïde à la latitude du centre, ce qui limite l'écart relatif à
+# 0,2 % : seuls des points situés à moins de 0,2 % du bord du cercle (4 m pour un rayon de
+# 2 km) peuvent être classés différemment.
+
+import numpy as np
+
+EARTH_RADIUS_METERS = 6371008.8
+# Ellipsoïde WGS-84
+_WGS84_A = 6378137.0
+_WGS84_E2 = 6.69437999014e-3
+# Un degré de latitude mesure au minimum ~110 574 m (à l'équateur)
+_MIN_METERS_PER_DEG_LAT = 110574.0
+_METERS_PER_DEG_LON_EQUATOR = 111320.0
+
+
+def local_earth_radius(lat):
+    """
+    Rayon de courbure moyen (gaussien) de l'ellipsoïde WGS-84 à une latitude donnée, en mètres.
+    """
+    sin2 = np.sin(np.radians(lat)) ** 2
+    return _WGS84_A * np.sqrt(1 - _WGS84_E2) / (1 - _WGS84_E2 * sin2)
+
+
+def haversine_meters(lat1, lon1, lat2, lon2, radius=EARTH_RADIUS_METERS):
+    """
+    Distance de haversine (en mètres) entre des points, vectorisée sur des tableaux NumPy.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * radius * np.arcsin(np.sqrt(np.minimum(1.0, a)))
+
+
+class GridIndex:
+    """
+    Index spatial en grille régulière sur les coordonnées (latitude, longitude).
+
+    Args:
+        latitudes (array): Latitudes des points (les NaN sont ignorés).
+        longitudes (array): Longitudes des points (les NaN sont ignorés).
+        cell_size_deg (float): Taille d'une cellule en degrés (0,005° ≈ 550 m en latitude).
+
+    Les résultats des recherches sont des positions (0..n-1) dans les tableaux d'origine,
+    utilisables directement avec DataFrame.iloc.
+    """
+
+    def __init__(self, latitudes, longitudes, cell_size_deg=0.005):
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        self.cell_size_deg = cell_size_deg
+        self._n_lon_cells = int(np.ceil(360 / cell_size_deg)) + 1
+
+        valid = np.flatnonzero(~(np.isnan(latitudes) | np.isnan(longitudes)))
+        cells = self._cell_ids(latitudes[valid], longitudes[valid])
+        order = np.argsort(cells, kind="stable")
+
+        self._cells = cells[order]
+        self._positions = valid[order]
+        self._latitudes = latitudes[self._positions]
+        self._longitudes = longitudes[self._positions]
+
+    def __len__(self):
+        return self._positions.size
+
+    def _cell_ids(self, latitudes, longitudes):
+        lat_idx = np.floor((latitudes + 90) / self.cell_size_deg).astype(np.int64)
+        lon_idx = np.floor((longitudes + 180) / self.cell_size_deg).astype(np.int64)
+        return lat_idx * self._n_lon_cells + lon_idx
+
+    def _candidate_slots(self, lat, lon, radius_meters):
+        """
+        Emplacements (dans l'ordre trié) des points des cellules recouvrant le rayon.
+        """
+        # Marge de 1 % pour ne jamais exclure un point à cause de l'approximation en degrés
+        dlat = radius_meters / _MIN_METERS_PER_DEG_LAT * 1.01
+        cos_lat = max(np.cos(np.radians(min(89.9, abs(lat) + dlat))), 1e-6)
+        dlon = min(180.0, radius_meters / (_METERS_PER_DEG_LON_EQUATOR * cos_lat) * 1.01)
+
+        size = self.cell_size_deg
+        lat_rows = np.arange(
+            int(np.floor((lat - dlat + 90) / size)), int(np.floor((lat + dlat + 90) / size)) + 1
+        )
+        lon_lo = int(np.floor((lon - dlon + 180) / size))
+        lon_hi = int(np.floor((lon + dlon + 180) / size))
+
+        # Dans une rangée de latitude, les cellules voisines ont des identifiants contigus
+        starts = np.searchsorted(self._cells, lat_rows * self._n_lon_cells + lon_lo, side="left")
+        stops = np.searchsorted(self._cells, lat_rows * self._n_lon_cells + lon_hi, side="right")
+        if not len(starts):
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(a, b) for a, b in zip(starts, stops)])
+
+    def query_radius(self, lat, lon, radius_meters, return_distance=False):
+        """
+        Recherche les points situés à moins de radius_meters du point (lat, lon).
+
+        Args:
+            lat (float): Latitude du centre.
+            lon (float): Longitude du centre.
+            radius_meters (float): Rayon de recherche en mètres.
+            return_distance (bool): Renvoie aussi les distances (haversine, en mètres).
+
+        Returns:
+            ndarray | tuple: positions triées des points trouvés, et leurs distances si demandé.
+        """
+        slots = self._candidate_slots(lat, lon, radius_meters)
+        distances = haversine_meters(
+            lat, lon, self._latitudes[slots], self._longitudes[slots], radius=local_earth_radius(lat)
+        )
+        inside = distances <= radius_meters
+        positions = self._positions[slots[inside]]
+        order = np.argsort(positions)
+        if return_distance:
+            return positions[order], distances[inside][order]
+        return positions[order]
@@ -0,0 +1,176 @@
+# tools/startup.py
+#
+# Démarrage à froid de l'application : imports différés et préchauffage des caches.
+#
+#   - lazy_import remplace un import de module lourd (plotly, folium...) par un objet
+#     qui n'importe le module qu'au premier attribut utilisé ; la durée de l'import est
+#     alors mesurée (étape « import.<module> » de tools/instrumentation.py) ;
+#   - WarmUp exécute des tâches de préchauffage (taux, simulations courantes, partition
+#     DVF par défaut) dans un thread de fond, au premier affichage de l'application : les
+#     visiteurs suivants trouvent les caches remplis. Chaque tâche est mesurée
+#     (« prechauffage.<tâche> »). SIMIMMO_WARMUP=0 désactive le préchauffage.
+#
+# Coût d'import des modules de l'application, chacun dans un processus neuf :
+#   python -m tools.startup
+
+import argparse
+import importlib
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pandas as pd
+
+from tools.instrumentation import stage
+
+WARMUP_ENV = "SIMIMMO_WARMUP"
+WARMUP_THREAD = "warm-up"
+# Journal de Streamlit qui signale chaque appel fait hors d'une exécution de script
+_SCRIPT_CONTEXT_LOGGER = "streamlit.runtime.scriptrunner.script_run_context"
+# Modules mesurés par défaut en ligne de commande
+APP_MODULES = [
+    "streamlit", "pandas", "plotly.graph_objects", "pyarrow.parquet", "requests", "bs4", "folium",
+    "tools.loan_engine", "tools.dvf_store", "tools.rate_fetcher", "tools.dvf_valuation",
+]
+
+
+def timed_import(name):
+    """
+    Importe un module en mesurant la durée de l'import (non mesurée s'il est déjà chargé).
+
+    On passe toujours par importlib.import_module : si un autre thread (le préchauffage)
+    est en train d'importer le module, il attend la fin de l'import au lieu de rendre le
+    module à moitié initialisé présent dans sys.modules.
+    """
+    if name in sys.modules:
+        return importlib.import_module(name)
+    with stage(f"import.{name}"):
+        return importlib.import_module(name)
+
+
+class LazyModule:
+    """
+    Module importé au premier accès à l'un de ses attributs.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = timed_import(self._name)
+        return self._module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __repr__(self):
+        state = "importé" if self._module is not None else "non importé"
+        return f"<module différé {self._name} ({state})>"
+
+
+def lazy_import(name):
+    return LazyModule(name)
+
+
+def warm_up_enabled():
+    return os.environ.get(WARMUP_ENV, "1") != "0"
+
+
+class _WarmUpLogFilter(logging.Filter):
+    """
+    Écarte les avertissements « missing ScriptRunContext » du thread de préchauffage,
+    attendus : il appelle des fonctions en cache sans être rattaché à une session.
+    """
+
+    def filter(self, record):
+        return threading.current_thread().name != WARMUP_THREAD
+
+
+class WarmUp:
+    """
+    Exécute des tâches de préchauffage dans un thread de fond, l'une après l'autre.
+
+    Une tâche en échec n'interrompt pas les suivantes (l'erreur est conservée dans le
+    statut) : le préchauffage n'est qu'une optimisation.
+
+    Args:
+        tasks (list[tuple]): (nom, fonction sans argument), dans l'ordre d'exécution.
+    """
+
+    def __init__(self, tasks):
+        self.tasks = list(tasks)
+        self.status = {name: {"etat": "en attente", "secondes": None, "erreur": None} for name, _ in self.tasks}
+        self.started_at = None
+        self.finished_at = None
+        self._thread = None
+
+    def _run(self):
+        for name, task in self.tasks:
+            self.status[name]["etat"] = "en cours"
+            started = time.perf_counter()
+            try:
+                with stage(f"prechauffage.{name}"):
+                    task()
+                self.status[name]["etat"] = "terminé"
+            except Exception as e:
+                self.status[name]["etat"] = "échec"
+                self.status[name]["erreur"] = f"{type(e).__name__}: {e}"
+            self.status[name]["secondes"] = round(time.perf_counter() - started, 3)
+        self.finished_at = time.time()
+
+    def start(self):
+        if self._thread is None:
+            self.started_at = time.time()
+            logger = logging.getLogger(_SCRIPT_CONTEXT_LOGGER)
+            if not any(isinstance(f, _WarmUpLogFilter) for f in logger.filters):
+                logger.addFilter(_WarmUpLogFilter())
+            self._thread = threading.Thread(target=self._run, name=WARMUP_THREAD, daemon=True)
+            self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.done
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    def status_frame(self):
+        return pd.DataFrame.from_dict(self.status, orient="index")
+
+
+def import_costs(modules=APP_MODULES, python=sys.executable):
+    """
+    Durée d'import de chaque module dans un processus neuf (dépendances comprises).
+
+    Returns:
+        DataFrame: une ligne par module, colonnes module et ms (NaN si l'import échoue).
+    """
+    rows = []
+    for module in modules:
+        code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+        result = subprocess.run([python, "-c", code], capture_output=True, text=True)
+        seconds = float(result.stdout.strip().splitlines()[-1]) if result.returncode == 0 else float("nan")
+        rows.append({"module": module, "ms": round(seconds * 1000, 1)})
+    return pd.DataFrame(rows).sort_values("ms", ascending=False, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coût d'import des modules de l'application.")
+    parser.add_argument("modules", nargs="*", default=APP_MODULES, help="Modules à mesurer")
+    args = parser.parse_args()
+    print(import_costs(args.modules).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()